@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+CloudMind Analytics - Alert state
+---------------------------------
+Remembers which idle resources were already reported, so alerts only carry
+what changed since the last run: new idle resources, resolved ones, and a
+count of those still idle. The reported set lives in a small SQLite file
+(standard library only, so the Lambda can import it as app.alert_state or
+alert_state); each run streams its current IDs into a temporary table and
+the differences are primary-key joins, never a full list in memory.
+
+In Lambda the database can be kept in S3 between invocations with
+download_state / upload_state (they take the caller's S3 client).
+"""
+
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+STATE_PATH = "output/alert_state.db"
+INSERT_BATCH = 50_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reported (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    PRIMARY KEY (kind, id)
+) WITHOUT ROWID;
+"""
+
+
+class Delta:
+    """Result of AlertState.diff: new / resolved IDs per kind and still-idle counts."""
+
+    def __init__(self, new, resolved, still):
+        self.new = new            # kind -> [ids]
+        self.resolved = resolved  # kind -> [ids]
+        self.still = still        # kind -> count
+
+    @property
+    def changed(self):
+        return any(self.new.values()) or any(self.resolved.values())
+
+    def counts(self):
+        kinds = list(dict.fromkeys(list(self.new) + list(self.resolved) + list(self.still)))
+        return {k: {"new": len(self.new.get(k, [])), "resolved": len(self.resolved.get(k, [])),
+                    "still_idle": self.still.get(k, 0)} for k in kinds}
+
+    def summary(self):
+        totals = [sum(c[f] for c in self.counts().values()) for f in ("new", "resolved", "still_idle")]
+        return f"{totals[0]} new, {totals[1]} resolved, {totals[2]} still idle"
+
+
+class AlertState:
+    """
+    Previously reported idle set, per resource kind ("EC2", "EBS", ...).
+
+        state = AlertState(path)
+        delta = state.diff({"EC2": ids, "EBS": ids})   # nothing is stored yet
+        ... send the delta ...
+        state.commit()                                  # remember this run's set
+    """
+
+    def __init__(self, path=STATE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA cache_size=-65536")  # 64 MiB page cache
+        self.conn.executescript(_SCHEMA)
+        self._kinds = None
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _load_current(self, current):
+        self.conn.execute("DROP TABLE IF EXISTS temp.current")
+        self.conn.execute("CREATE TEMP TABLE current (kind TEXT NOT NULL, id TEXT NOT NULL, PRIMARY KEY (kind, id)) WITHOUT ROWID")
+        for kind, ids in current.items():
+            batch = []
+            for rid in ids:
+                if rid is None:
+                    continue
+                batch.append((kind, str(rid)))
+                if len(batch) >= INSERT_BATCH:
+                    self.conn.executemany("INSERT OR IGNORE INTO temp.current VALUES (?, ?)", batch)
+                    batch = []
+            self.conn.executemany("INSERT OR IGNORE INTO temp.current VALUES (?, ?)", batch)
+
+    def diff(self, current):
+        """
+        Compare this run's idle IDs ({kind: iterable of ids}) with the reported set.
+        Only kinds present in `current` can resolve, so a scan that was skipped does not
+        clear its resources.
+        """
+        self._kinds = list(current)
+        self._load_current(current)
+        new = {k: [] for k in self._kinds}
+        resolved = {k: [] for k in self._kinds}
+        still = {k: 0 for k in self._kinds}
+        for kind, rid in self.conn.execute(
+                "SELECT c.kind, c.id FROM temp.current c "
+                "WHERE NOT EXISTS (SELECT 1 FROM reported r WHERE r.kind = c.kind AND r.id = c.id)"):
+            new[kind].append(rid)
+        marks = ",".join("?" * len(self._kinds))
+        if self._kinds:
+            for kind, rid in self.conn.execute(
+                    f"SELECT r.kind, r.id FROM reported r WHERE r.kind IN ({marks}) "
+                    "AND NOT EXISTS (SELECT 1 FROM temp.current c WHERE c.kind = r.kind AND c.id = r.id)",
+                    self._kinds):
+                resolved[kind].append(rid)
+        for kind, count in self.conn.execute(
+                "SELECT c.kind, COUNT(*) FROM temp.current c JOIN reported r ON r.kind = c.kind AND r.id = c.id "
+                "GROUP BY c.kind"):
+            still[kind] = count
+        return Delta(new, resolved, still)
+
+    def commit(self):
+        """Store the set from the last diff() as the reported set (call once the alert went out)."""
+        if self._kinds is None:
+            raise RuntimeError("commit() called before diff()")
+        now = datetime.now(timezone.utc).isoformat()
+        with self.conn:
+            marks = ",".join("?" * len(self._kinds))
+            if self._kinds:
+                self.conn.execute(
+                    f"DELETE FROM reported WHERE kind IN ({marks}) AND NOT EXISTS "
+                    "(SELECT 1 FROM temp.current c WHERE c.kind = reported.kind AND c.id = reported.id)",
+                    self._kinds)
+            self.conn.execute("INSERT OR IGNORE INTO reported SELECT kind, id, ? FROM temp.current", (now,))
+        self.conn.execute("DROP TABLE IF EXISTS temp.current")
+        self._kinds = None
+
+    def reported_count(self, kind=None):
+        if kind:
+            return self.conn.execute("SELECT COUNT(*) FROM reported WHERE kind = ?", (kind,)).fetchone()[0]
+        return self.conn.execute("SELECT COUNT(*) FROM reported").fetchone()[0]
+
+
+# ===== S3 persistence (Lambda) =====
+def download_state(s3_client, bucket, key, path):
+    """Fetch the state database from S3; a missing object starts from an empty state."""
+    try:
+        s3_client.download_file(bucket, key, path)
+        return True
+    except Exception as e:
+        code = getattr(e, "response", {}).get("Error", {}).get("Code")
+        if code in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
+def upload_state(s3_client, bucket, key, path):
+    """Checkpoint the WAL into the main file and upload it."""
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    s3_client.upload_file(path, bucket, key)
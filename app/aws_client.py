@@ -1,21 +1,115 @@
 import boto3
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import NoCredentialsError, ClientError
+from aws_throttle import make_client
 
 # Use AWS_PROFILE env var or default profile
 session = boto3.Session(profile_name=os.getenv("AWS_PROFILE"))
 
+EC2_CACHE_TTL = 300  # seconds before a region's instance list is refreshed
+
+# ---------- Client pool ----------
+# One client per (service, region), reused across calls and Streamlit reruns.
+# Sessions are not thread-safe, so client creation is serialized. Clients share
+# aws_throttle's rate limits and retry policy.
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(service, region):
+    key = (service, region)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = make_client(session, service, region, scope=session.profile_name)
+        return _clients[key]
+
+def iter_ec2_instances(region="us-east-1"):
+    paginator = get_client("ec2", region).get_paginator("describe_instances")
+    for page in paginator.paginate():
+        for r in page.get("Reservations", []):
+            for i in r.get("Instances", []):
+                yield {
+                    "InstanceId": i.get("InstanceId"),
+                    "State": i.get("State", {}).get("Name"),
+                    "InstanceType": i.get("InstanceType"),
+                    "LaunchTime": i.get("LaunchTime").isoformat() if i.get("LaunchTime") else None,
+                    "Tags": i.get("Tags", [])
+                }
+
 def list_ec2_instances(region="us-east-1"):
-    ec2 = session.client("ec2", region_name=region)
-    resp = ec2.describe_instances()
-    instances = []
-    for r in resp.get("Reservations", []):
-        for i in r.get("Instances", []):
-            instances.append({
-                "InstanceId": i.get("InstanceId"),
-                "State": i.get("State", {}).get("Name"),
-                "InstanceType": i.get("InstanceType"),
-                "LaunchTime": i.get("LaunchTime").isoformat() if i.get("LaunchTime") else None,
-                "Tags": i.get("Tags", [])
-            })
-    return instances
+    return list(iter_ec2_instances(region))
+
+# ---------- Per-region TTL cache ----------
+class EC2Cache:
+    """
+    Per-region instance lists with stale-while-revalidate: a fresh entry is returned as is,
+    a stale one is returned right away while one background refresh fetches the new list,
+    and only a region that was never fetched blocks on the API call. After a failed refresh
+    the old list is served and the next automatic refresh waits another TTL.
+    """
+
+    def __init__(self, ttl=EC2_CACHE_TTL, fetch=list_ec2_instances, workers=4):
+        self.ttl = ttl
+        self.fetch = fetch
+        self._entries = {}      # region -> {"data", "fetched_at", "error", "failed_at"}
+        self._refreshing = {}   # region -> Future
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def get(self, region, force=False):
+        """Return (instances, fetched_at, stale); raises if a first fetch fails."""
+        with self._lock:
+            entry = self._entries.get(region)
+        if entry is None:
+            return self._wait(self.refresh(region), region)
+        now = time.time()
+        stale = force or now - entry["fetched_at"] >= self.ttl
+        backing_off = entry["failed_at"] is not None and now - entry["failed_at"] < self.ttl
+        if force or (stale and not backing_off):
+            self.refresh(region)
+        return entry["data"], entry["fetched_at"], stale
+
+    def refresh(self, region):
+        """Start a background fetch for a region (at most one at a time) and return its future."""
+        with self._lock:
+            fut = self._refreshing.get(region)
+            if fut is None or fut.done():
+                fut = self._refreshing[region] = self._executor.submit(self._load, region)
+            return fut
+
+    def refreshing(self, region):
+        """Whether a background fetch for the region is running (a stale entry may be backing off)."""
+        with self._lock:
+            fut = self._refreshing.get(region)
+        return fut is not None and not fut.done()
+
+    def last_error(self, region):
+        with self._lock:
+            entry = self._entries.get(region)
+        return entry.get("error") if entry else None
+
+    def cached_regions(self):
+        with self._lock:
+            return list(self._entries)
+
+    def _load(self, region):
+        try:
+            data = self.fetch(region)
+        except Exception as e:
+            with self._lock:
+                if region in self._entries:
+                    # keep serving the old list; report the failure next to it
+                    self._entries[region]["error"] = e
+                    self._entries[region]["failed_at"] = time.time()
+                    return
+            raise
+        with self._lock:
+            self._entries[region] = {"data": data, "fetched_at": time.time(), "error": None, "failed_at": None}
+
+    def _wait(self, fut, region):
+        fut.result()
+        with self._lock:
+            entry = self._entries[region]
+        return entry["data"], entry["fetched_at"], False
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+CloudMind Analytics - AWS rate limits and retries
+-------------------------------------------------
+One policy for how fast we call AWS and how we retry. Clients created with
+make_client() (or passed to limit_client()):
+
+* take a token before every HTTP attempt from a bucket shared by all clients
+  of the same (scope, service, region) - the granularity API quotas are
+  enforced at - so parallel workers pace themselves instead of tripping the
+  quota together;
+* adapt that bucket to the responses: until the first throttle the rate
+  doubles every second of successes (slow start), then a throttling error
+  halves it and successes raise it again step by step (AIMD), always within
+  per-service limits;
+* retry with botocore's "standard" mode, i.e. exponential backoff with full
+  jitter, capped at MAX_ATTEMPTS attempts;
+* count calls, attempts, retries, throttles and time spent waiting for a
+  token (summed over threads), per (scope, service, region) - see stats() /
+  format_stats().
+
+Only botocore client events are used (before-call, before-send,
+needs-retry), so lambda_function can import this as app.aws_throttle or
+aws_throttle; botocore itself is imported when the first client is made.
+"""
+
+import os
+import threading
+import time
+
+MAX_ATTEMPTS = int(os.getenv("CLOUDMIND_MAX_ATTEMPTS", "8"))
+MIN_RATE = 0.5            # requests per second the rate never drops below
+DECREASE_FACTOR = 0.5     # rate multiplier on a throttling error
+INCREASE_STEP = 2.0       # requests per second added after ~1 s worth of successes
+DECREASE_COOLDOWN = 0.5   # seconds; throttles from the same burst only count once
+
+# service -> (starting rate, ceiling) in requests per second. Start near the documented
+# steady-state quota and let the bucket find the real one.
+SERVICE_RATES = {
+    "ec2": (20.0, 100.0),
+    "rds": (10.0, 50.0),
+    "s3": (200.0, 2000.0),
+    "sns": (50.0, 300.0),
+    "sts": (10.0, 100.0),
+    "lambda": (50.0, 500.0),
+    "cloudwatch": (20.0, 100.0),
+    "pricing": (5.0, 20.0),
+}
+DEFAULT_RATE = (10.0, 100.0)
+
+# request-rate throttling only; quota / resource limits (LimitExceededException) and conflicts
+# (TransactionInProgressException) are ordinary errors and must not slow down the shared bucket
+THROTTLE_CODES = {
+    "Throttling", "ThrottlingException", "ThrottledException", "RequestThrottledException",
+    "TooManyRequestsException", "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded", "BandwidthLimitExceeded", "RequestThrottled",
+    "SlowDown", "PriorRequestNotComplete", "EC2ThrottledException",
+}
+
+
+# ===== Adaptive token bucket =====
+class AdaptiveTokenBucket:
+    """Token bucket whose refill rate follows the throttling responses (slow start, then AIMD)."""
+
+    def __init__(self, rate, max_rate, min_rate=MIN_RATE):
+        self.rate = float(rate)
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min_rate)
+        self.tokens = max(1.0, self.rate)
+        self._last = time.monotonic()
+        self._last_decrease = 0.0
+        self._slow_start = True
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # burst capacity is one second worth of requests
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self):
+        """Take one token, sleeping until it is available; returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return waited
+                wait = (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def on_throttle(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease < DECREASE_COOLDOWN:
+                return
+            self._last_decrease = now
+            self._slow_start = False
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+            self.tokens = min(self.tokens, max(1.0, self.rate))
+
+    def on_success(self):
+        with self._lock:
+            # per second of successful calls: double while probing, else ~INCREASE_STEP more
+            step = 1.0 if self._slow_start else INCREASE_STEP / self.rate
+            self.rate = min(self.max_rate, self.rate + step)
+
+
+class CallStats:
+    FIELDS = ("calls", "attempts", "retries", "throttles", "errors", "wait_s")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = dict.fromkeys(self.FIELDS, 0)
+
+    def add(self, field, amount=1):
+        with self._lock:
+            self.counts[field] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+class Limiter:
+    """Bucket + counters for one (scope, service, region); hooked into every client of that scope."""
+
+    def __init__(self, service, rate=None, max_rate=None):
+        start, ceiling = SERVICE_RATES.get(service, DEFAULT_RATE)
+        self.bucket = AdaptiveTokenBucket(rate or start, max_rate or ceiling)
+        self.stats = CallStats()
+
+    # before-call: once per API call
+    def on_call(self, **kwargs):
+        self.stats.add("calls")
+
+    # before-send: once per HTTP attempt, including retries
+    def on_send(self, request=None, **kwargs):
+        waited = self.bucket.acquire()
+        self.stats.add("attempts")
+        if waited:
+            self.stats.add("wait_s", waited)
+        # standard retry mode sends "amz-sdk-request: [ttl=...; ]attempt=N; max=M"
+        header = request.headers.get("amz-sdk-request", b"") if request is not None else b""
+        if isinstance(header, bytes):
+            header = header.decode("ascii", "ignore")
+        fields = dict(part.strip().partition("=")[::2] for part in header.split(";") if "=" in part)
+        if fields.get("attempt", "1") != "1":
+            self.stats.add("retries")
+
+    # needs-retry: sees every response / exception; never answers, so botocore still decides
+    def on_response(self, response=None, caught_exception=None, **kwargs):
+        if response is None:
+            if caught_exception is not None:
+                self.stats.add("errors")
+            return None
+        http, parsed = response
+        code = (parsed or {}).get("Error", {}).get("Code")
+        if code in THROTTLE_CODES or http.status_code == 429:
+            self.stats.add("throttles")
+            self.bucket.on_throttle()
+        elif http.status_code < 400:
+            self.bucket.on_success()
+        else:
+            self.stats.add("errors")
+        return None
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(service, region, scope=None):
+    key = (scope, service, region)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = Limiter(service)
+        return _limiters[key]
+
+
+# ===== Clients =====
+def client_config(config=None):
+    """botocore Config with the shared retry policy; `config` is merged on top."""
+    from botocore.config import Config
+    base = Config(retries={"mode": "standard", "total_max_attempts": MAX_ATTEMPTS})
+    return base.merge(config) if config is not None else base
+
+
+def limit_client(client, scope=None):
+    """Attach the shared limiter of the client's (scope, service, region) to an existing client."""
+    service = client.meta.service_model.service_name
+    limiter = get_limiter(service, client.meta.region_name, scope)
+    events = client.meta.events
+    events.register("before-call", limiter.on_call, unique_id="cloudmind-limit-call")
+    events.register("before-send", limiter.on_send, unique_id="cloudmind-limit-send")
+    events.register("needs-retry", limiter.on_response, unique_id="cloudmind-limit-retry")
+    return client
+
+
+def make_client(session, service, region_name=None, scope=None, config=None, **kwargs):
+    """
+    session.client(...) with the shared retry policy and rate limiter. `session` is a boto3
+    Session or the boto3 module; `scope` separates quotas, e.g. per account or profile.
+    """
+    client = session.client(service, region_name=region_name, config=client_config(config), **kwargs)
+    return limit_client(client, scope)
+
+
+# ===== Counters =====
+def stats(reset=False):
+    """{"scope/service/region": {calls, attempts, retries, throttles, errors, wait_s, rate}}."""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    out = {}
+    for (scope, service, region), limiter in sorted(limiters.items(), key=lambda kv: [str(k) for k in kv[0]]):
+        counts = limiter.stats.snapshot()
+        if reset:
+            limiter.stats.reset()
+        if counts["calls"] or counts["attempts"]:
+            counts["rate"] = round(limiter.bucket.rate, 2)
+            counts["wait_s"] = round(counts["wait_s"], 3)
+            out[f"{scope or 'default'}/{service}/{region or 'global'}"] = counts
+    return out
+
+
+def totals(reset=False):
+    """All counters summed over every scope, service and region."""
+    summed = dict.fromkeys(CallStats.FIELDS, 0)
+    for counts in stats(reset).values():
+        for field in CallStats.FIELDS:
+            summed[field] += counts[field]
+    summed["wait_s"] = round(summed["wait_s"], 3)
+    return summed
+
+
+def reset_stats():
+    stats(reset=True)
+
+
+def format_stats():
+    lines = []
+    for name, c in stats().items():
+        lines.append(f"  {name}: {c['calls']} calls, {c['retries']} retries, {c['throttles']} throttled, "
+                     f"{c['wait_s']}s waiting, rate {c['rate']}/s")
+    return "\n".join(lines) if lines else "  no API calls"
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+CloudMind Analytics - Forecast backtesting
+------------------------------------------
+Rolling-origin evaluation of the cost forecasts on aws_cost_history.csv.
+The history is cut off at many dates; every model variant is fitted on the
+rows up to each cut-off (all resource columns at once) and scored against
+the actual cost `h` days later. Folds are spread over a process pool and the
+errors are summed per model / horizon / resource, so the report stays small
+however many folds are run.
+
+Model variants:
+    linear       trend over all history up to the cut-off (production model)
+    linear:N     trend over the last N days only
+    naive        last observed cost
+    mean:N       mean of the last N days
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ml_prediction import aws_history_path, fit_trends, load_cost_history, predict_trends, prediction_output_path
+
+DEFAULT_MODELS = ["linear", "linear:30", "naive", "mean:7"]
+DEFAULT_HORIZONS = [1, 3, 7]
+FOLDS_PER_TASK = 64
+
+
+# ===== Model variants =====
+def _window(days, values, n):
+    if n is None:
+        return days, values
+    keep = days > days[-1] - n
+    return days[keep], values[keep]
+
+
+def predict_linear(days, values, future_days, window=None):
+    days, values = _window(days, values, window)
+    intercept, slope = fit_trends(days, values)
+    return predict_trends(intercept, slope, future_days)
+
+
+def predict_naive(days, values, future_days, window=None):
+    return np.repeat(values[-1:], len(future_days), axis=0)
+
+
+def predict_mean(days, values, future_days, window=7):
+    days, values = _window(days, values, window)
+    return np.repeat(values.mean(axis=0, keepdims=True), len(future_days), axis=0)
+
+
+MODELS = {"linear": predict_linear, "naive": predict_naive, "mean": predict_mean}
+
+
+def parse_model(spec):
+    """"linear:30" -> ("linear:30", predict_linear, 30)."""
+    name, _, arg = spec.partition(":")
+    if name not in MODELS:
+        raise ValueError(f"Unknown model '{spec}' (choose from {', '.join(sorted(MODELS))})")
+    return spec, MODELS[name], int(arg) if arg else None
+
+
+# ===== Folds =====
+_data = {}
+
+
+def _init_worker(days, values, models, horizons):
+    _data.update(days=days, values=values, models=[parse_model(m) for m in models], horizons=horizons)
+
+
+def _score_folds(cutoffs):
+    """
+    Score every model on a batch of cut-offs (number of training rows).
+    Returns per (model, horizon) arrays over resources: abs error sum, count, abs % error sum, % count.
+    """
+    days, values, horizons = _data["days"], _data["values"], _data["horizons"]
+    row_of_day = {d: i for i, d in enumerate(days)}
+    k = values.shape[1]
+    sums = {}
+    for p in cutoffs:
+        cutoff_day = days[p - 1]
+        targets = [(h, row_of_day.get(cutoff_day + h)) for h in horizons]
+        targets = [(h, row) for h, row in targets if row is not None]
+        if not targets:
+            continue
+        future = np.array([cutoff_day + h for h, _ in targets], dtype=float)
+        actual = values[[row for _, row in targets]]
+        for name, fn, arg in _data["models"]:
+            pred = fn(days[:p], values[:p], future, arg)
+            err = np.abs(pred - actual)
+            nonzero = actual != 0
+            ape = np.divide(err, np.abs(actual), out=np.zeros_like(err), where=nonzero)
+            for j, (h, _) in enumerate(targets):
+                acc = sums.setdefault((name, h), [np.zeros(k), np.zeros(k), np.zeros(k), np.zeros(k)])
+                acc[0] += err[j]
+                acc[1] += 1
+                acc[2] += ape[j]
+                acc[3] += nonzero[j]
+    return sums
+
+
+def _metrics(abs_err, count, ape, ape_count):
+    return {
+        "MAE": round(float(abs_err / count), 4) if count else None,
+        "MAPE": round(float(ape / ape_count * 100), 2) if ape_count else None,
+        "Points": int(count),
+    }
+
+
+# ===== Backtest =====
+def backtest(history, models=DEFAULT_MODELS, horizons=DEFAULT_HORIZONS, min_train=30, step=1, workers=1):
+    """
+    Rolling-origin backtest of a cost history DataFrame (Date + resource columns).
+    Cut-offs run from `min_train` rows to the end of the history every `step` rows.
+    Returns the report dict (overall, per-horizon and per-resource MAE / MAPE for each model).
+    """
+    for spec in models:
+        parse_model(spec)
+    history = history.sort_values("Date", kind="stable")
+    columns = [c for c in history.columns if c != "Date"]
+    values = history[columns].to_numpy(dtype=float)
+    # all-zero series are skipped, like in the production forecast
+    nonzero = np.any(values != 0, axis=0)
+    columns = [c for c, keep in zip(columns, nonzero) if keep]
+    values = values[:, nonzero]
+    days = ((history["Date"] - history["Date"].min()).dt.days + 1).to_numpy()
+
+    cutoffs = list(range(max(min_train, 2), len(days), step))
+    batches = [cutoffs[i:i + FOLDS_PER_TASK] for i in range(0, len(cutoffs), FOLDS_PER_TASK)]
+    start = time.perf_counter()
+    totals = {}
+    if workers and workers > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(days, values, list(models), list(horizons))) as executor:
+            results = executor.map(_score_folds, batches)
+            for sums in results:
+                _merge(totals, sums)
+    else:
+        _init_worker(days, values, list(models), list(horizons))
+        for batch in batches:
+            _merge(totals, _score_folds(batch))
+
+    report = {
+        "folds": len(cutoffs),
+        "horizons": list(horizons),
+        "resources": columns,
+        "seconds": round(time.perf_counter() - start, 2),
+        "models": {},
+    }
+    for spec in models:
+        by_h = {h: totals[(spec, h)] for h in horizons if (spec, h) in totals}
+        if not by_h:
+            continue
+        overall = [sum(acc[i].sum() for acc in by_h.values()) for i in range(4)]
+        per_resource = [sum(acc[i] for acc in by_h.values()) for i in range(4)]
+        report["models"][spec] = {
+            **_metrics(*overall),
+            "by_horizon": {str(h): _metrics(*(a.sum() for a in acc)) for h, acc in by_h.items()},
+            "by_resource": {c: _metrics(*(a[j] for a in per_resource)) for j, c in enumerate(columns)},
+        }
+    scored = [(m["MAE"], spec) for spec, m in report["models"].items() if m["MAE"] is not None]
+    report["best_model"] = min(scored)[1] if scored else None
+    return report
+
+
+def _merge(totals, sums):
+    for key, acc in sums.items():
+        if key in totals:
+            for a, b in zip(totals[key], acc):
+                a += b
+        else:
+            totals[key] = acc
+
+
+# ===== Entry Point =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CloudMind - Rolling-origin forecast backtest")
+    parser.add_argument("--history", default=aws_history_path, help="Historical cost CSV (Date + one column per resource)")
+    parser.add_argument("--cur", nargs="+", default=None, help="Backtest on Cost and Usage Report files / directories instead of --history")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS, help="Model variants: linear, linear:N, naive, mean:N")
+    parser.add_argument("--horizons", type=int, nargs="+", default=DEFAULT_HORIZONS, help="Days after each cut-off to score")
+    parser.add_argument("--min-train", type=int, default=30, help="Rows of history before the first cut-off")
+    parser.add_argument("--step", type=int, default=1, help="Rows between cut-offs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes for scoring folds (1 = serial)")
+    parser.add_argument("--out", default=os.path.join(prediction_output_path, "backtest_report.json"), help="Report file")
+    args = parser.parse_args()
+
+    if args.cur:
+        from cur_ingest import load_cur_history
+        history = load_cur_history(args.cur)
+    elif os.path.exists(args.history):
+        history = load_cost_history(args.history)
+    else:
+        history = None
+        print("❌ aws_cost_history.csv not found. Please add your historical cost CSV.")
+    if history is not None:
+        report = backtest(history, args.models, args.horizons, args.min_train,
+                          args.step, args.workers)
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Backtest complete: {report['folds']} folds in {report['seconds']}s")
+        for spec, m in report["models"].items():
+            print(f"   {spec:<12} MAE {m['MAE']}  MAPE {m['MAPE']}%")
+        print(f"🏆 Best model: {report['best_model']}. Report saved to {args.out}")
@@ -1,6 +1,10 @@
+import argparse
 import json
 import os
 from datetime import datetime
+from itertools import repeat
+
+from pricing import PricingEngine, region_from_az, rds_key, s3_region
 
 # ---------- Static AWS pricing (Free Tier Simulation) ----------
 AWS_PRICING = {
@@ -10,60 +14,122 @@ AWS_PRICING = {
     "RDS": 0.017    # USD/hour
 }
 
+# Quantities: EC2 / RDS are priced for one month of hours (AWS's 730 h/month convention),
+# EBS on the volume's Size_GB and S3 on the bucket's TotalSizeBytes, so every cost is per month
+HOURS_PER_MONTH = 730
+BYTES_PER_GB = 1e9
+
 OUTPUT_PATH = "output/analysis/"
-os.makedirs(OUTPUT_PATH, exist_ok=True)
 
 
 # ---------- Helper function to load analysis files ----------
-def load_json(file_name):
-    file_path = os.path.join(OUTPUT_PATH, file_name)
+def load_json(file_name, analysis_path=OUTPUT_PATH):
+    file_path = os.path.join(analysis_path, file_name)
     if os.path.exists(file_path):
         with open(file_path, "r") as f:
             return json.load(f)
+    jsonl_path = os.path.splitext(file_path)[0] + ".jsonl"
+    if os.path.exists(jsonl_path):
+        return iter_jsonl(jsonl_path)
     return []  # return list instead of dict, since our data is list format
 
 
+def iter_jsonl(file_path):
+    """Stream records from a JSON Lines analysis file (resource_analysis --format jsonl)."""
+    with open(file_path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# ---------- Columns each cost loop reads (Parquet inventory store) ----------
+COST_COLUMNS = {
+    "idle_ec2": ["idle", "AvailabilityZone", "InstanceType"],
+    "idle_ebs": ["Size_GB", "unused", "AvailabilityZone", "VolumeType"],
+    "idle_s3": ["TotalSizeBytes", "inactive", "Region", "StorageClass"],
+    "idle_rds": ["idle", "AvailabilityZone", "DBInstanceClass", "Engine"],
+}
+
+
+def load_idle(name, store_dir=None, analysis_path=OUTPUT_PATH):
+    """Idle records from the analysis JSON files, or only the needed columns from the inventory store."""
+    if store_dir:
+        import inventory_store
+        return inventory_store.iter_records(store_dir, name, columns=COST_COLUMNS[name])
+    return load_json(f"{name}.json", analysis_path)
+
+
+# ---------- Per-record rates ----------
+def pricing_key(service, r):
+    """(service, region, type) a record is priced under."""
+    if service == "EC2":
+        return service, region_from_az(r.get("AvailabilityZone")), r.get("InstanceType")
+    if service == "EBS":
+        return service, region_from_az(r.get("AvailabilityZone")), r.get("VolumeType")
+    if service == "S3":
+        return service, s3_region(r.get("Region")), r.get("StorageClass", "STANDARD")
+    return service, region_from_az(r.get("AvailabilityZone")), rds_key(r.get("DBInstanceClass"), r.get("Engine"))
+
+
+def record_rates(service, records, pricing=None):
+    """
+    Rates aligned with records: the flat AWS_PRICING rate, or region/type-aware rates
+    resolved in one batch by the pricing engine (flat rate for keys it does not know).
+    """
+    if pricing is None:
+        return repeat(AWS_PRICING[service])
+    return pricing.price_batch([pricing_key(service, r) for r in records], default=AWS_PRICING[service])
+
+
 # ---------- Cost calculation logic ----------
-def calculate_cost_and_savings():
-    ec2_data = load_json("idle_ec2.json")
-    ebs_data = load_json("idle_ebs.json")
-    s3_data = load_json("idle_s3.json")
-    rds_data = load_json("idle_rds.json")
+def calculate_cost_and_savings(store_dir=None, pricing=None, idle=None, save=True, output_path=OUTPUT_PATH):
+    """
+    Estimate the monthly cost and savings for the idle resources. `idle` ({"idle_ec2": [...], ...}) hands the
+    analysis results over in memory; otherwise they are read from `output_path` or the store.
+    The result is written to `output_path`/cost_estimation.json unless save=False.
+    """
+    if idle is not None:
+        ec2_data, ebs_data, s3_data, rds_data = (idle.get(name, []) for name in COST_COLUMNS)
+    else:
+        ec2_data = load_idle("idle_ec2", store_dir, output_path)
+        ebs_data = load_idle("idle_ebs", store_dir, output_path)
+        s3_data = load_idle("idle_s3", store_dir, output_path)
+        rds_data = load_idle("idle_rds", store_dir, output_path)
+    if pricing is not None:
+        ec2_data, ebs_data, s3_data, rds_data = (list(d) for d in (ec2_data, ebs_data, s3_data, rds_data))
 
     total_cost = 0
     total_savings = 0
 
     # --- EC2 ---
-    for ec2 in ec2_data:
-        hours = ec2.get("running_hours", 100)
-        cost = hours * AWS_PRICING["EC2"]
+    for ec2, rate in zip(ec2_data, record_rates("EC2", ec2_data, pricing)):
+        cost = HOURS_PER_MONTH * rate
         if ec2.get("idle", False):
             savings = cost * 0.7
             total_savings += savings
         total_cost += cost
 
     # --- EBS ---
-    for ebs in ebs_data:
-        size_gb = ebs.get("size", 10)
-        cost = size_gb * AWS_PRICING["EBS"]
+    for ebs, rate in zip(ebs_data, record_rates("EBS", ebs_data, pricing)):
+        size_gb = ebs.get("Size_GB") or 0
+        cost = size_gb * rate
         if ebs.get("unused", False):
             savings = cost * 0.8
             total_savings += savings
         total_cost += cost
 
     # --- S3 ---
-    for s3 in s3_data:
-        size_gb = s3.get("size", 5)
-        cost = size_gb * AWS_PRICING["S3"]
+    for s3, rate in zip(s3_data, record_rates("S3", s3_data, pricing)):
+        size_gb = (s3.get("TotalSizeBytes") or 0) / BYTES_PER_GB
+        cost = size_gb * rate
         if s3.get("inactive", False):
             savings = cost * 0.5
             total_savings += savings
         total_cost += cost
 
     # --- RDS ---
-    for rds in rds_data:
-        hours = rds.get("running_hours", 80)
-        cost = hours * AWS_PRICING["RDS"]
+    for rds, rate in zip(rds_data, record_rates("RDS", rds_data, pricing)):
+        cost = HOURS_PER_MONTH * rate
         if rds.get("idle", False):
             savings = cost * 0.6
             total_savings += savings
@@ -78,9 +144,11 @@ def calculate_cost_and_savings():
     }
 
     # Save output
-    output_file = os.path.join(OUTPUT_PATH, "cost_estimation.json")
-    with open(output_file, "w") as f:
-        json.dump(result, f, indent=4)
+    if save:
+        os.makedirs(output_path, exist_ok=True)
+        output_file = os.path.join(output_path, "cost_estimation.json")
+        with open(output_file, "w") as f:
+            json.dump(result, f, indent=4)
 
     print("✅ Cost calculation complete!")
     print(json.dumps(result, indent=4))
@@ -89,4 +157,9 @@ def calculate_cost_and_savings():
 
 # ---------- Run module ----------
 if __name__ == "__main__":
-    calculate_cost_and_savings()
+    parser = argparse.ArgumentParser(description="CloudMind - Cost calculation")
+    parser.add_argument("--store", default=os.getenv("CLOUDMIND_STORE_DIR"), help="Read idle resources from this Parquet inventory store")
+    parser.add_argument("--price-list", nargs="+", default=None, help="AWS Price List bulk JSON file(s) or trimmed CSV (service,region,key,price,unit)")
+    args = parser.parse_args()
+    engine = PricingEngine.load(args.price_list) if args.price_list else None
+    calculate_cost_and_savings(args.store, engine)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+CloudMind Analytics - Cost and Usage Report ingestion
+-----------------------------------------------------
+Streams AWS Cost and Usage Report files (CSV, optionally gzipped, or
+Parquet) and aggregates them into daily cost per service, optionally split
+per usage account and / or a cost allocation tag. Only the needed columns
+are read, with explicit types, one batch at a time, and each batch is
+reduced to daily totals right away, so memory depends on the number of
+(day, service, ...) groups, not on the size of the report.
+
+The daily aggregate is cached as Parquet, keyed by the source files (path,
+size, mtime) and options, and returned in the Date + one-column-per-resource
+shape ml_prediction forecasts from.
+"""
+
+import argparse
+import csv
+import gzip
+import hashlib
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+CUR_CACHE_DIR = "output/cur_cache"
+CSV_BLOCK_SIZE = 16 << 20   # bytes per CSV block
+BATCH_SIZE = 256 * 1024     # rows per Parquet batch
+COMPACT_EVERY = 64          # partial aggregates kept before they are merged
+
+# Logical fields -> normalized CUR column names (legacy CSV "lineItem/UsageStartDate" and
+# Parquet "line_item_usage_start_date" both normalize to "lineitemusagestartdate")
+DATE_FIELD = "lineitemusagestartdate"
+SERVICE_FIELD = "lineitemproductcode"
+ACCOUNT_FIELD = "lineitemusageaccountid"
+COST_FIELDS = {
+    "unblended": "lineitemunblendedcost",
+    "blended": "lineitemblendedcost",
+    "net": "lineitemnetunblendedcost",
+}
+
+
+def _norm(name):
+    return "".join(ch for ch in name.lower() if ch.isalnum())
+
+
+def _tag_field(tag):
+    """"user:Team" -> normalized "resourceTags/user:Team" / "resource_tags_user_team"."""
+    return _norm("resourcetags" + tag)
+
+
+def find_cur_files(paths, cache_dir=CUR_CACHE_DIR):
+    """Expand directories into the CUR data files (.csv, .csv.gz, .parquet) below them, skipping the cache."""
+    skip = os.path.abspath(cache_dir)
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != skip]
+                files += [os.path.join(root, n) for n in names if n.endswith((".csv", ".csv.gz", ".parquet"))]
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+# ===== Readers =====
+def _wanted_columns(path, names, fields, cost_field):
+    """Map each wanted normalized field to the file's own column name."""
+    by_norm = {_norm(n): n for n in names}
+    missing = [f for f in (DATE_FIELD, cost_field) if f not in by_norm]
+    if missing:
+        raise ValueError(f"{path} is missing CUR column(s): {', '.join(missing)}")
+    return {field: by_norm[field] for field in fields if field in by_norm}
+
+
+def _csv_batches(path, fields, cost_field):
+    with (gzip.open if path.endswith(".gz") else open)(path, "rt", encoding="utf-8-sig", newline="") as f:
+        header = next(csv.reader(f))
+    cols = _wanted_columns(path, header, fields, cost_field)
+    types = {name: pa.string() for name in cols.values()}
+    types[cols[DATE_FIELD]] = pa.timestamp("s", tz="UTC")
+    types[cols[cost_field]] = pa.float64()
+    reader = pa_csv.open_csv(
+        pa.input_stream(path, compression="detect"),
+        read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+        convert_options=pa_csv.ConvertOptions(include_columns=list(cols.values()), column_types=types),
+    )
+    for batch in reader:
+        yield batch, cols
+
+
+def _parquet_batches(path, fields, cost_field):
+    pf = pq.ParquetFile(path)
+    cols = _wanted_columns(path, pf.schema_arrow.names, fields, cost_field)
+    for batch in pf.iter_batches(batch_size=BATCH_SIZE, columns=list(cols.values())):
+        yield batch, cols
+
+
+# ===== Aggregation =====
+def _daily(batch, cols, keys, cost_field):
+    """Reduce one batch to (Date, *keys, Cost) daily totals."""
+    date = batch.column(cols[DATE_FIELD])
+    if not pa.types.is_timestamp(date.type):
+        date = pc.cast(date, pa.timestamp("s", tz="UTC"))
+    data = {"Date": pc.cast(date, pa.date32())}
+    for key in keys:
+        column = batch.column(cols[key]) if key in cols else pa.nulls(batch.num_rows, pa.string())
+        data[key] = pc.fill_null(pc.cast(column, pa.string()), "")
+    data["Cost"] = pc.fill_null(pc.cast(batch.column(cols[cost_field]), pa.float64()), 0.0)
+    return pa.table(data).group_by(["Date"] + keys).aggregate([("Cost", "sum")]).rename_columns(
+        ["Date"] + keys + ["Cost"])
+
+
+def _merge(parts, keys):
+    return pa.concat_tables(parts).group_by(["Date"] + keys).aggregate([("Cost", "sum")]).rename_columns(
+        ["Date"] + keys + ["Cost"])
+
+
+def aggregate_cur(files, per_account=False, tag=None, cost="unblended"):
+    """Stream CUR files into a long Arrow table: Date, service, [account], [tag], Cost."""
+    keys = [SERVICE_FIELD] + ([ACCOUNT_FIELD] if per_account else []) + ([_tag_field(tag)] if tag else [])
+    cost_field = COST_FIELDS[cost]
+    fields = [DATE_FIELD] + keys + [cost_field]
+    parts = []
+    for path in files:
+        reader = _parquet_batches if path.endswith(".parquet") else _csv_batches
+        for batch, cols in reader(path, fields, cost_field):
+            parts.append(_daily(batch, cols, keys, cost_field))
+            if len(parts) >= COMPACT_EVERY:
+                parts = [_merge(parts, keys)]
+    if not parts:
+        return pa.table({"Date": pa.array([], pa.date32()), **{k: pa.array([], pa.string()) for k in keys},
+                         "Cost": pa.array([], pa.float64())})
+    return _merge(parts, keys).sort_by([("Date", "ascending")] + [(k, "ascending") for k in keys])
+
+
+def _cache_path(files, per_account, tag, cost, cache_dir):
+    stamp = "|".join(f"{os.path.abspath(p)}:{os.path.getsize(p)}:{os.stat(p).st_mtime_ns}" for p in files)
+    stamp += f"|account={per_account}|tag={tag}|cost={cost}"
+    return os.path.join(cache_dir, hashlib.sha1(stamp.encode()).hexdigest() + ".parquet")
+
+
+def load_cur_daily(paths, per_account=False, tag=None, cost="unblended", cache_dir=CUR_CACHE_DIR):
+    """Daily aggregate of the CUR files under `paths`, read from the Parquet cache when the sources are unchanged."""
+    files = find_cur_files([paths] if isinstance(paths, str) else paths, cache_dir)
+    cache_path = _cache_path(files, per_account, tag, cost, cache_dir)
+    if os.path.exists(cache_path):
+        return pq.read_table(cache_path)
+    table = aggregate_cur(files, per_account, tag, cost)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = cache_path + ".tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, cache_path)
+    return table
+
+
+def load_cur_history(paths, per_account=False, tag=None, cost="unblended", cache_dir=CUR_CACHE_DIR):
+    """
+    CUR files -> cost history DataFrame shaped like ml_prediction.load_cost_history:
+    a Date column plus one cost column per service ("AmazonEC2", or "AmazonEC2 | <account> | <tag>"
+    when split). Days without cost for a column are 0.
+    """
+    table = load_cur_daily(paths, per_account, tag, cost, cache_dir)
+    df = table.to_pandas()
+    keys = [c for c in df.columns if c not in ("Date", "Cost")]
+    df["Resource"] = df[keys].astype(str).agg(" | ".join, axis=1) if len(keys) > 1 else df[keys[0]]
+    history = df.pivot_table(index="Date", columns="Resource", values="Cost", aggfunc="sum", fill_value=0.0)
+    history.columns.name = None
+    history = history.reset_index()
+    history["Date"] = history["Date"].astype("datetime64[ns]")
+    return history
+
+
+# ===== Entry Point =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CloudMind - Aggregate Cost and Usage Report files into daily costs")
+    parser.add_argument("paths", nargs="+", help="CUR files or directories (.csv, .csv.gz, .parquet)")
+    parser.add_argument("--per-account", action="store_true", help="Split each service per usage account")
+    parser.add_argument("--tag", default=None, help="Split each service per cost allocation tag (e.g. user:Team)")
+    parser.add_argument("--cost", choices=sorted(COST_FIELDS), default="unblended", help="CUR cost column to sum")
+    args = parser.parse_args()
+    history = load_cur_history(args.paths, args.per_account, args.tag, args.cost)
+    print(f"✅ {len(history)} days x {len(history.columns) - 1} resources aggregated.")
+    print(history.tail())
@@ -3,27 +3,145 @@
 import streamlit as st
 import json
 import os
+import re
 from datetime import datetime
 
+import numpy as np
+import pandas as pd
+
+from pricing import region_from_az
+
 # -------------------------------
 # Step 1: Paths
 # -------------------------------
 ANALYSIS_PATH = "output/analysis"
 PREDICTIONS_PATH = "output/predictions/ml_cost_predictions.json"
+STORE_DIR = os.getenv("CLOUDMIND_STORE_DIR")  # optional Parquet inventory store
+
+# Columns shown for each idle resource type
+DISPLAY_COLUMNS = {
+    "idle_ec2": ["InstanceId", "State", "StoppedDays"],
+    "idle_ebs": ["VolumeId", "Size_GB", "Attachments"],
+    "idle_s3": ["Name", "AgeDays", "ObjectCount"],
+    "idle_rds": ["DBInstanceIdentifier", "DBInstanceStatus", "IdleDays"],
+}
+
+# Type column per idle resource type (filterable, next to Account / Region / Tags)
+TYPE_COLUMNS = {
+    "idle_ec2": "InstanceType",
+    "idle_ebs": "VolumeType",
+    "idle_s3": "StorageClass",
+    "idle_rds": "DBInstanceClass",
+}
+FILTER_COLUMNS = ["Account", "Region", "Type"]
+PAGE_SIZES = [25, 50, 100, 250]
 
 # -------------------------------
-# Step 2: Load JSON Data
+# Step 2: Load JSON Data (cached per data version)
 # -------------------------------
-def load_json(file_path):
+# Loaders are keyed on (path, mtime, size) and shared by every session, so reruns and
+# other viewers reuse the parsed data; a changed output file is a new key and is re-read.
+def file_version(path):
+    try:
+        st_ = os.stat(path)
+        return (path, st_.st_mtime_ns, st_.st_size)
+    except FileNotFoundError:
+        return (path, None, None)
+
+def idle_version(name):
+    """Data version of an idle result: the store partition files, or the newest .json / .jsonl file."""
+    if STORE_DIR and os.path.isdir(os.path.join(STORE_DIR, name)):
+        files = []
+        for root, _, names in os.walk(os.path.join(STORE_DIR, name)):
+            files += [file_version(os.path.join(root, n)) for n in names if n.endswith(".parquet")]
+        return ("store", tuple(sorted(files)))
+    versions = [file_version(os.path.join(ANALYSIS_PATH, f"{name}{ext}")) for ext in (".json", ".jsonl")]
+    versions = [v for v in versions if v[1] is not None]
+    return ("file", max(versions, key=lambda v: v[1]) if versions else None)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _load_json(file_path, version):
     if os.path.exists(file_path):
         with open(file_path, "r") as f:
             return json.load(f)
     return {}
 
-idle_ec2 = load_json(os.path.join(ANALYSIS_PATH, "idle_ec2.json"))
-idle_ebs = load_json(os.path.join(ANALYSIS_PATH, "idle_ebs.json"))
-idle_s3 = load_json(os.path.join(ANALYSIS_PATH, "idle_s3.json"))
-idle_rds = load_json(os.path.join(ANALYSIS_PATH, "idle_rds.json"))
+def load_json(file_path):
+    return _load_json(file_path, file_version(file_path))
+
+def _tag_text(tags):
+    if isinstance(tags, dict):
+        return "; ".join(f"{k}={v}" for k, v in tags.items())
+    if isinstance(tags, list):
+        return "; ".join(f"{t.get('Key')}={t.get('Value')}" for t in tags if isinstance(t, dict))
+    return ""
+
+def idle_frame(name, records):
+    """
+    Idle records -> DataFrame of the displayed columns plus Account / Region / Type / Tags
+    and a lowercase search column, so the tables filter and sort column-wise.
+    """
+    df = pd.DataFrame.from_records(records) if records else pd.DataFrame()
+    out = pd.DataFrame(index=df.index)
+    for col in DISPLAY_COLUMNS[name]:
+        values = df[col] if col in df else pd.Series("", index=df.index)
+        if values.map(lambda v: isinstance(v, (list, dict))).any():
+            values = values.map(lambda v: json.dumps(v, default=str) if isinstance(v, (list, dict)) else v)
+        out[col] = values
+    blank = pd.Series("", index=df.index)
+    account = next((df[c] for c in ("Account", "AccountId", "account") if c in df), blank)
+    out["Account"] = account.fillna("").astype(str)
+    region = df["Region"] if "Region" in df else blank
+    if "AvailabilityZone" in df:
+        region = region.where(region.fillna("") != "", df["AvailabilityZone"].map(region_from_az))
+    if "region" in df:
+        region = region.where(region.fillna("") != "", df["region"])
+    out["Region"] = region.fillna("").astype(str)
+    out["Type"] = (df[TYPE_COLUMNS[name]] if TYPE_COLUMNS[name] in df else blank).fillna("").astype(str)
+    out["Tags"] = df["Tags"].map(_tag_text) if "Tags" in df else blank
+    out["_search"] = (out[DISPLAY_COLUMNS[name][0]].astype(str) + " " + out["Tags"]).str.lower()
+    return out.reset_index(drop=True)
+
+# cache_resource: idle lists can be large, so sessions share one read-only copy instead of
+# unpickling their own on every rerun (cache_data copies). The file is read here rather than
+# through load_json, so only the frame is cached, not the raw list as well.
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _load_idle(name, version):
+    kind, source = version
+    if kind == "store":
+        # read only the columns the table needs when an inventory store is configured
+        import inventory_store
+        columns = DISPLAY_COLUMNS[name] + [TYPE_COLUMNS[name], "AvailabilityZone", "Region", "Tags"]
+        records = list(inventory_store.iter_records(STORE_DIR, name, columns=columns, with_partition=True))
+    elif source:
+        with open(source[0], "r") as f:
+            if source[0].endswith(".jsonl"):
+                records = [json.loads(line) for line in f if line.strip()]
+            else:
+                records = json.load(f)
+    else:
+        records = []
+    frame = idle_frame(name, records)
+    tags = sorted({t for text in frame["Tags"].unique() for t in text.split("; ") if t})
+    options = {col: sorted(v for v in frame[col].unique() if v) for col in FILTER_COLUMNS}
+    options["Tags"] = tags
+    return {"frame": frame, "count": len(frame), "options": options}
+
+def load_idle(name):
+    return _load_idle(name, idle_version(name))
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def summarize(versions):
+    """Counts and totals for the header metrics, computed once per data version."""
+    idle = {name: load_idle(name) for name in DISPLAY_COLUMNS}
+    ebs_gb = int(pd.to_numeric(idle["idle_ebs"]["frame"]["Size_GB"], errors="coerce").fillna(0).sum())
+    return {
+        "counts": {name: data["count"] for name, data in idle.items()},
+        "total": sum(data["count"] for data in idle.values()),
+        "ebs_gb": ebs_gb,
+    }
+
+summary = summarize(tuple(idle_version(name) for name in DISPLAY_COLUMNS))
 cost_estimation = load_json(os.path.join(ANALYSIS_PATH, "cost_estimation.json"))
 ml_predictions = load_json(PREDICTIONS_PATH)
 
@@ -59,18 +177,63 @@ st.markdown("---")
 # -------------------------------
 st.header("🛠️ Idle / Underutilized Resources")
 
-def display_resources(title, data, keys):
+m1, m2, m3, m4, m5 = st.columns(5)
+m1.metric("Idle Resources", summary["total"])
+m2.metric("EC2 Instances", summary["counts"]["idle_ec2"])
+m3.metric("EBS Volumes", summary["counts"]["idle_ebs"], f"{summary['ebs_gb']} GB", delta_color="off")
+m4.metric("S3 Buckets", summary["counts"]["idle_s3"])
+m5.metric("RDS Instances", summary["counts"]["idle_rds"])
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def query_rows(name, version, search, filters, tags, sort_by, ascending):
+    """Row positions matching the filters, in display order (cached per data version and query)."""
+    df = load_idle(name)["frame"]
+    mask = np.ones(len(df), dtype=bool)
+    for col, selected in filters:
+        if selected:
+            mask &= df[col].isin(selected).to_numpy()
+    for tag in tags:
+        mask &= df["Tags"].str.contains(f"(?:^|; ){re.escape(tag)}(?:;|$)", regex=True).to_numpy()
+    if search:
+        mask &= df["_search"].str.contains(search.lower(), regex=False).to_numpy()
+    rows = np.flatnonzero(mask)
+    if sort_by:
+        order = df[sort_by].iloc[rows].sort_values(ascending=ascending, kind="stable", na_position="last")
+        rows = order.index.to_numpy()  # frame has a RangeIndex, so labels are positions
+    return rows
+
+def display_resources(title, name):
     st.subheader(title)
-    if data:
-        for i, r in enumerate(data):
-            st.write(f"{i+1}. " + ", ".join([f"{k}: {r.get(k, 'N/A')}" for k in keys]))
-    else:
+    data = load_idle(name)
+    if not data["count"]:
         st.success("✅ No idle resources found.")
+        return
+    df, options = data["frame"], data["options"]
+    columns = DISPLAY_COLUMNS[name] + FILTER_COLUMNS + ["Tags"]
+
+    c = st.columns([3, 2, 2, 2, 2])
+    search = c[0].text_input("Search", key=f"{name}_search", placeholder="ID or tag")
+    filters = tuple((col, tuple(c[i + 1].multiselect(col, options[col], key=f"{name}_{col}")))
+                    for i, col in enumerate(FILTER_COLUMNS))
+    tags = tuple(c[4].multiselect("Tags", options["Tags"], key=f"{name}_tags"))
+    s1, s2, s3, s4 = st.columns([3, 2, 2, 2])
+    sort_by = s1.selectbox("Sort by", [None] + columns, key=f"{name}_sort", format_func=lambda v: v or "—")
+    ascending = s2.radio("Order", ["Ascending", "Descending"], key=f"{name}_order", horizontal=True) == "Ascending"
+    page_size = s3.selectbox("Rows per page", PAGE_SIZES, key=f"{name}_page_size")
+
+    rows = query_rows(name, idle_version(name), search, filters, tags, sort_by, ascending)
+    pages = max(1, -(-len(rows) // page_size))
+    page = s4.number_input("Page", min_value=1, max_value=pages, value=1, step=1, key=f"{name}_page")
+    start = (min(page, pages) - 1) * page_size
+    # only the current page is sent to the browser
+    st.dataframe(df.iloc[rows[start:start + page_size]][columns], hide_index=True, width="stretch")
+    st.caption(f"Showing {min(start + 1, len(rows))}–{min(start + page_size, len(rows))} of {len(rows)}"
+               + (f" (filtered from {data['count']})" if len(rows) != data["count"] else ""))
 
-display_resources("EC2 Instances", idle_ec2, ["InstanceId", "State", "StoppedDays"])
-display_resources("EBS Volumes", idle_ebs, ["VolumeId", "Size", "Attachments"])
-display_resources("S3 Buckets", idle_s3, ["Name", "AgeDays", "ObjectCount"])
-display_resources("RDS Instances", idle_rds, ["DBInstanceIdentifier", "DBInstanceStatus", "IdleDays"])
+display_resources("EC2 Instances", "idle_ec2")
+display_resources("EBS Volumes", "idle_ebs")
+display_resources("S3 Buckets", "idle_s3")
+display_resources("RDS Instances", "idle_rds")
 st.markdown("---")
 
 # -------------------------------
@@ -93,16 +256,16 @@ st.markdown("---")
 # -------------------------------
 st.header("✅ Recommendations")
 
-if idle_ec2:
+if summary["counts"]["idle_ec2"]:
     st.info("• Stop EC2 instances that are stopped >7 days to save cost.")
-if idle_ebs:
+if summary["counts"]["idle_ebs"]:
     st.info("• Detach / delete unused EBS volumes.")
-if idle_s3:
+if summary["counts"]["idle_s3"]:
     st.info("• Delete old or empty S3 buckets to reduce storage cost.")
-if idle_rds:
+if summary["counts"]["idle_rds"]:
     st.info("• Stop idle RDS instances or downscale.")
 
-if not (idle_ec2 or idle_ebs or idle_s3 or idle_rds):
+if not summary["total"]:
     st.success("All resources are optimized. No immediate action required.")
 
 # -------------------------------
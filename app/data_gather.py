@@ -9,17 +9,43 @@ import boto3
 import json
 import os
 import argparse
-from botocore.exceptions import NoCredentialsError, ClientError
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.exceptions import BotoCoreError, NoCredentialsError, ClientError
+from s3_sizing import size_buckets
+from aws_throttle import make_client, format_stats
 
 def create_session(profile=None):
     if profile:
         return boto3.Session(profile_name=profile)
     return boto3.Session()
 
-def list_ec2_instances(session, region):
+class ClientPool:
+    """
+    One reused boto3 client per (service, region).
+    Exposes the same client(service, region_name=...) call as a boto3 Session,
+    so every list_* function accepts either. Sessions are not thread-safe, so
+    client creation is serialized; the clients themselves can be shared.
+    Clients are rate limited and retried through aws_throttle, with one quota
+    scope per profile.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.scope = getattr(session, "profile_name", None)
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, service, region_name=None):
+        key = (service, region_name)
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = make_client(self.session, service, region_name, scope=self.scope)
+            return self._clients[key]
+
+def iter_ec2_instances(session, region):
     ec2 = session.client("ec2", region_name=region)
     paginator = ec2.get_paginator("describe_instances")
-    instances = []
     for page in paginator.paginate():
         for res in page.get("Reservations", []):
             for i in res.get("Instances", []):
@@ -39,16 +65,17 @@ def list_ec2_instances(session, region):
                     if v:
                         vols.append(v)
                 inst["AttachedVolumes"] = vols
-                instances.append(inst)
-    return instances
+                yield inst
 
-def list_ebs_volumes(session, region):
+def list_ec2_instances(session, region):
+    return list(iter_ec2_instances(session, region))
+
+def iter_ebs_volumes(session, region):
     ec2 = session.client("ec2", region_name=region)
     paginator = ec2.get_paginator("describe_volumes")
-    volumes = []
     for page in paginator.paginate():
         for v in page.get("Volumes", []):
-            volumes.append({
+            yield {
                 "VolumeId": v.get("VolumeId"),
                 "Size_GB": v.get("Size"),
                 "State": v.get("State"),
@@ -65,51 +92,68 @@ def list_ebs_volumes(session, region):
                     } for a in v.get("Attachments", [])
                 ],
                 "Tags": v.get("Tags", [])
-            })
-    return volumes
+            }
+
+def list_ebs_volumes(session, region):
+    return list(iter_ebs_volumes(session, region))
+
+def _account_id(session):
+    """Account ID of a session or ClientPool's credentials, or None if STS is unavailable."""
+    try:
+        return session.client("sts").get_caller_identity()["Account"]
+    except (BotoCoreError, ClientError):
+        return None
+
+def sizing_identity(session):
+    """Account ID of the session (profile name if STS is unavailable), so S3 sizing checkpoints stay per account."""
+    account = _account_id(session)
+    if account:
+        return account
+    session = getattr(session, "session", session)
+    return f"profile:{getattr(session, 'profile_name', None)}"
 
-def list_s3_buckets(session, count_objects=False, max_objects_per_bucket=None):
+def list_s3_buckets(session, count_objects=False, max_objects_per_bucket=None, workers=1,
+                    shard_delimiter=None, checkpoint_path=None):
     s3 = session.client("s3")
     resp = s3.list_buckets()
-    buckets = []
-    for b in resp.get("Buckets", []):
-        name = b.get("Name")
-        created = b.get("CreationDate").isoformat() if b.get("CreationDate") else None
+    names = [b.get("Name") for b in resp.get("Buckets", [])]
+
+    def bucket_region(name):
         # get region / location
-        region = None
         try:
-            region = s3.get_bucket_location(Bucket=name).get("LocationConstraint")
+            return s3.get_bucket_location(Bucket=name).get("LocationConstraint")
         except ClientError:
-            region = None
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers or 1)) as executor:
+        regions = list(executor.map(bucket_region, names))
+    sizes = {}
+    if count_objects:
+        identity = sizing_identity(session) if checkpoint_path else None
+        sizes = size_buckets(s3, names, workers, shard_delimiter, max_objects_per_bucket, checkpoint_path, identity)
+
+    buckets = []
+    for b, region in zip(resp.get("Buckets", []), regions):
+        name = b.get("Name")
+        created = b.get("CreationDate").isoformat() if b.get("CreationDate") else None
         info = {"Name": name, "CreationDate": created, "Region": region}
         if count_objects:
-            total_size = 0
-            total_objects = 0
-            paginator = s3.get_paginator("list_objects_v2")
-            try:
-                for page in paginator.paginate(Bucket=name):
-                    contents = page.get("Contents", [])
-                    total_objects += len(contents)
-                    for obj in contents:
-                        total_size += obj.get("Size", 0)
-                    if max_objects_per_bucket and total_objects >= max_objects_per_bucket:
-                        break
-                info["ObjectCount"] = total_objects
-                info["TotalSizeBytes"] = total_size
-            except ClientError as e:
-                info["ObjectCount"] = None
-                info["TotalSizeBytes"] = None
-                info["Error"] = str(e)
+            info.update(sizes[name])
         buckets.append(info)
     return buckets
 
-def list_rds_instances(session, region):
+def list_s3_buckets_from_inventory(session, inventory_dir, workers=1):
+    """Bucket list sized from local S3 Inventory reports instead of live object listing."""
+    from s3_inventory import summarize_inventory, merge_inventory
+    buckets = list_s3_buckets(session, False, workers=workers)
+    return merge_inventory(buckets, summarize_inventory(inventory_dir))
+
+def iter_rds_instances(session, region):
     rds = session.client("rds", region_name=region)
-    instances = []
-    try:
-        resp = rds.describe_db_instances()
-        for db in resp.get("DBInstances", []):
-            instances.append({
+    paginator = rds.get_paginator("describe_db_instances")
+    for page in paginator.paginate():
+        for db in page.get("DBInstances", []):
+            yield {
                 "DBInstanceIdentifier": db.get("DBInstanceIdentifier"),
                 "DBInstanceClass": db.get("DBInstanceClass"),
                 "Engine": db.get("Engine"),
@@ -122,37 +166,123 @@ def list_rds_instances(session, region):
                 "InstanceCreateTime": db.get("InstanceCreateTime").isoformat() if db.get("InstanceCreateTime") else None,
                 "AvailabilityZone": db.get("AvailabilityZone"),
                 "StorageType": db.get("StorageType")
-            })
-    except ClientError as e:
-        raise
-    return instances
+            }
+
+def list_rds_instances(session, region):
+    return list(iter_rds_instances(session, region))
 
 def save_json(obj, path):
     with open(path, "w") as f:
         json.dump(obj, f, indent=2, default=str)
     return path
 
-def gather_all(profile, regions, count_s3=False, max_objects=None, out_dir="output"):
+def save_jsonl(records, path):
+    """Write one JSON object per line as records arrive (records may be a generator)."""
+    with open(path, "w") as f:
+        for rec in records:
+            f.write(json.dumps(rec, default=str))
+            f.write("\n")
+    return path
+
+# Output format -> (file extension, writer for an iterable of records)
+OUTPUT_FORMATS = {
+    "json": (".json", lambda records, path: save_json(list(records), path)),
+    "jsonl": (".jsonl", save_jsonl),
+}
+
+# Per-region collectors, in the order the serial path runs them
+REGION_SERVICES = [
+    ("ec2_instances", iter_ec2_instances),
+    ("ebs_volumes", iter_ebs_volumes),
+    ("rds_instances", iter_rds_instances),
+]
+
+def _gather(sink, records_fn, *args):
+    return sink(records_fn(*args))
+
+def _run_collection(pool, regions, sink_for, count_s3=False, max_objects=None, workers=1,
+                    s3_shard_delimiter=None, s3_checkpoint=None, s3_inventory=None):
+    """Run the S3 listing and every (region, service) listing, handing each result to sink_for(name, region)."""
+    # S3 (global) first, then one task per (region, service)
+    if s3_inventory:
+        tasks = [(list_s3_buckets_from_inventory, (pool, s3_inventory, workers), sink_for("s3_buckets"))]
+    else:
+        tasks = [(list_s3_buckets, (pool, count_s3, max_objects, workers, s3_shard_delimiter, s3_checkpoint),
+                  sink_for("s3_buckets"))]
+    for region in regions:
+        for name, records_fn in REGION_SERVICES:
+            tasks.append((records_fn, (pool, region), sink_for(name, region)))
+
+    if workers and workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_gather, sink, fn, *args) for fn, args, sink in tasks]
+            try:
+                for fut in as_completed(futures):
+                    fut.result()
+            except Exception:
+                for fut in futures:
+                    fut.cancel()
+                raise
+    else:
+        for fn, args, sink in tasks:
+            _gather(sink, fn, *args)
+
+def collect_all(profile, regions, count_s3=False, max_objects=None, workers=1,
+                s3_shard_delimiter=None, s3_checkpoint=None, s3_inventory=None):
+    """
+    Gather into memory instead of files (used by the in-process pipeline).
+    Returns {"s3_buckets": [...], "ec2_instances": {region: [...]}, "ebs_volumes": {...}, "rds_instances": {...}}.
+    """
+    pool = ClientPool(create_session(profile))
+    collected = {"s3_buckets": []}
+    for name, _ in REGION_SERVICES:
+        collected[name] = {region: [] for region in regions}
+
+    def sink_for(name, region=None):
+        target = collected[name] if region is None else collected[name][region]
+        return target.extend
+
+    _run_collection(pool, regions, sink_for, count_s3, max_objects, workers,
+                    s3_shard_delimiter, s3_checkpoint, s3_inventory)
+    return collected
+
+def gather_all(profile, regions, count_s3=False, max_objects=None, out_dir="output", workers=1,
+               s3_shard_delimiter=None, s3_checkpoint=None, s3_inventory=None, output_format="json",
+               store_dir=None):
     os.makedirs(out_dir, exist_ok=True)
-    session = create_session(profile)
-    summary = {}
-    # S3 (global)
-    buckets = list_s3_buckets(session, count_s3, max_objects)
-    save_json(buckets, os.path.join(out_dir, "s3_buckets.json"))
-    summary["s3_buckets_file"] = "s3_buckets.json"
+    pool = ClientPool(create_session(profile))
+    if output_format == "parquet":
+        # columnar store: one partition per (dataset, account, region, snapshot date)
+        import inventory_store
+        store_dir = store_dir or inventory_store.STORE_DIR
+        account = _account_id(pool) or "unknown"
+        snapshot = inventory_store.today()
+
+        def sink_for(name, region="global"):
+            return lambda records: inventory_store.write_records(store_dir, name, records, account, region, snapshot)
+
+        def entry(name, region=None):
+            return {f"{name}_dataset": name}
+    else:
+        ext, writer = OUTPUT_FORMATS[output_format]
+
+        def sink_for(name, region=None):
+            path = os.path.join(out_dir, f"{name}_{region}{ext}" if region else f"{name}{ext}")
+            return lambda records: writer(records, path)
+
+        def entry(name, region=None):
+            return {f"{name}_file": f"{name}_{region}{ext}" if region else f"{name}{ext}"}
+
+    _run_collection(pool, regions, sink_for, count_s3, max_objects, workers,
+                    s3_shard_delimiter, s3_checkpoint, s3_inventory)
+
+    summary = entry("s3_buckets")
+    if output_format == "parquet":
+        summary.update({"store": store_dir, "account": account, "snapshot_date": snapshot})
     for region in regions:
-        region_data = {}
-        region_data["ec2_instances"] = list_ec2_instances(session, region)
-        save_json(region_data["ec2_instances"], os.path.join(out_dir, f"ec2_instances_{region}.json"))
-        region_data["ebs_volumes"] = list_ebs_volumes(session, region)
-        save_json(region_data["ebs_volumes"], os.path.join(out_dir, f"ebs_volumes_{region}.json"))
-        region_data["rds_instances"] = list_rds_instances(session, region)
-        save_json(region_data["rds_instances"], os.path.join(out_dir, f"rds_instances_{region}.json"))
-        summary[region] = {
-            "ec2_instances_file": f"ec2_instances_{region}.json",
-            "ebs_volumes_file": f"ebs_volumes_{region}.json",
-            "rds_instances_file": f"rds_instances_{region}.json"
-        }
+        summary[region] = {}
+        for name, _ in REGION_SERVICES:
+            summary[region].update(entry(name, region))
     save_json(summary, os.path.join(out_dir, "summary.json"))
     return summary
 
@@ -163,12 +293,22 @@ if __name__ == "__main__":
     parser.add_argument("--count-s3", action="store_true", help="Count objects and total size for each S3 bucket (can be slow)")
     parser.add_argument("--max-objects", type=int, default=None, help="Max objects to scan per bucket (testing)")
     parser.add_argument("--out", default="output", help="Output directory")
+    parser.add_argument("--workers", type=int, default=1, help="Concurrent API workers across regions/services (1 = serial)")
+    parser.add_argument("--s3-shard-delimiter", default=None, help="Split each bucket into key-prefix shards on this delimiter (e.g. /) and list them in parallel")
+    parser.add_argument("--s3-checkpoint", default=None, help="Checkpoint file for S3 sizing progress; an interrupted --count-s3 scan resumes from it")
+    parser.add_argument("--s3-inventory", default=None, help="Local directory of S3 Inventory reports to size buckets from (replaces --count-s3)")
+    parser.add_argument("--format", choices=sorted(OUTPUT_FORMATS) + ["parquet"], default="json", help="json (indented list), jsonl (streamed, one record per line) or parquet (columnar inventory store)")
+    parser.add_argument("--store", default=None, help="Inventory store directory for --format parquet (default output/store)")
     args = parser.parse_args()
     try:
-        summary = gather_all(args.profile, args.regions, args.count_s3, args.max_objects, args.out)
+        summary = gather_all(args.profile, args.regions, args.count_s3, args.max_objects, args.out, args.workers,
+                             args.s3_shard_delimiter, args.s3_checkpoint, args.s3_inventory, args.format,
+                             args.store)
         print("Data gathering complete. Summary:")
         print(json.dumps(summary, indent=2))
         print(f"Output files are in ./{args.out}/")
+        print("API calls:")
+        print(format_stats())
     except NoCredentialsError:
         print("ERROR: AWS credentials not found. Set AWS_PROFILE or export credentials.")
     except ClientError as e:
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+CloudMind Analytics - Scan fan-out
+----------------------------------
+Dispatches scan shards, one (account, region, service) each, to workers and
+collects their partial results. A shard event is a plain JSON dict and the
+worker answers with {"shard": ..., "progress": ...} (lambda_function's shard
+mode), so the same loop runs shards in local threads or processes (testing,
+a single box) or as separate Lambda invocations:
+
+    transport = LocalTransport(handler, workers=8)                  # threads
+    transport = LocalTransport(handler, workers=4, processes=True)  # processes
+    transport = LambdaTransport(lambda_client, "cloudmind-scan", workers=50)
+
+Standard library only; LambdaTransport takes the caller's Lambda client.
+"""
+
+import json
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+MAX_ATTEMPTS = 3  # failed dispatches per shard before it is reported as failed
+
+
+# ===== Transports =====
+class LocalTransport:
+    """Runs handler(event) in a thread pool, or a process pool with processes=True."""
+
+    def __init__(self, handler, workers=8, processes=False):
+        self.handler = handler
+        pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self._executor = pool(max_workers=max(1, workers))
+
+    def submit(self, event):
+        return self._executor.submit(self.handler, event)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class LambdaTransport:
+    """Synchronous (RequestResponse) invocations of a worker function, `workers` in flight at a time."""
+
+    def __init__(self, lambda_client, function_name, workers=50):
+        self.client = lambda_client
+        self.function_name = function_name
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers))
+
+    def _invoke(self, event):
+        resp = self.client.invoke(FunctionName=self.function_name, InvocationType="RequestResponse",
+                                  Payload=json.dumps(event).encode("utf-8"))
+        payload = json.loads(resp["Payload"].read() or b"null")
+        if resp.get("FunctionError"):
+            raise RuntimeError(f"{self.function_name} failed: {payload}")
+        return payload
+
+    def submit(self, event):
+        return self._executor.submit(self._invoke, event)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+# ===== Fan-out / fan-in =====
+def new_shard_state(shard, progress):
+    return {"shard": shard, "progress": progress, "attempts": 0, "error": None}
+
+
+def shard_finished(state):
+    return state["progress"]["done"] or bool(state.get("error"))
+
+
+def run_shards(shards, transport, make_event, stop=None, max_attempts=MAX_ATTEMPTS):
+    """
+    Dispatch every unfinished shard and fold the results back into `shards` ({key: shard state},
+    updated in place). A shard that comes back unfinished is sent out again right away with its
+    continuation, unless it made no progress or stop() says the caller is out of time; one that
+    keeps failing is marked with its error. Returns True once every shard is finished.
+
+    Events carry the progress without its items and workers return only what they found, so
+    payloads stay small; the items are accumulated here.
+    """
+    futures = {}
+
+    def submit(key):
+        futures[transport.submit(make_event(key))] = (key, shards[key]["progress"]["pages"])
+
+    for key, state in shards.items():
+        if not shard_finished(state):
+            submit(key)
+
+    while futures:
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for fut in done:
+            key, pages_before = futures.pop(fut)
+            state = shards[key]
+            try:
+                progress = dict(fut.result()["progress"])
+            except Exception as e:
+                state["attempts"] += 1
+                if state["attempts"] >= max_attempts:
+                    state["error"] = str(e)
+                elif not (stop and stop()):
+                    submit(key)
+                continue
+            items = progress.pop("items", [])
+            state["progress"].update(progress)
+            state["progress"]["items"].extend(items)
+            if not shard_finished(state) and progress["pages"] > pages_before and not (stop and stop()):
+                submit(key)
+    return all(shard_finished(state) for state in shards.values())
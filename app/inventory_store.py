@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+CloudMind Analytics - Columnar inventory store
+----------------------------------------------
+Optional Parquet store shared by the gather, analysis, cost and dashboard
+stages. Each resource type is one hive-partitioned dataset:
+
+    <store>/<dataset>/account=<id>/region=<region>/snapshot_date=<YYYY-MM-DD>/part-0.parquet
+
+Readers load only the columns and partitions they ask for. Nested fields
+(Tags, Attachments, ...) are kept as JSON text; keys outside the schema go
+to an `_extra` JSON column and keys a record did not have are listed in
+`_absent`, so records round-trip exactly.
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+STORE_DIR = "output/store"
+BATCH_ROWS = 50_000
+PART_FILE = "part-0.parquet"
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("account", pa.string()), ("region", pa.string()), ("snapshot_date", pa.string())]),
+    flavor="hive",
+)
+
+# ===== Schemas =====
+_EC2 = [
+    ("InstanceId", pa.string()), ("InstanceType", pa.string()), ("State", pa.string()),
+    ("PublicIpAddress", pa.string()), ("PrivateIpAddress", pa.string()), ("LaunchTime", pa.string()),
+    ("AvailabilityZone", pa.string()), ("Tags", "json"), ("AttachedVolumes", "json"),
+]
+_EBS = [
+    ("VolumeId", pa.string()), ("Size_GB", pa.int64()), ("State", pa.string()), ("VolumeType", pa.string()),
+    ("Encrypted", pa.bool_()), ("AvailabilityZone", pa.string()), ("CreateTime", pa.string()),
+    ("Attachments", "json"), ("Tags", "json"),
+]
+_S3 = [
+    ("Name", pa.string()), ("CreationDate", pa.string()), ("Region", pa.string()),
+    ("ObjectCount", pa.int64()), ("TotalSizeBytes", pa.int64()), ("Error", pa.string()),
+    ("OldestObjectModified", pa.string()), ("NewestObjectModified", pa.string()), ("InventoryDate", pa.string()),
+]
+_RDS = [
+    ("DBInstanceIdentifier", pa.string()), ("DBInstanceClass", pa.string()), ("Engine", pa.string()),
+    ("EngineVersion", pa.string()), ("DBInstanceStatus", pa.string()), ("AllocatedStorage_GB", pa.int64()),
+    ("Endpoint", pa.string()), ("Port", pa.int64()), ("MultiAZ", pa.bool_()),
+    ("InstanceCreateTime", pa.string()), ("AvailabilityZone", pa.string()), ("StorageType", pa.string()),
+]
+
+DATASETS = {
+    "ec2_instances": _EC2,
+    "ebs_volumes": _EBS,
+    "s3_buckets": _S3,
+    "rds_instances": _RDS,
+    "idle_ec2": _EC2 + [("StoppedDays", pa.int64())],
+    "idle_ebs": _EBS,
+    "idle_s3": _S3 + [("AgeDays", pa.int64())],
+    "idle_rds": _RDS + [("IdleDays", pa.int64())],
+}
+
+
+def _arrow_schema(fields):
+    cols = [(name, pa.string() if typ == "json" else typ) for name, typ in fields]
+    return pa.schema(cols + [("_extra", pa.string()), ("_absent", pa.string())])
+
+
+def _json_fields(fields):
+    return {name for name, typ in fields if typ == "json"}
+
+
+def today():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+# ===== Writing =====
+def _encode(rec, fields, json_fields):
+    row = {}
+    absent = []
+    for name, _ in fields:
+        if name not in rec:
+            absent.append(name)
+            row[name] = None
+        elif name in json_fields:
+            row[name] = json.dumps(rec[name], default=str)
+        else:
+            row[name] = rec[name]
+    known = {name for name, _ in fields}
+    extra = {k: v for k, v in rec.items() if k not in known}
+    row["_extra"] = json.dumps(extra, default=str) if extra else None
+    row["_absent"] = json.dumps(absent) if absent else None
+    return row
+
+
+def write_records(store_dir, dataset, records, account="unknown", region="global", snapshot_date=None):
+    """
+    Stream records (any iterable) into one partition of a dataset, BATCH_ROWS at a time.
+    Re-writing the same partition replaces it, so a re-run of the same day is idempotent.
+    Returns the number of rows written.
+    """
+    fields = DATASETS[dataset]
+    schema = _arrow_schema(fields)
+    json_fields = _json_fields(fields)
+    part_dir = partition_path(store_dir, dataset, account, region, snapshot_date or today())
+    os.makedirs(part_dir, exist_ok=True)
+    tmp = os.path.join(part_dir, PART_FILE + ".tmp")
+    count = 0
+    with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+        batch = []
+        for rec in records:
+            batch.append(_encode(rec, fields, json_fields))
+            if len(batch) >= BATCH_ROWS:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+                batch = []
+        if batch or count == 0:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    os.replace(tmp, os.path.join(part_dir, PART_FILE))
+    return count
+
+
+def partition_path(store_dir, dataset, account, region, snapshot_date):
+    return os.path.join(store_dir, dataset, f"account={account}", f"region={region}",
+                        f"snapshot_date={snapshot_date}")
+
+
+# ===== Reading =====
+def partitions(store_dir, dataset):
+    """List (account, region, snapshot_date) partitions from the directory layout alone."""
+    root = os.path.join(store_dir, dataset)
+    out = []
+    if not os.path.isdir(root):
+        return out
+    for acc in sorted(os.listdir(root)):
+        for reg in sorted(os.listdir(os.path.join(root, acc))):
+            for snap in sorted(os.listdir(os.path.join(root, acc, reg))):
+                out.append((acc.split("=", 1)[1], reg.split("=", 1)[1], snap.split("=", 1)[1]))
+    return out
+
+
+def latest_snapshot(store_dir, dataset):
+    snaps = [snap for _, _, snap in partitions(store_dir, dataset)]
+    return max(snaps) if snaps else None
+
+
+def _open(store_dir, dataset):
+    root = os.path.join(store_dir, dataset)
+    if not os.path.isdir(root):
+        return None
+    return ds.dataset(root, format="parquet", partitioning=PARTITIONING,
+                      schema=_arrow_schema(DATASETS[dataset]).append(pa.field("account", pa.string()))
+                      .append(pa.field("region", pa.string())).append(pa.field("snapshot_date", pa.string())),
+                      exclude_invalid_files=True)
+
+
+def _filter(snapshot_date, accounts, regions, extra_filter):
+    expr = ds.field("snapshot_date") == snapshot_date
+    if accounts:
+        expr = expr & ds.field("account").isin(list(accounts))
+    if regions:
+        expr = expr & ds.field("region").isin(list(regions))
+    if extra_filter is not None:
+        expr = expr & extra_filter
+    return expr
+
+
+def read_table(store_dir, dataset, columns=None, snapshot_date="latest", accounts=None, regions=None,
+               filter=None):
+    """
+    Read only the requested columns / partitions as a pyarrow Table (None if the dataset
+    does not exist). `filter` is an optional pyarrow.dataset expression pushed down to the scan.
+    """
+    data = _open(store_dir, dataset)
+    if data is None:
+        return None
+    if snapshot_date == "latest":
+        snapshot_date = latest_snapshot(store_dir, dataset)
+    cols = [c for c in columns if c in data.schema.names] if columns else None
+    return data.to_table(columns=cols, filter=_filter(snapshot_date, accounts, regions, filter))
+
+
+def iter_records(store_dir, dataset, columns=None, snapshot_date="latest", accounts=None, regions=None,
+                 filter=None, with_partition=False):
+    """
+    Yield records as dicts, batch by batch. Only `columns` are loaded when given; names that
+    are not schema columns are looked up in `_extra`. JSON fields are decoded and keys a
+    record never had are left out again.
+    """
+    data = _open(store_dir, dataset)
+    if data is None:
+        return
+    if snapshot_date == "latest":
+        snapshot_date = latest_snapshot(store_dir, dataset)
+    fields = DATASETS[dataset]
+    json_fields = _json_fields(fields)
+    known = {name for name, _ in fields}
+    if columns:
+        cols = [c for c in columns if c in known]
+        if any(c not in known for c in columns):
+            cols.append("_extra")
+        cols.append("_absent")
+    else:
+        cols = [name for name, _ in fields] + ["_extra", "_absent"]
+    if with_partition:
+        cols += ["account", "region"]
+    scanner = data.scanner(columns=cols, filter=_filter(snapshot_date, accounts, regions, filter),
+                           batch_size=BATCH_ROWS)
+    for batch in scanner.to_batches():
+        for row in batch.to_pylist():
+            yield _decode(row, json_fields, columns)
+
+
+def _decode(row, json_fields, columns):
+    extra = row.pop("_extra", None)
+    absent = row.pop("_absent", None)
+    for name in json_fields:
+        if row.get(name) is not None:
+            row[name] = json.loads(row[name])
+    if absent:
+        for name in json.loads(absent):
+            row.pop(name, None)
+    if extra:
+        extra = json.loads(extra)
+        if columns:
+            extra = {k: v for k, v in extra.items() if k in columns}
+        row.update(extra)
+    return row
+
+
+def iter_partition_records(store_dir, dataset, snapshot_date="latest", columns=None, filter=None):
+    """Yield (account, region, records) for every partition of one snapshot."""
+    if snapshot_date == "latest":
+        snapshot_date = latest_snapshot(store_dir, dataset)
+    for account, region, snap in partitions(store_dir, dataset):
+        if snap == snapshot_date:
+            yield account, region, iter_records(store_dir, dataset, columns, snap, [account], [region], filter)
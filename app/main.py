@@ -1,16 +1,33 @@
 import streamlit as st
-from aws_client import list_ec2_instances
+from aws_client import EC2Cache
+from datetime import datetime
 import os
 
+@st.cache_resource
+def get_ec2_cache():
+    # shared by every session and rerun, so clients and cached regions survive widget changes
+    return EC2Cache(ttl=int(os.getenv("CLOUDMIND_EC2_CACHE_TTL", "300")))
+
 st.title("CloudMind Analytics — Day 1 Test")
 
+cache = get_ec2_cache()
 region = st.selectbox("Region", ["us-east-1", "ap-south-1", "us-west-2"])
-if st.button("Fetch EC2 instances"):
+col1, col2 = st.columns(2)
+fetch = col1.button("Fetch EC2 instances")
+refresh = col2.button("Refresh")
+
+# regions fetched before are shown straight from the cache (refreshed in the background when stale)
+if fetch or refresh or region in cache.cached_regions():
     try:
         with st.spinner("Fetching EC2 instances..."):
-            inst = list_ec2_instances(region)
-            st.write(f"Found {len(inst)} instances in {region}")
-            st.json(inst)
+            inst, fetched_at, stale = cache.get(region, force=refresh)
+        age = datetime.now() - datetime.fromtimestamp(fetched_at)
+        st.write(f"Found {len(inst)} instances in {region}")
+        note = " · refreshing in the background" if cache.refreshing(region) else (" · stale" if stale else "")
+        st.caption(f"Fetched {int(age.total_seconds())}s ago" + note)
+        if cache.last_error(region):
+            st.warning(f"Last refresh failed: {cache.last_error(region)}")
+        st.json(inst)
     except Exception as e:
         st.error(f"Error: {e}")
         st.text("Check AWS credentials, region and network.")
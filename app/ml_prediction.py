@@ -1,95 +1,333 @@
-import pandas as pd
-import numpy as np
-from sklearn.linear_model import LinearRegression
+import argparse
+import hashlib
+import io
 import json
 import os
 
+import numpy as np
+import pandas as pd
+
 # ---------- Paths ----------
 cost_estimation_path = "output/analysis/cost_estimation.json"
 aws_history_path = "output/aws_cost_history.csv"
 prediction_output_path = "output/predictions"
-os.makedirs(prediction_output_path, exist_ok=True)
+model_cache_path = "output/predictions/model_cache"
 
-# ---------- Step 1: Check cost_estimation.json ----------
-if not os.path.exists(cost_estimation_path):
-    print("❌ cost_estimation.json not found. Run Day 4 module first.")
-    exit()
+DEFAULT_HORIZONS = (3,)  # days after the last available day
 
-with open(cost_estimation_path, "r") as f:
-    cost_data = json.load(f)
 
-print("\n✅ Loaded cost_estimation.json data:")
-print(cost_data)
+# ---------- Load AWS real cost history ----------
+def load_cost_history(path=aws_history_path, resource_cols=None):
+    """
+    Cost history CSV (path or file object) -> DataFrame with a Date column plus one numeric
+    column per resource. `resource_cols` pins the columns instead of detecting them.
+    """
+    # Read CSV and skip first summary row if present
+    aws_df = pd.read_csv(path, skiprows=1)
 
-# ---------- Step 2: Load AWS real cost history ----------
-if not os.path.exists(aws_history_path):
-    print("❌ aws_cost_history.csv not found. Please add your historical cost CSV.")
-    exit()
+    # Dynamic column handling: rename first column to 'Date' if needed
+    if aws_df.columns[0].lower() not in ["date", "billingdate"]:
+        aws_df.rename(columns={aws_df.columns[0]: "Date"}, inplace=True)
 
-# Read CSV and skip first summary row if present
-aws_df = pd.read_csv(aws_history_path, skiprows=1)
+    if resource_cols is None:
+        # Select numeric cost columns automatically
+        numeric_cols = aws_df.select_dtypes(include=["float64", "int64"]).columns.tolist()
+        resource_cols = [col for col in numeric_cols if col.lower() not in ["total costs($)"]]  # exclude total
+    else:
+        aws_df = aws_df.reindex(columns=list(dict.fromkeys(["Date"] + list(resource_cols))))
 
-# Dynamic column handling: rename first column to 'Date' if needed
-if aws_df.columns[0].lower() not in ["date", "billingdate"]:
-    aws_df.rename(columns={aws_df.columns[0]: "Date"}, inplace=True)
+    # Keep only Date + selected resources
+    aws_df = aws_df[["Date"] + resource_cols]
 
-# Select numeric cost columns automatically
-numeric_cols = aws_df.select_dtypes(include=["float64", "int64"]).columns.tolist()
-resource_cols = [col for col in numeric_cols if col.lower() not in ["total costs($)"]]  # exclude total
+    # Convert Date to datetime safely
+    aws_df["Date"] = pd.to_datetime(aws_df["Date"], dayfirst=True, errors='coerce')
+    invalid_dates = aws_df["Date"].isna().sum()
+    if invalid_dates > 0:
+        print(f"⚠️ {invalid_dates} invalid date rows found. Dropping them.")
+    aws_df = aws_df.dropna(subset=["Date"])
 
-# Keep only Date + selected resources
-aws_df = aws_df[["Date"] + resource_cols]
+    # Convert resource columns to numeric, fill missing with 0
+    aws_df[resource_cols] = aws_df[resource_cols].apply(pd.to_numeric, errors='coerce').fillna(0)
+    return aws_df
 
-# Convert Date to datetime safely
-aws_df["Date"] = pd.to_datetime(aws_df["Date"], dayfirst=True, errors='coerce')
-invalid_dates = aws_df["Date"].isna().sum()
-if invalid_dates > 0:
-    print(f"⚠️ {invalid_dates} invalid date rows found. Dropping them.")
-aws_df = aws_df.dropna(subset=["Date"])
 
-# Convert resource columns to numeric, fill missing with 0
-for col in resource_cols:
-    aws_df[col] = pd.to_numeric(aws_df[col], errors='coerce').fillna(0)
+# ---------- Batched linear trends ----------
+def fit_trends(days, values):
+    """
+    Fit y = intercept + slope * day for every column of `values` (n_days x n_series)
+    with one least-squares solve over the shared design matrix.
+    Returns (intercept, slope) arrays of length n_series.
+    """
+    days = np.asarray(days, dtype=float)
+    values = np.asarray(values, dtype=float).reshape(len(days), -1)
+    # centred days keep the solve well conditioned; a single day gives a flat trend
+    mean_day = days.mean()
+    X = np.column_stack([np.ones_like(days), days - mean_day])
+    (a, slope), *_ = np.linalg.lstsq(X, values, rcond=None)
+    return a - slope * mean_day, slope
 
-print("\n✅ Loaded and processed AWS cost history:")
-print(aws_df.head())
 
-# ---------- Step 3: Prepare trend DataFrame ----------
-trend_df = aws_df.copy()
-trend_df["Day"] = (trend_df["Date"] - trend_df["Date"].min()).dt.days + 1
+def predict_trends(intercept, slope, future_days):
+    """Predictions for each future day (rows) and series (columns)."""
+    future_days = np.asarray(future_days, dtype=float).reshape(-1, 1)
+    return intercept + slope * future_days
 
-# ---------- Step 4: Predict future cost using Linear Regression ----------
-predictions = {}
 
-for resource in resource_cols:
-    X = trend_df["Day"].values.reshape(-1, 1)
-    y = trend_df[resource].values
+def forecast(history, horizons=DEFAULT_HORIZONS, columns=None):
+    """
+    Forecast every resource column of a cost history DataFrame (Date + numeric columns)
+    `horizons` days after the last available day. Columns that are all zero are skipped.
+    Returns {resource: {"PredictedFutureCost", "CurrentCost", "ChangePercent"}} for the first
+    horizon, plus "Forecasts" ({days: cost}) when several horizons are asked for.
+    """
+    horizons = list(horizons)
+    if columns is None:
+        columns = [c for c in history.columns if c != "Date"]
+    days = ((history["Date"] - history["Date"].min()).dt.days + 1).to_numpy()
+    values = history[columns].to_numpy(dtype=float)
 
-    # Skip resource if all values are zero (no cost data)
-    if np.all(y == 0):
+    nonzero = np.any(values != 0, axis=0)
+    for resource in np.asarray(columns, dtype=object)[~nonzero]:
         print(f"⚠️ Resource '{resource}' has all zero values. Skipping prediction.")
-        continue
+    columns = [c for c, keep in zip(columns, nonzero) if keep]
+    values = values[:, nonzero]
+    if not columns:
+        return {}
+
+    intercept, slope = fit_trends(days, values)
+    predicted = predict_trends(intercept, slope, days.max() + np.asarray(horizons))
+    return format_predictions(columns, values[-1], predicted, horizons)
+
+
+def format_predictions(columns, current, predicted, horizons):
+    """Prediction dicts per resource from the last observed costs and the (horizon x series) predictions."""
+    predictions = {}
+    for j, resource in enumerate(columns):
+        predicted_cost, last = float(predicted[0, j]), float(current[j])
+        # Fix divide by zero for ChangePercent
+        if last == 0:
+            change_percent = 0.0  # avoid Infinity
+        else:
+            change_percent = round(((predicted_cost - last) / last) * 100, 2)
+        pred = {
+            "PredictedFutureCost": round(predicted_cost, 2),
+            "CurrentCost": round(last, 2),
+            "ChangePercent": change_percent
+        }
+        if len(horizons) > 1:
+            pred["Forecasts"] = {str(h): round(float(predicted[i, j]), 2) for i, h in enumerate(horizons)}
+        predictions[resource] = pred
+    return predictions
+
+
+# ---------- Model cache (incremental fits) ----------
+HASH_BLOCK = 1024 * 1024
+CACHE_VERSION = 2
+
+
+def _hash_range(path, start, end, digest=None):
+    """SHA-1 of bytes [start, end) of a file, continuing `digest` when given."""
+    digest = digest or hashlib.sha1()
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(HASH_BLOCK, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest
+
 
-    model = LinearRegression()
-    model.fit(X, y)
+def _fingerprint(length, digest):
+    return {"bytes": length, "sha1": digest.hexdigest()}
 
-    future_day = np.array([[trend_df["Day"].max() + 3]])  # predict 3 days after last available day
-    predicted_cost = model.predict(future_day)[0]
 
-    # Fix divide by zero for ChangePercent
-    if y[-1] == 0:
-        change_percent = 0.0  # avoid Infinity
+class TrendCache:
+    """
+    Sufficient statistics of the per-resource least-squares trends, persisted per history file.
+    Every series shares the day axis, so n / sum(x) / sum(x^2) are kept once and only
+    sum(y) / sum(x*y) / the last value are kept per series. When rows are appended to the
+    history, only the new bytes are parsed and folded into the sums; if any byte of the part
+    already read has changed (SHA-1 of the whole prefix), everything is refitted.
+    """
+
+    def __init__(self, history_path=aws_history_path, cache_dir=model_cache_path):
+        self.history_path = history_path
+        key = hashlib.sha1(os.path.abspath(history_path).encode()).hexdigest()[:16]
+        self.cache_file = os.path.join(cache_dir, f"{key}.json")
+        self.state = None
+
+    def load(self):
+        try:
+            with open(self.cache_file, "r") as f:
+                self.state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.state = None
+        return self
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp = self.cache_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.cache_file)
+
+    # ----- updating -----
+    def update(self, refit=False):
+        """Bring the statistics up to date with the history file: "unchanged", "incremental" or "full"."""
+        size = os.path.getsize(self.history_path)
+        digest = None if refit else self._verified_digest(size)
+        if digest is not None:
+            read = self.state["fingerprint"]["bytes"]
+            if size == read:
+                return "unchanged"
+            new_rows = self._read_appended(read, size)
+            if new_rows is not None:
+                self._accumulate(new_rows)
+                self.state["fingerprint"] = _fingerprint(size, _hash_range(self.history_path, read, size, digest))
+                self.state["ends_newline"] = self._ends_newline(size)
+                self.save()
+                return "incremental"
+        history = load_cost_history(self.history_path)
+        self.state = {
+            "version": CACHE_VERSION,
+            "origin": history["Date"].min().strftime("%Y-%m-%d") if len(history) else None,
+            "columns": [c for c in history.columns if c != "Date"],
+            "n": 0, "sx": 0.0, "sxx": 0.0, "max_day": None,
+        }
+        k = len(self.state["columns"])
+        self.state.update({"sy": [0.0] * k, "sxy": [0.0] * k, "last": [0.0] * k, "nonzero": [False] * k})
+        self._accumulate(history)
+        self.state["fingerprint"] = _fingerprint(size, _hash_range(self.history_path, 0, size))
+        self.state["ends_newline"] = self._ends_newline(size)
+        self.save()
+        return "full"
+
+    def _verified_digest(self, size):
+        """Running digest of the part already read, or None when the cache can't be extended."""
+        st = self.state
+        if not st or st.get("version") != CACHE_VERSION or size < st["fingerprint"]["bytes"]:
+            return None
+        digest = _hash_range(self.history_path, 0, st["fingerprint"]["bytes"])
+        return digest if _fingerprint(st["fingerprint"]["bytes"], digest) == st["fingerprint"] else None
+
+    def _ends_newline(self, size):
+        if not size:
+            return True
+        with open(self.history_path, "rb") as f:
+            f.seek(size - 1)
+            return f.read(1) == b"\n"
+
+    def _read_appended(self, start, end):
+        """Rows appended after byte `start`, or None if the append rewrote the last line."""
+        with open(self.history_path, "rb") as f:
+            header = f.readline() + f.readline()  # summary row + column names
+            f.seek(start)
+            appended = f.read(end - start)
+        if not self.state["ends_newline"] and not appended.startswith((b"\n", b"\r\n")):
+            return None
+        return load_cost_history(io.BytesIO(header + appended), self.state["columns"])
+
+    def _accumulate(self, history):
+        st = self.state
+        if not len(history):
+            return
+        if st["origin"] is None:
+            st["origin"] = history["Date"].min().strftime("%Y-%m-%d")
+        days = ((history["Date"] - pd.Timestamp(st["origin"])).dt.days + 1).to_numpy(dtype=float)
+        values = history[st["columns"]].to_numpy(dtype=float)
+        st["n"] += len(days)
+        st["sx"] += float(days.sum())
+        st["sxx"] += float(days @ days)
+        st["max_day"] = max(float(days.max()), st["max_day"] if st["max_day"] is not None else float("-inf"))
+        st["sy"] = (np.asarray(st["sy"]) + values.sum(axis=0)).tolist()
+        st["sxy"] = (np.asarray(st["sxy"]) + days @ values).tolist()
+        st["last"] = values[-1].tolist()
+        st["nonzero"] = (np.asarray(st["nonzero"], dtype=bool) | np.any(values != 0, axis=0)).tolist()
+
+    # ----- forecasting -----
+    def forecast(self, horizons=DEFAULT_HORIZONS):
+        """Same output as forecast(), computed from the cached sums in O(series)."""
+        st = self.state
+        horizons = list(horizons)
+        if not st or not st["n"]:
+            return {}
+        nonzero = np.asarray(st["nonzero"], dtype=bool)
+        for resource in np.asarray(st["columns"], dtype=object)[~nonzero]:
+            print(f"⚠️ Resource '{resource}' has all zero values. Skipping prediction.")
+        if not nonzero.any():
+            return {}
+        n, sx, sxx = st["n"], st["sx"], st["sxx"]
+        sy, sxy = np.asarray(st["sy"])[nonzero], np.asarray(st["sxy"])[nonzero]
+        denom = n * sxx - sx * sx
+        slope = (n * sxy - sx * sy) / denom if denom else np.zeros_like(sy)
+        intercept = (sy - slope * sx) / n
+        predicted = predict_trends(intercept, slope, st["max_day"] + np.asarray(horizons))
+        columns = [c for c, keep in zip(st["columns"], nonzero) if keep]
+        return format_predictions(columns, np.asarray(st["last"])[nonzero], predicted, horizons)
+
+
+# ---------- Prediction run ----------
+def run_prediction(cost_data=None, history_path=aws_history_path, output_dir=prediction_output_path,
+                   horizons=DEFAULT_HORIZONS, use_cache=True, refit=False, cur_paths=None, cur_options=None):
+    """
+    Load the cost estimation (unless handed over in memory) and the cost history, forecast every
+    resource and save ml_cost_predictions.json. Returns the predictions, or None if an input is missing.
+    With use_cache the fits come from the model cache, which only reads rows added since the last run.
+    `cur_paths` forecasts from Cost and Usage Report files (cur_ingest) instead of the history CSV.
+    """
+    if cost_data is None:
+        if not os.path.exists(cost_estimation_path):
+            print("❌ cost_estimation.json not found. Run Day 4 module first.")
+            return None
+        with open(cost_estimation_path, "r") as f:
+            cost_data = json.load(f)
+
+    print("\n✅ Loaded cost_estimation.json data:")
+    print(cost_data)
+
+    if cur_paths:
+        from cur_ingest import load_cur_history
+        aws_df = load_cur_history(cur_paths, **(cur_options or {}))
+        print(f"\n✅ Aggregated Cost and Usage Report: {len(aws_df)} days, {len(aws_df.columns) - 1} resources")
+        predictions = forecast(aws_df, horizons)
+    elif not os.path.exists(history_path):
+        print("❌ aws_cost_history.csv not found. Please add your historical cost CSV.")
+        return None
+    elif use_cache:
+        cache = TrendCache(history_path, os.path.join(output_dir, "model_cache")).load()
+        mode = cache.update(refit)
+        print(f"\n✅ Model cache: {mode} ({cache.state['n']} history rows, {len(cache.state['columns'])} resources)")
+        predictions = cache.forecast(horizons)
     else:
-        change_percent = round(((predicted_cost - y[-1]) / y[-1]) * 100, 2)
+        aws_df = load_cost_history(history_path)
+        print("\n✅ Loaded and processed AWS cost history:")
+        print(aws_df.head())
+        predictions = forecast(aws_df, horizons)
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, "ml_cost_predictions.json")
+    with open(output_file, "w") as f:
+        json.dump(predictions, f, indent=4)
 
-    predictions[resource] = {
-        "PredictedFutureCost": round(float(predicted_cost), 2),
-        "CurrentCost": round(float(y[-1]), 2),
-        "ChangePercent": change_percent
-    }
+    print(f"\n✅ ML Prediction Complete. Results saved to {output_file}")
+    return predictions
 
-# ---------- Step 5: Save predictions ----------
-with open(os.path.join(prediction_output_path, "ml_cost_predictions.json"), "w") as f:
-    json.dump(predictions, f, indent=4)
 
-print("\n✅ ML Prediction Complete. Results saved to output/predictions/ml_cost_predictions.json")
+# ---------- Run module ----------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CloudMind - Cost forecast")
+    parser.add_argument("--history", default=aws_history_path, help="Historical cost CSV (Date + one column per resource)")
+    parser.add_argument("--out", default=prediction_output_path, help="Output directory for ml_cost_predictions.json")
+    parser.add_argument("--horizons", type=int, nargs="+", default=list(DEFAULT_HORIZONS), help="Days after the last available day to forecast (first one is the headline prediction)")
+    parser.add_argument("--no-cache", action="store_true", help="Fit from the full history without the model cache")
+    parser.add_argument("--refit", action="store_true", help="Rebuild the model cache from the full history")
+    parser.add_argument("--cur", nargs="+", default=None, help="Forecast from Cost and Usage Report files / directories instead of --history")
+    parser.add_argument("--cur-per-account", action="store_true", help="With --cur: one series per service and usage account")
+    parser.add_argument("--cur-tag", default=None, help="With --cur: one series per service and tag value (e.g. user:Team)")
+    args = parser.parse_args()
+    run_prediction(history_path=args.history, output_dir=args.out, horizons=args.horizons,
+                   use_cache=not args.no_cache, refit=args.refit, cur_paths=args.cur,
+                   cur_options={"per_account": args.cur_per_account, "tag": args.cur_tag})
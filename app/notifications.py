@@ -1,7 +1,13 @@
+import argparse
 import boto3
 import json
 import os
-from botocore.exceptions import ClientError
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import BotoCoreError, ClientError
+from alert_state import STATE_PATH, AlertState
+from resource_analysis import input_files, iter_records
+from aws_throttle import make_client
 
 # ==========================================================
 # 🌤️ CloudMind - AWS Idle Resource Notification System
@@ -10,6 +16,22 @@ from botocore.exceptions import ClientError
 ANALYSIS_PATH = "output/analysis"
 TOPIC_NAME = "CloudMindAlerts"
 REGION = "us-east-1"  # ✅ Free-tier friendly region
+TOPIC_CACHE_PATH = "output/.sns_topics.json"
+
+SUBJECT = "CloudMind Idle Resource Alert"
+MESSAGE_HEADER = "🔔 CloudMind Analytics - Idle Resource Alert"
+DELTA_HEADER = "🔔 CloudMind Analytics - Idle Resource Changes"
+MAX_MESSAGE_BYTES = 240 * 1024  # SNS allows 256 KiB per publish; keep headroom for the envelope
+LINE_BYTES = 1024               # ID lists are wrapped so chunks can be filled line by line
+PUBLISH_WORKERS = 4
+
+# Resource types in message order: (idle file, state kind, label, id field)
+RESOURCE_TYPES = [
+    ("idle_ec2", "EC2", "EC2 Instances", "InstanceId"),
+    ("idle_ebs", "EBS", "EBS Volumes", "VolumeId"),
+    ("idle_s3", "S3", "S3 Buckets", "Name"),
+    ("idle_rds", "RDS", "RDS Databases", "DBInstanceIdentifier"),
+]
 
 
 # ----------------------------------------------------------
@@ -26,91 +48,291 @@ def load_json(file_path):
 # ----------------------------------------------------------
 # Step 2: Fetch Idle Resource Data
 # ----------------------------------------------------------
-idle_ec2 = load_json(os.path.join(ANALYSIS_PATH, "idle_ec2.json"))
-idle_ebs = load_json(os.path.join(ANALYSIS_PATH, "idle_ebs.json"))
-idle_s3 = load_json(os.path.join(ANALYSIS_PATH, "idle_s3.json"))
-idle_rds = load_json(os.path.join(ANALYSIS_PATH, "idle_rds.json"))
+def idle_file(name, analysis_path=ANALYSIS_PATH):
+    """The analysis output for a resource type (.json or .jsonl, the newer one), or None."""
+    if not os.path.isdir(analysis_path):
+        return None
+    paths = [p for p in input_files(analysis_path, name) if os.path.splitext(os.path.basename(p))[0] == name]
+    return paths[0] if paths else None
+
+
+def load_idle(analysis_path=ANALYSIS_PATH):
+    """
+    Idle analysis file per type, e.g. {"idle_ec2": "output/analysis/idle_ec2.jsonl", ...}; the
+    records are only read, streamed, when their IDs are used. Types without a file are left
+    out, so they are not mistaken for "nothing idle".
+    """
+    idle = {}
+    for name, _, _, _ in RESOURCE_TYPES:
+        path = idle_file(name, analysis_path)
+        if path is None:
+            print(f"⚠️ No {name} analysis in {analysis_path}; skipping it.")
+            continue
+        idle[name] = path
+    return idle
+
+
+def _iter_ids(path, field):
+    # strict: an unreadable file must fail the run, not read as "nothing idle" and resolve everything
+    return (r.get(field) for r in iter_records(path, strict=True))
+
+
+def idle_ids(idle):
+    """[(label, [ids])] for the idle resources, in message order."""
+    return [(label, list(_iter_ids(idle[name], field)) if name in idle else [])
+            for name, _, label, field in RESOURCE_TYPES]
+
+
+def idle_ids_by_kind(idle):
+    """
+    {kind: ids} for AlertState.diff; the ids are streamed from the files as the state store
+    reads them, never held as a list. Only types present in `idle` are included, so a type
+    that was not analysed cannot resolve its reported IDs.
+    """
+    return {kind: _iter_ids(idle[name], field) for name, kind, _, field in RESOURCE_TYPES if name in idle}
 
 
 # ----------------------------------------------------------
-# Step 3: Setup SNS Client
+# Step 3: Setup SNS Client (created on first use)
 # ----------------------------------------------------------
-sns_client = boto3.client("sns", region_name=REGION)
+_sns_client = None
+_client_lock = threading.Lock()
+
+
+def get_sns_client(region=REGION):
+    global _sns_client
+    with _client_lock:
+        if _sns_client is None:
+            _sns_client = make_client(boto3, "sns", region)
+        return _sns_client
 
 
 # ----------------------------------------------------------
-# Step 4: Create or Use Existing SNS Topic
+# Step 4: Create or Use Existing SNS Topic (ARN cached)
 # ----------------------------------------------------------
-def get_or_create_topic(topic_name):
-    """Create or get an existing SNS topic."""
+_topic_arns = {}
+_account_id = None
+
+
+def caller_account(region=REGION):
+    """Account ID of the current credentials (one STS call per process), or None if it is unavailable."""
+    global _account_id
+    with _client_lock:
+        if _account_id is None:
+            try:
+                _account_id = make_client(boto3, "sts", region).get_caller_identity()["Account"]
+            except (BotoCoreError, ClientError) as e:
+                print(f"⚠️ Could not determine the AWS account ({e}); not using the topic cache.")
+        return _account_id
+
+
+def get_or_create_topic(topic_name, client=None, cache_path=TOPIC_CACHE_PATH, account=None):
+    """
+    Topic ARN for a name: CLOUDMIND_TOPIC_ARN, the in-process / on-disk cache, or create_topic
+    (which is idempotent) on a cache miss. Cached ARNs are keyed by account, region and name,
+    so switching profile or account never reuses another account's topic.
+    """
+    if os.getenv("CLOUDMIND_TOPIC_ARN"):
+        return os.getenv("CLOUDMIND_TOPIC_ARN")
+    client = client or get_sns_client()
+    account = account or caller_account(client.meta.region_name)
+    key = f"{account}:{client.meta.region_name}:{topic_name}"
+    cached = {}
+    if account:
+        if key in _topic_arns:
+            return _topic_arns[key]
+        cached = load_json(cache_path) if cache_path else {}
+        if key in cached:
+            _topic_arns[key] = cached[key]
+            return cached[key]
     try:
-        response = sns_client.create_topic(Name=topic_name)
+        response = client.create_topic(Name=topic_name)
         topic_arn = response["TopicArn"]
         print(f"✅ SNS Topic Ready: {topic_arn}")
-        return topic_arn
     except ClientError as e:
         print(f"❌ Error creating/getting topic: {e}")
         return None
-
-
-topic_arn = get_or_create_topic(TOPIC_NAME)
+    if account:
+        _topic_arns[key] = topic_arn
+        if cache_path:
+            cached[key] = topic_arn
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            with open(cache_path, "w") as f:
+                json.dump(cached, f, indent=2)
+    return topic_arn
 
 
 # ----------------------------------------------------------
-# Step 5: Compose Notification Message
+# Step 5: Compose Notification Message (split by size)
 # ----------------------------------------------------------
-def compose_message():
-    """Create summary message for idle resources."""
-    message = "🔔 CloudMind Analytics - Idle Resource Alert:\n\n"
+def _size(text):
+    return len(text.encode("utf-8"))
+
+
+def _section_lines(label, ids, limit):
+    """"• label (n): id, id, ..." wrapped into lines of at most `limit` bytes."""
+    lines = []
+    line = f"• {label} ({len(ids)}): "
+    first = True
+    for rid in ids:
+        piece = str(rid) if first else f", {rid}"
+        if not first and _size(line + piece) > limit:
+            lines.append(line + ",")
+            line, piece = "  ", str(rid)
+        line += piece
+        first = False
+    lines.append(line)
+    return lines
+
+
+def compose_chunks(sections, header=MESSAGE_HEADER, footer_lines=(), max_bytes=MAX_MESSAGE_BYTES,
+                   empty_text="✅ All resources are optimized. No idle usage detected."):
+    """
+    Build the alert text for [(label, ids)] sections and split it into messages of at most
+    max_bytes. Lines are never split; every chunk carries the header with its part number.
+    """
+    reserve = _size(header) + 32  # " (part 999/999)" and the blank line
+    budget = max_bytes - reserve
+    lines = []
+    for label, ids in sections:
+        if ids:
+            lines += _section_lines(label, ids, min(budget, LINE_BYTES))
+    if not lines:
+        lines.append(empty_text)
+    lines += list(footer_lines)
 
-    if idle_ec2:
-        message += f"• EC2 Instances: {[i.get('InstanceId') for i in idle_ec2]}\n"
-    if idle_ebs:
-        message += f"• EBS Volumes: {[v.get('VolumeId') for v in idle_ebs]}\n"
-    if idle_s3:
-        message += f"• S3 Buckets: {[b.get('Name') for b in idle_s3]}\n"
-    if idle_rds:
-        message += f"• RDS Databases: {[r.get('DBInstanceIdentifier') for r in idle_rds]}\n"
+    bodies, current, used = [], [], 0
+    for line in lines:
+        size = _size(line) + 1
+        if current and used + size > budget:
+            bodies.append(current)
+            current, used = [], 0
+        current.append(line)
+        used += size
+    bodies.append(current)
 
-    if not (idle_ec2 or idle_ebs or idle_s3 or idle_rds):
-        message += "✅ All resources are optimized. No idle usage detected.\n"
+    total = len(bodies)
+    chunks = []
+    for i, body in enumerate(bodies, 1):
+        title = header if total == 1 else f"{header} (part {i}/{total})"
+        chunks.append(f"{title}:\n\n" + "\n".join(body) + "\n")
+    return chunks
 
-    return message
+
+def compose_delta_chunks(delta):
+    """Alert for an AlertState delta: new and resolved IDs per type plus a summary count."""
+    sections = [(f"New idle {label}", delta.new.get(kind, [])) for _, kind, label, _ in RESOURCE_TYPES]
+    sections += [(f"Resolved {label}", delta.resolved.get(kind, [])) for _, kind, label, _ in RESOURCE_TYPES]
+    counts = delta.counts()
+    footer = ["", f"Summary: {delta.summary()}"]
+    footer += [f"  {kind}: {c['new']} new, {c['resolved']} resolved, {c['still_idle']} still idle"
+               for kind, c in counts.items()]
+    return compose_chunks(sections, header=DELTA_HEADER, footer_lines=footer,
+                          empty_text="No changes since the last alert.")
+
+
+def compose_message(idle=None):
+    """Single summary message for idle resources (first chunk when it does not fit one message)."""
+    return compose_chunks(idle_ids(idle if idle is not None else load_idle()))[0]
 
 
 # ----------------------------------------------------------
-# Step 6: Send Notification via SNS
+# Step 6: Send Notification via SNS (concurrent, retried)
 # ----------------------------------------------------------
-def send_notification(topic_arn, message):
-    """Publish notification message to SNS topic."""
-    try:
-        response = sns_client.publish(
-            TopicArn=topic_arn,
-            Message=message,
-            Subject="CloudMind Idle Resource Alert",
-        )
-        print("\n✅ Notification Sent Successfully!")
-        print("📩 Message ID:", response["MessageId"])
-    except ClientError as e:
-        print(f"❌ Error sending notification: {e}")
+def send_chunks(topic_arn, chunks, client=None, subject=SUBJECT, workers=PUBLISH_WORKERS):
+    """
+    Publish every chunk with at most `workers` in flight. Throttling / transient errors are
+    retried by the client (aws_throttle policy). Returns [(message_id or None, error or None)]
+    in chunk order.
+    """
+    client = client or get_sns_client()
+    total = len(chunks)
+
+    def publish(indexed):
+        i, message = indexed
+        part_subject = subject if total == 1 else f"{subject} ({i}/{total})"[:100]
+        try:
+            return client.publish(TopicArn=topic_arn, Message=message, Subject=part_subject)["MessageId"], None
+        except ClientError as e:
+            return None, e
+
+    if workers and workers > 1 and total > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, total)) as executor:
+            return list(executor.map(publish, enumerate(chunks, 1)))
+    return [publish(item) for item in enumerate(chunks, 1)]
+
+
+def send_notification(topic_arn, message, client=None):
+    """Publish a message to the SNS topic, split into several publishes when it is too large."""
+    chunks = message if isinstance(message, list) else [message]
+    if len(chunks) == 1 and _size(chunks[0]) > MAX_MESSAGE_BYTES:
+        print("⚠️ Message exceeds the SNS size limit; use compose_chunks to split it by resource.")
+    results = send_chunks(topic_arn, chunks, client)
+    sent = [mid for mid, err in results if mid]
+    for mid, err in results:
+        if err:
+            print(f"❌ Error sending notification: {err}")
+    if sent:
+        print(f"\n✅ Notification Sent Successfully! ({len(sent)}/{len(results)} messages)")
+        print("📩 Message ID:", ", ".join(sent))
+    return results
 
 
 # ----------------------------------------------------------
 # Step 7: Main Execution
 # ----------------------------------------------------------
-def main():
+def main(client=None, state_path=None, full=False, always_send=False):
+    """
+    Send the idle-resource alert. With a state store only the changes since the last alert
+    are sent (nothing when nothing changed); full=True sends the whole inventory as before.
+    """
+    topic_arn = get_or_create_topic(TOPIC_NAME, client)
     if not topic_arn:
         print("❌ SNS topic not available. Exiting.")
         return
 
-    message = compose_message()
-    print("\n📊 Generated Alert Message:")
+    idle = load_idle()
+    if not idle:
+        print("❌ No idle resource analysis found. Run resource_analysis.py first.")
+        return
+    state = None
+    try:
+        if full:
+            chunks = compose_chunks(idle_ids(idle))
+        else:
+            state = AlertState(state_path or STATE_PATH)
+            delta = state.diff(idle_ids_by_kind(idle))
+    except (OSError, ValueError) as e:
+        print(f"❌ Could not read the idle resource analysis ({e}). Nothing sent.")
+        if state:
+            state.close()
+        return
+    if state:
+        print(f"\n📊 Since the last alert: {delta.summary()}")
+        if not delta.changed and not always_send:
+            state.commit()
+            state.close()
+            print("✅ No changes since the last alert. Nothing sent.")
+            return
+        chunks = compose_delta_chunks(delta)
+
+    print(f"\n📊 Generated Alert Message ({len(chunks)} part(s)):")
     print("------------------------------------")
-    print(message)
+    print(chunks[0] if len(chunks) == 1 else chunks[0][:2000] + "\n...")
     print("------------------------------------")
 
-    send_notification(topic_arn, message)
+    results = send_notification(topic_arn, chunks, client)
+    if state:
+        # remember the set only once every part went out, so a failed run is re-sent next time
+        if all(mid for mid, _ in results):
+            state.commit()
+        state.close()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="CloudMind - Idle resource notifications")
+    parser.add_argument("--state", default=None, help="Alert state database (default output/alert_state.db)")
+    parser.add_argument("--full", action="store_true", help="Send the full idle inventory instead of the changes since the last alert")
+    parser.add_argument("--always-send", action="store_true", help="Send a summary even when nothing changed")
+    args = parser.parse_args()
+    main(state_path=args.state, full=args.full, always_send=args.always_send)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+CloudMind Analytics - In-process pipeline
+-----------------------------------------
+Runs gather -> analysis -> cost (-> forecast) in one Python process and hands
+the records from stage to stage in memory, instead of each module re-reading
+the JSON files the previous one wrote. Intermediate files (raw inventory and
+idle_* results) are optional: skipped, written inline, or written on a
+background thread while the next stage runs; idle_* files left by an earlier
+run are removed either way. Every stage reads and writes under --out, and
+every stage is timed and the timings are saved next to the final results.
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import chain
+
+from botocore.exceptions import ClientError, NoCredentialsError
+
+from cost_calculation import calculate_cost_and_savings
+from data_gather import collect_all, save_json
+from ml_prediction import aws_history_path, prediction_output_path, run_prediction
+from pricing import PricingEngine
+from resource_analysis import SINGLE_ACCOUNT_RESOURCES, analyze_resources
+
+WRITE_MODES = ["none", "sync", "background"]
+
+
+# ===== Stage timing =====
+class StageTimer:
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        print(f"▶️ {name} ...")
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(time.perf_counter() - start, 3)
+            print(f"⏱️ {name}: {self.timings[name]:.2f}s")
+
+
+# ===== Intermediate files =====
+class IntermediateWriter:
+    """Writes intermediate JSON files inline (sync), on one background thread, or not at all."""
+
+    def __init__(self, mode="none"):
+        self.mode = mode
+        self._executor = ThreadPoolExecutor(max_workers=1) if mode == "background" else None
+        self._futures = []
+
+    def write(self, obj, path):
+        if self.mode == "none":
+            return
+        if self._executor:
+            self._futures.append(self._executor.submit(save_json, obj, path))
+        else:
+            save_json(obj, path)
+
+    def close(self):
+        """Wait for pending background writes and re-raise the first failure."""
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            for fut in self._futures:
+                fut.result()
+
+
+def _drop_idle_files(analysis_dir, names):
+    """Remove idle_* results of an earlier run, so readers never pair them with the new summary and cost."""
+    for name in names:
+        for ext in (".json", ".jsonl"):
+            path = os.path.join(analysis_dir, name + ext)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _records(by_region, copy):
+    records = chain.from_iterable(by_region.values())
+    # idle checks add StoppedDays / AgeDays / IdleDays to the records they flag;
+    # hand them copies while the raw records may still be queued for writing
+    return (dict(r) for r in records) if copy else records
+
+
+# ===== Pipeline =====
+def run_pipeline(profile=None, regions=("us-east-1",), workers=1, count_s3=False, engine="python",
+                 out_dir="output", write_intermediate="none", pricing=None, forecast=False):
+    timer = StageTimer()
+    writer = IntermediateWriter(write_intermediate)
+    analysis_dir = os.path.join(out_dir, "analysis")
+    os.makedirs(analysis_dir, exist_ok=True)
+    with timer.stage("gather"):
+        collected = collect_all(profile, regions, count_s3, workers=workers)
+        writer.write(collected["s3_buckets"], os.path.join(out_dir, "s3_buckets.json"))
+        for name, by_region in collected.items():
+            if name != "s3_buckets":
+                for region, records in by_region.items():
+                    writer.write(records, os.path.join(out_dir, f"{name}_{region}.json"))
+
+    with timer.stage("analysis"):
+        copy = write_intermediate == "background"
+        resources = {"S3": (dict(b) for b in collected["s3_buckets"]) if copy else collected["s3_buckets"]}
+        for key, prefix, _ in SINGLE_ACCOUNT_RESOURCES:
+            if prefix != "s3_buckets":
+                resources[key] = _records(collected[prefix], copy)
+        summary, idle = analyze_resources(resources, engine)
+        _drop_idle_files(analysis_dir, idle)
+        for idle_name, records in idle.items():
+            writer.write(records, os.path.join(analysis_dir, f"{idle_name}.json"))
+        save_json(summary, os.path.join(analysis_dir, "summary_analysis.json"))
+
+    with timer.stage("cost"):
+        cost = calculate_cost_and_savings(pricing=pricing, idle=idle, output_path=analysis_dir)
+
+    if forecast:
+        with timer.stage("forecast"):
+            run_prediction(cost_data=cost, history_path=os.path.join(out_dir, os.path.basename(aws_history_path)),
+                           output_dir=os.path.join(out_dir, os.path.basename(prediction_output_path)))
+
+    with timer.stage("flush"):
+        writer.close()
+
+    save_json(timer.timings, os.path.join(out_dir, "pipeline_timings.json"))
+    return {"analysis": summary, "cost": cost, "timings": timer.timings}
+
+
+# ===== Entry Point =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CloudMind - Run gather, analysis and cost in one process")
+    parser.add_argument("--profile", default=None, help="AWS profile name (optional)")
+    parser.add_argument("--regions", nargs="+", default=["us-east-1"], help="AWS regions (space separated)")
+    parser.add_argument("--workers", type=int, default=1, help="Concurrent API workers for gathering (1 = serial)")
+    parser.add_argument("--count-s3", action="store_true", help="Count objects and total size for each S3 bucket (can be slow)")
+    parser.add_argument("--engine", choices=["python", "vectorized"], default="python", help="Idle-detection backend")
+    parser.add_argument("--out", default="output", help="Output directory")
+    parser.add_argument("--write-intermediate", choices=WRITE_MODES, default="none", help="Raw inventory and idle_* files: skip (none), write inline (sync) or on a background thread (background)")
+    parser.add_argument("--price-list", nargs="+", default=None, help="AWS Price List bulk JSON file(s) or trimmed CSV for region/type-aware rates")
+    parser.add_argument("--forecast", action="store_true", help="Run the cost forecast after the cost stage")
+    args = parser.parse_args()
+    try:
+        result = run_pipeline(args.profile, args.regions, args.workers, args.count_s3, args.engine, args.out,
+                              args.write_intermediate,
+                              PricingEngine.load(args.price_list) if args.price_list else None, args.forecast)
+        print("\n✅ Pipeline complete. Stage timings (s):")
+        print(json.dumps(result["timings"], indent=2))
+    except NoCredentialsError:
+        print("ERROR: AWS credentials not found. Set AWS_PROFILE or export credentials.")
+    except ClientError as e:
+        print("AWS ClientError:", e)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+CloudMind Analytics - Pricing engine
+------------------------------------
+Region- and type-aware on-demand rates loaded from an offline AWS Price List
+bulk offer file (JSON, e.g. AmazonEC2/current/us-east-1/index.json), or from a
+trimmed CSV copy with the columns: service,region,key,price,unit.
+
+Rates are indexed by (service, region, key), where key is the instance type /
+DB instance class / EBS volume type / S3 storage class. The parsed index is
+cached on disk (keyed by source size + mtime), so later runs skip parsing.
+Lookups are memoized, and price_batch resolves each distinct key once.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import pickle
+import re
+
+PRICING_CACHE_DIR = "output/pricing_cache"
+
+SERVICE_CODES = {"AmazonEC2": "EC2", "AmazonRDS": "RDS", "AmazonS3": "S3"}
+
+# Price List S3 "volumeType" values -> storage class names used by the S3 API
+S3_STORAGE_CLASSES = {
+    "Standard": "STANDARD",
+    "Standard - Infrequent Access": "STANDARD_IA",
+    "One Zone - Infrequent Access": "ONEZONE_IA",
+    "Intelligent-Tiering Frequent Access": "INTELLIGENT_TIERING",
+    "Amazon Glacier": "GLACIER",
+    "Glacier Instant Retrieval": "GLACIER_IR",
+    "Glacier Deep Archive": "DEEP_ARCHIVE",
+    "Reduced Redundancy": "REDUCED_REDUNDANCY",
+}
+
+# RDS API engine names -> Price List databaseEngine (lowercased)
+RDS_ENGINES = {
+    "mysql": "mysql",
+    "mariadb": "mariadb",
+    "postgres": "postgresql",
+    "aurora-mysql": "aurora mysql",
+    "aurora-postgresql": "aurora postgresql",
+    "oracle-ee": "oracle",
+    "oracle-se2": "oracle",
+    "sqlserver-ee": "sql server",
+    "sqlserver-se": "sql server",
+    "sqlserver-ex": "sql server",
+    "sqlserver-web": "sql server",
+}
+
+_REGION_RE = re.compile(r"^([a-z]{2}(?:-gov)?-[a-z]+-\d+)")
+
+
+# ===== Helpers =====
+def region_from_az(az):
+    """us-east-1a -> us-east-1 (also for local / wavelength zones like us-west-2-lax-1a)."""
+    if not az:
+        return None
+    m = _REGION_RE.match(az)
+    return m.group(1) if m else None
+
+
+def s3_region(location_constraint):
+    """get_bucket_location returns None for us-east-1 and "EU" for the legacy eu-west-1."""
+    if not location_constraint:
+        return "us-east-1"
+    return "eu-west-1" if location_constraint == "EU" else location_constraint
+
+
+def rds_key(instance_class, engine=None):
+    """Lookup key for a DB instance: "db.t3.micro/mysql", or just the class when the engine is unknown."""
+    engine = RDS_ENGINES.get((engine or "").lower())
+    return f"{instance_class}/{engine}" if engine else instance_class
+
+
+def _on_demand_price(terms, sku):
+    """First on-demand USD price of a SKU (lowest tier when the price is tiered)."""
+    for term in terms.get(sku, {}).values():
+        dims = sorted(term.get("priceDimensions", {}).values(), key=lambda d: float(d.get("beginRange", 0) or 0))
+        for dim in dims:
+            usd = dim.get("pricePerUnit", {}).get("USD")
+            if usd is not None:
+                return float(usd), dim.get("unit")
+    return None, None
+
+
+# ===== Parsing =====
+def _index_offer_file(path):
+    """Index one bulk offer file: {(service, region, key): (price, unit)}."""
+    with open(path, "r") as f:
+        offer = json.load(f)
+    service = SERVICE_CODES.get(offer.get("offerCode"))
+    terms = offer.get("terms", {}).get("OnDemand", {})
+    index = {}
+    for sku, product in offer.get("products", {}).items():
+        svc, key = _product_key(service, product.get("productFamily"), product.get("attributes", {}))
+        region = product.get("attributes", {}).get("regionCode")
+        if not key or not region:
+            continue
+        price, unit = _on_demand_price(terms, sku)
+        if price is None:
+            continue
+        index[(svc, region, key)] = (price, unit)
+        if svc == "RDS" and key.endswith("/mysql"):
+            # engine-less lookups default to MySQL Single-AZ
+            index.setdefault((svc, region, key.split("/")[0]), (price, unit))
+    return index
+
+
+def _product_key(service, family, attrs):
+    """(service, key) a price list product is indexed under, or (None, None) if it is not priced here."""
+    if service == "EC2" and family == "Compute Instance":
+        if (attrs.get("operatingSystem"), attrs.get("tenancy"), attrs.get("preInstalledSw"),
+                attrs.get("capacitystatus", "Used")) == ("Linux", "Shared", "NA", "Used"):
+            return "EC2", attrs.get("instanceType")
+    elif service == "EC2" and family == "Storage":
+        return "EBS", attrs.get("volumeApiName")
+    elif service == "RDS" and family == "Database Instance":
+        if attrs.get("deploymentOption") == "Single-AZ":
+            return "RDS", f"{attrs.get('instanceType')}/{(attrs.get('databaseEngine') or '').lower()}"
+    elif service == "S3" and family == "Storage":
+        return "S3", S3_STORAGE_CLASSES.get(attrs.get("volumeType"))
+    return None, None
+
+
+def _index_csv(path):
+    index = {}
+    with open(path, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            index[(row["service"], row["region"], row["key"])] = (float(row["price"]), row.get("unit"))
+    return index
+
+
+def build_index(sources):
+    index = {}
+    for path in sources:
+        index.update(_index_csv(path) if path.endswith(".csv") else _index_offer_file(path))
+    return index
+
+
+# ===== Engine =====
+class PricingEngine:
+    """
+    Memoized (service, region, key) -> hourly / GB-month rate lookups. Keys missing from the
+    price list fall back to the flat default passed in (cost_calculation.AWS_PRICING).
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self._memo = {}
+
+    @classmethod
+    def load(cls, sources, cache_dir=PRICING_CACHE_DIR):
+        """Load price list files, using the on-disk index cache when the sources are unchanged."""
+        if isinstance(sources, str):
+            sources = [sources]
+        stamp = "|".join(f"{os.path.abspath(p)}:{os.path.getsize(p)}:{os.stat(p).st_mtime_ns}" for p in sources)
+        cache_path = os.path.join(cache_dir, hashlib.sha1(stamp.encode()).hexdigest() + ".pkl")
+        if os.path.exists(cache_path):
+            with open(cache_path, "rb") as f:
+                return cls(pickle.load(f))
+        index = build_index(sources)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = cache_path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_path)
+        return cls(index)
+
+    def rate(self, service, region, key, default=None):
+        memo_key = (service, region, key, default)
+        if memo_key not in self._memo:
+            hit = self.index.get((service, region, key))
+            if hit is None and service == "RDS" and key and "/" in key:
+                hit = self.index.get((service, region, key.split("/")[0]))
+            self._memo[memo_key] = hit[0] if hit else default
+        return self._memo[memo_key]
+
+    def price_batch(self, keys, default=None):
+        """Rates for a list of (service, region, key) tuples; each distinct key is resolved once."""
+        resolved = {k: self.rate(*k, default=default) for k in set(keys)}
+        return [resolved[k] for k in keys]
@@ -7,8 +7,13 @@ Enhanced version: Handles multiple AWS accounts (dummy/test data)
 and analyzes EC2, EBS, S3, and RDS resources for idle usage.
 """
 
+import argparse
+import hashlib
 import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timezone
+from functools import partial
 import os
 
 # ===== Default thresholds =====
@@ -29,9 +34,63 @@ def load_json(file_path):
         return []
 
 
+def iter_records(file_path, strict=False):
+    """
+    Yield records from a JSON list file, or line by line from a .jsonl file. A missing or
+    malformed file is reported and ends the records, or raises with strict=True.
+    """
+    try:
+        if not file_path.endswith(".jsonl"):
+            with open(file_path, "r") as f:
+                records = json.load(f)
+            yield from records
+            return
+        with open(file_path, "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    except (FileNotFoundError, json.JSONDecodeError):
+        if strict:
+            raise
+        print(f"❌ Error loading {file_path}")
+
+
+def write_records(records, path):
+    """Write records as an indented JSON list, or stream them as JSON Lines for .jsonl paths. Returns the count."""
+    count = 0
+    with open(path, "w") as f:
+        if path.endswith(".jsonl"):
+            for rec in records:
+                f.write(json.dumps(rec, default=str))
+                f.write("\n")
+                count += 1
+        else:
+            records = list(records)
+            json.dump(records, f, indent=2, default=str)
+            count = len(records)
+    # drop the other format's copy so downstream readers never pick up a stale file
+    stem = os.path.splitext(path)[0]
+    for ext in (".json", ".jsonl"):
+        if stem + ext != path and os.path.exists(stem + ext):
+            os.remove(stem + ext)
+    return count
+
+
+def input_files(input_dir, prefix):
+    """Input files for a resource type; if a region has both .json and .jsonl, the newer one wins."""
+    chosen = {}
+    for f in sorted(os.listdir(input_dir)):
+        stem, ext = os.path.splitext(f)
+        if not f.startswith(prefix) or ext not in (".json", ".jsonl"):
+            continue
+        path = os.path.join(input_dir, f)
+        if stem not in chosen or os.path.getmtime(path) > os.path.getmtime(chosen[stem]):
+            chosen[stem] = path
+    return [chosen[stem] for stem in sorted(chosen)]
+
+
 # ===== Analysis Functions =====
-def analyze_ec2_instances(instances):
-    idle_ec2 = []
+def iter_idle_ec2(instances):
     now = datetime.now(timezone.utc)
     for i in instances:
         state = i.get("State")
@@ -42,20 +101,24 @@ def analyze_ec2_instances(instances):
             stopped_days = (now - launch_time).days
             if stopped_days >= EC2_STOPPED_DAYS_THRESHOLD:
                 i["StoppedDays"] = stopped_days
-                idle_ec2.append(i)
-    return idle_ec2
+                yield i
 
 
-def analyze_ebs_volumes(volumes):
-    idle_volumes = []
+def analyze_ec2_instances(instances):
+    return list(iter_idle_ec2(instances))
+
+
+def iter_idle_ebs(volumes):
     for v in volumes:
         if len(v.get("Attachments", [])) == 0:
-            idle_volumes.append(v)
-    return idle_volumes
+            yield v
 
 
-def analyze_s3_buckets(buckets):
-    idle_buckets = []
+def analyze_ebs_volumes(volumes):
+    return list(iter_idle_ebs(volumes))
+
+
+def iter_idle_s3(buckets):
     now = datetime.now(timezone.utc)
     for b in buckets:
         creation_str = b.get("CreationDate")
@@ -65,12 +128,14 @@ def analyze_s3_buckets(buckets):
             age_days = (now - creation).days
             if age_days >= S3_EMPTY_DAYS_THRESHOLD:
                 b["AgeDays"] = age_days
-                idle_buckets.append(b)
-    return idle_buckets
+                yield b
 
 
-def analyze_rds_instances(instances):
-    idle_rds = []
+def analyze_s3_buckets(buckets):
+    return list(iter_idle_s3(buckets))
+
+
+def iter_idle_rds(instances):
     now = datetime.now(timezone.utc)
     for db in instances:
         status = db.get("DBInstanceStatus")
@@ -80,99 +145,294 @@ def analyze_rds_instances(instances):
             idle_days = (now - create_time).days
             if idle_days >= RDS_IDLE_DAYS_THRESHOLD:
                 db["IdleDays"] = idle_days
-                idle_rds.append(db)
-    return idle_rds
+                yield db
+
+
+def analyze_rds_instances(instances):
+    return list(iter_idle_rds(instances))
 
 
 # ===== New: Multi-Account Loader =====
-def load_test_accounts(test_data_dir="test_data"):
-    """Load all account JSONs (simulated multi-account setup)."""
-    accounts = []
+def list_account_files(test_data_dir="test_data"):
+    """Paths of the account JSONs, without loading them."""
     if not os.path.exists(test_data_dir):
         print("⚠️ No test_data folder found — skipping multi-account simulation.")
-        return accounts
+        return []
+    return [os.path.join(test_data_dir, f) for f in os.listdir(test_data_dir) if f.endswith(".json")]
+
+
+def analyze_account_file(path, engine="python"):
+    """
+    Load and analyze one account file (runs inside a worker process).
+    Returns (account_id, summary, seconds), or None if the file is not valid JSON.
+    """
+    start = time.perf_counter()
+    try:
+        with open(path, "r") as f:
+            acc = json.load(f)
+    except json.JSONDecodeError:
+        print(f"❌ Invalid JSON in {os.path.basename(path)}, skipping.")
+        return None
+    idle = idle_filters(engine)
+    res = acc.get("resources", {})
+    acc_summary = {f"{key}_IdleCount": sum(1 for _ in idle[key](res.get(key, [])))
+                   for key in ("EC2", "EBS", "S3", "RDS")}
+    return acc.get("account_id", "unknown"), acc_summary, time.perf_counter() - start
+
+
+def _save_summary(summary, path):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(summary, f, indent=2)
+    os.replace(tmp, path)
+
+
+def analyze_accounts(paths, output_dir, workers=1, engine="python"):
+    """
+    Analyze account files on a process pool, merging each result into
+    multi_account_summary.json as soon as that account finishes. Only the files
+    being analyzed are held in memory, so peak memory follows `workers`.
+    """
+    summary_path = os.path.join(output_dir, "multi_account_summary.json")
+    done = {}  # file index -> (account_id, summary)
+    started = time.perf_counter()
+
+    def merge(index, result):
+        if result is None:
+            return
+        acc_id, acc_summary, seconds = result
+        done[index] = (acc_id, acc_summary)
+        print(f"[{len(done)}/{len(paths)}] Account {acc_id} analyzed in {seconds:.2f}s")
+        _save_summary({a: s for a, s in done.values()}, summary_path)
+
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(analyze_account_file, path, engine): i for i, path in enumerate(paths)}
+            for fut in as_completed(futures):
+                merge(futures[fut], fut.result())
+    else:
+        for i, path in enumerate(paths):
+            merge(i, analyze_account_file(path, engine))
+
+    if not done:
+        return {}
+    # final write in file order, as the serial loop produced it
+    analysis_summary = {}
+    for i in sorted(done):
+        acc_id, acc_summary = done[i]
+        analysis_summary[acc_id] = acc_summary
+    _save_summary(analysis_summary, summary_path)
+    print(f"⏱️ {len(done)} accounts analyzed in {time.perf_counter() - started:.2f}s")
+    return analysis_summary
+
+
+# ===== Single-account resources =====
+# (summary key, input file prefix, idle output name) for single-account mode
+SINGLE_ACCOUNT_RESOURCES = [
+    ("EC2", "ec2_instances", "idle_ec2"),
+    ("EBS", "ebs_volumes", "idle_ebs"),
+    ("S3", "s3_buckets", "idle_s3"),
+    ("RDS", "rds_instances", "idle_rds"),
+]
+
+
+def idle_filters(engine="python"):
+    """Idle filter per resource type: per-record Python checks or the vectorized NumPy/Arrow backend."""
+    if engine == "vectorized":
+        import vectorized_analysis as va
+        return {
+            "EC2": partial(va.iter_idle_ec2, threshold=EC2_STOPPED_DAYS_THRESHOLD),
+            "EBS": va.iter_idle_ebs,
+            "S3": partial(va.iter_idle_s3, threshold=S3_EMPTY_DAYS_THRESHOLD),
+            "RDS": partial(va.iter_idle_rds, threshold=RDS_IDLE_DAYS_THRESHOLD),
+        }
+    return {"EC2": iter_idle_ec2, "EBS": iter_idle_ebs, "S3": iter_idle_s3, "RDS": iter_idle_rds}
+
+
+def _store_prefilter(prefix):
+    """Pushed-down scan filter that keeps only rows the idle check can flag."""
+    import pyarrow.dataset as ds
+    if prefix == "ec2_instances":
+        return ds.field("State") == "stopped"
+    if prefix == "ebs_volumes":
+        return (ds.field("Attachments") == "[]") | ds.field("Attachments").is_null()
+    if prefix == "rds_instances":
+        return ds.field("DBInstanceStatus").isin(["stopped", "available"])
+    return None
+
+
+def iter_store_idle(store_dir, prefix, idle_name, iter_idle):
+    """
+    Analyze the latest snapshot of a store dataset partition by partition and write each
+    partition's idle records back to the matching idle_* dataset, yielding them as well.
+    """
+    import inventory_store
+    snapshot = inventory_store.latest_snapshot(store_dir, prefix)
+    for account, region, records in inventory_store.iter_partition_records(
+            store_dir, prefix, snapshot, filter=_store_prefilter(prefix)):
+        idle = list(iter_idle(records))
+        inventory_store.write_records(store_dir, idle_name, idle, account, region, snapshot)
+        yield from idle
+
+
+# ===== In-memory analysis (pipeline) =====
+def analyze_resources(resources, engine="python"):
+    """
+    Analyze records that are already in memory. `resources` maps "EC2" / "EBS" / "S3" / "RDS"
+    to iterables of records. Returns (summary, {"idle_ec2": [...], "idle_ebs": [...], ...}).
+    """
+    idle = idle_filters(engine)
+    summary = {}
+    idle_results = {}
+    for key, _, idle_name in SINGLE_ACCOUNT_RESOURCES:
+        idle_results[idle_name] = list(idle[key](resources.get(key, [])))
+        summary[f"{key}_IdleCount"] = len(idle_results[idle_name])
+    return summary, idle_results
+
+
+# ===== Cross-resource joins =====
+def analyze_resource_graph(input_dir, output_dir, ext=".json", store_dir=None, pricing=None):
+    """
+    Build the EC2 / EBS resource graph once from the full inventory and report volumes
+    attached only to long-stopped instances plus the EBS cost behind each idle instance.
+    Volumes are priced like cost_calculation does (`pricing` is an optional PricingEngine).
+    """
+    from resource_graph import ResourceGraph
+    if store_dir:
+        import inventory_store
+        instances = inventory_store.iter_records(store_dir, "ec2_instances",
+                                                 ["InstanceId", "State", "LaunchTime", "AttachedVolumes"])
+        volumes = inventory_store.iter_records(store_dir, "ebs_volumes",
+                                               ["VolumeId", "Size_GB", "Attachments", "AvailabilityZone", "VolumeType"])
+    else:
+        instances = (r for path in input_files(input_dir, "ec2_instances") for r in iter_records(path))
+        volumes = (r for path in input_files(input_dir, "ebs_volumes") for r in iter_records(path))
+    graph = ResourceGraph(pricing=pricing).add_instances(instances).add_volumes(volumes)
+
+    stranded = graph.volumes_on_stopped_instances(EC2_STOPPED_DAYS_THRESHOLD)
+    costs = graph.ebs_cost_by_instance(graph.long_stopped_instances(EC2_STOPPED_DAYS_THRESHOLD))
+    write_records(stranded, os.path.join(output_dir, "stranded_ebs" + ext))
+    with open(os.path.join(output_dir, "idle_ec2_ebs_cost.json"), "w") as f:
+        json.dump(costs, f, indent=2)
+    return {
+        "EBS_StrandedCount": len(stranded),
+        "IdleEC2_EBSMonthlyCostUSD": round(sum(c["MonthlyCostUSD"] for c in costs.values()), 2),
+    }
+
+
+# ===== Incremental cache =====
+# Time-independent part of each idle check. Idle results depend only on the records that
+# pass it, so the cache keeps just these per input file and re-applies the day thresholds
+# on every run (a cached record can still cross a threshold as time passes).
+CANDIDATE_FILTERS = {
+    "EC2": lambda i: i.get("State") == "stopped" and bool(i.get("LaunchTime")),
+    "EBS": lambda v: len(v.get("Attachments", [])) == 0,
+    "S3": lambda b: b.get("ObjectCount", 0) == 0 and bool(b.get("CreationDate")),
+    "RDS": lambda db: db.get("DBInstanceStatus") in ["stopped", "available"] and bool(db.get("InstanceCreateTime")),
+}
+MANIFEST_FILE = ".analysis_manifest.json"
+CACHE_DIR = ".analysis_cache"
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class AnalysisManifest:
+    """
+    Digest / size / mtime of every analyzed input file plus its cached candidate records.
+    Unchanged files are served from the cache; `full=True` re-analyzes everything.
+    """
+
+    def __init__(self, output_dir, full=False):
+        self.path = os.path.join(output_dir, MANIFEST_FILE)
+        self.cache_dir = os.path.join(output_dir, CACHE_DIR)
+        self.full = full
+        self.files = {}
+        self.seen = set()
+        self.rescanned = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if not full and os.path.exists(self.path):
+            self.files = load_json(self.path).get("files", {})
+
+    def _cache_path(self, path):
+        tag = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{os.path.basename(path)}.{tag}.candidates.jsonl")
+
+    def _unchanged(self, path, entry, stat):
+        """(unchanged, digest); the digest is only computed (and returned) when size or mtime differ."""
+        if self.full or entry is None or not os.path.exists(self._cache_path(path)):
+            return False, None
+        if (entry["size"], entry["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+            return True, None
+        # touched or copied: only the content digest decides
+        digest = file_digest(path)
+        return digest == entry["digest"], digest
+
+    def candidates(self, key, paths):
+        """Yield the candidate records of every input file, re-scanning only changed files."""
+        for path in paths:
+            abs_path = os.path.abspath(path)
+            self.seen.add(abs_path)
+            stat = os.stat(path)
+            entry = self.files.get(abs_path)
+            cache_path = self._cache_path(path)
+            unchanged, digest = self._unchanged(path, entry, stat)
+            if not unchanged:
+                candidate = CANDIDATE_FILTERS[key]
+                write_records((r for r in iter_records(path) if candidate(r)), cache_path)
+                entry = {"digest": digest or file_digest(path)}
+                self.rescanned += 1
+            entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            self.files[abs_path] = entry
+            yield from iter_records(cache_path)
 
-    for file in os.listdir(test_data_dir):
-        if file.endswith(".json"):
-            path = os.path.join(test_data_dir, file)
-            try:
-                with open(path, "r") as f:
-                    data = json.load(f)
-                    accounts.append(data)
-            except json.JSONDecodeError:
-                print(f"❌ Invalid JSON in {file}, skipping.")
-    return accounts
+    def save(self):
+        for abs_path in set(self.files) - self.seen:
+            del self.files[abs_path]
+            stale = self._cache_path(abs_path)
+            if os.path.exists(stale):
+                os.remove(stale)
+        _save_summary({"files": self.files}, self.path)
+        print(f"♻️ Incremental analysis: {self.rescanned} of {len(self.seen)} input files re-analyzed.")
 
 
 # ===== Main Analyzer =====
-def analyze_all(input_dir="output", output_dir="output/analysis", multi_account=True):
+def analyze_all(input_dir="output", output_dir="output/analysis", multi_account=True, output_format="json",
+                store_dir=None, engine="python", workers=1, full=False, graph=False, pricing=None):
     os.makedirs(output_dir, exist_ok=True)
     analysis_summary = {}
+    idle = idle_filters(engine)
 
     # Case 1: Multi-account simulation
     if multi_account:
-        accounts = load_test_accounts()
-        if accounts:
-            print(f"🔹 Found {len(accounts)} test accounts.")
-            for acc in accounts:
-                acc_id = acc.get("account_id", "unknown")
-                print(f"\n=== Analyzing Account: {acc_id} ===")
-
-                res = acc.get("resources", {})
-                ec2 = analyze_ec2_instances(res.get("EC2", []))
-                ebs = analyze_ebs_volumes(res.get("EBS", []))
-                s3 = analyze_s3_buckets(res.get("S3", []))
-                rds = analyze_rds_instances(res.get("RDS", []))
-
-                acc_summary = {
-                    "EC2_IdleCount": len(ec2),
-                    "EBS_IdleCount": len(ebs),
-                    "S3_IdleCount": len(s3),
-                    "RDS_IdleCount": len(rds)
-                }
-
-                analysis_summary[acc_id] = acc_summary
-            # Save combined summary
-            with open(os.path.join(output_dir, "multi_account_summary.json"), "w") as f:
-                json.dump(analysis_summary, f, indent=2)
-            return analysis_summary
+        account_files = list_account_files()
+        if account_files:
+            print(f"🔹 Found {len(account_files)} test accounts.")
+            analysis_summary = analyze_accounts(account_files, output_dir, workers, engine)
+            if analysis_summary:
+                return analysis_summary
 
     # Case 2: Normal single-account mode (existing Day 3 logic)
-    ec2_files = [f for f in os.listdir(input_dir) if f.startswith("ec2_instances")]
-    ec2_idle_total = []
-    for f in ec2_files:
-        ec2_data = load_json(os.path.join(input_dir, f))
-        idle_ec2 = analyze_ec2_instances(ec2_data)
-        ec2_idle_total.extend(idle_ec2)
-    with open(os.path.join(output_dir, "idle_ec2.json"), "w") as f:
-        json.dump(ec2_idle_total, f, indent=2, default=str)
-    analysis_summary["EC2_IdleCount"] = len(ec2_idle_total)
-
-    ebs_files = [f for f in os.listdir(input_dir) if f.startswith("ebs_volumes")]
-    ebs_idle_total = []
-    for f in ebs_files:
-        ebs_data = load_json(os.path.join(input_dir, f))
-        idle_ebs = analyze_ebs_volumes(ebs_data)
-        ebs_idle_total.extend(idle_ebs)
-    with open(os.path.join(output_dir, "idle_ebs.json"), "w") as f:
-        json.dump(ebs_idle_total, f, indent=2, default=str)
-    analysis_summary["EBS_IdleCount"] = len(ebs_idle_total)
-
-    s3_file = os.path.join(input_dir, "s3_buckets.json")
-    idle_s3 = analyze_s3_buckets(load_json(s3_file))
-    with open(os.path.join(output_dir, "idle_s3.json"), "w") as f:
-        json.dump(idle_s3, f, indent=2, default=str)
-    analysis_summary["S3_IdleCount"] = len(idle_s3)
-
-    rds_files = [f for f in os.listdir(input_dir) if f.startswith("rds_instances")]
-    rds_idle_total = []
-    for f in rds_files:
-        rds_data = load_json(os.path.join(input_dir, f))
-        idle_rds = analyze_rds_instances(rds_data)
-        rds_idle_total.extend(idle_rds)
-    with open(os.path.join(output_dir, "idle_rds.json"), "w") as f:
-        json.dump(rds_idle_total, f, indent=2, default=str)
-    analysis_summary["RDS_IdleCount"] = len(rds_idle_total)
+    # Inputs are streamed record by record and idle records are written as they are found.
+    # File inputs go through the manifest, so only changed files are parsed again.
+    ext = ".jsonl" if output_format == "jsonl" else ".json"
+    manifest = None if store_dir else AnalysisManifest(output_dir, full)
+    for key, prefix, idle_name in SINGLE_ACCOUNT_RESOURCES:
+        if store_dir:
+            idle_records = iter_store_idle(store_dir, prefix, idle_name, idle[key])
+        else:
+            idle_records = idle[key](manifest.candidates(key, input_files(input_dir, prefix)))
+        count = write_records(idle_records, os.path.join(output_dir, idle_name + ext))
+        analysis_summary[f"{key}_IdleCount"] = count
+    if manifest:
+        manifest.save()
+    if graph:
+        analysis_summary.update(analyze_resource_graph(input_dir, output_dir, ext, store_dir, pricing))
 
     with open(os.path.join(output_dir, "summary_analysis.json"), "w") as f:
         json.dump(analysis_summary, f, indent=2)
@@ -182,7 +442,24 @@ def analyze_all(input_dir="output", output_dir="output/analysis", multi_account=
 
 # ===== Entry Point =====
 if __name__ == "__main__":
-    summary = analyze_all()
+    parser = argparse.ArgumentParser(description="CloudMind - Resource analysis")
+    parser.add_argument("--input", default="output", help="Directory with gathered ec2/ebs/s3/rds files (.json or .jsonl)")
+    parser.add_argument("--out", default="output/analysis", help="Output directory for idle_* results")
+    parser.add_argument("--format", choices=["json", "jsonl"], default="json", help="Write idle_* results as JSON lists or streamed JSON Lines")
+    parser.add_argument("--single-account", action="store_true", help="Skip the test_data multi-account simulation")
+    parser.add_argument("--store", default=None, help="Read the latest snapshot from this Parquet inventory store instead of --input files")
+    parser.add_argument("--engine", choices=["python", "vectorized"], default="python", help="Idle-detection backend (vectorized = NumPy/Arrow columns, for large fleets)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes for multi-account analysis (1 = serial)")
+    parser.add_argument("--full", action="store_true", help="Ignore the input manifest and re-analyze every file")
+    parser.add_argument("--graph", action="store_true", help="Join EC2 and EBS: volumes held only by long-stopped instances, EBS cost per idle instance")
+    parser.add_argument("--price-list", nargs="+", default=None, help="With --graph: AWS Price List bulk JSON file(s) or trimmed CSV for region/type-aware EBS rates")
+    args = parser.parse_args()
+    pricing = None
+    if args.price_list:
+        from pricing import PricingEngine
+        pricing = PricingEngine.load(args.price_list)
+    summary = analyze_all(args.input, args.out, not args.single_account, args.format, args.store, args.engine,
+                          args.workers, args.full, args.graph, pricing)
     print("\n✅ Resource Analysis Complete. Summary:")
     print(json.dumps(summary, indent=2))
     print("\n📁 Check output/analysis/ for detailed JSON results.")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+CloudMind Analytics - EC2 / EBS resource graph
+----------------------------------------------
+Links instances and volumes through hash indexes on InstanceId and VolumeId,
+built once per analysis run. Edges come from both sides of the data:
+an instance's AttachedVolumes and a volume's Attachments[].InstanceId.
+Every join is a dictionary lookup, so the graph stays linear in the number
+of resources (no nested instance x volume scans). Volumes are priced the way
+cost_calculation prices them: the flat AWS_PRICING rate, or region / volume
+type rates from a PricingEngine.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timezone
+from itertools import islice
+
+from cost_calculation import record_rates
+
+PRICING_BATCH = 10_000  # volumes priced per PricingEngine.price_batch call
+
+
+class ResourceGraph:
+    """Compact in-memory graph: only the fields the joins need are kept per resource."""
+
+    def __init__(self, now=None, pricing=None):
+        self.now = now or datetime.now(timezone.utc)
+        self.pricing = pricing
+        self.instances = {}                         # InstanceId -> (State, stopped days or None)
+        self.volumes = {}                           # VolumeId -> (Size_GB, USD per GB-month)
+        self.volumes_by_instance = defaultdict(set)  # InstanceId -> {VolumeId}
+        self.instances_by_volume = defaultdict(set)  # VolumeId -> {InstanceId}
+
+    # ----- building -----
+    def add_instances(self, instances):
+        for i in instances:
+            iid = i.get("InstanceId")
+            launch = i.get("LaunchTime")
+            days = (self.now - datetime.fromisoformat(launch)).days if launch else None
+            self.instances[iid] = (i.get("State"), days)
+            for vid in i.get("AttachedVolumes", []):
+                self._link(iid, vid)
+        return self
+
+    def add_volumes(self, volumes):
+        volumes = iter(volumes)
+        while True:
+            batch = list(islice(volumes, PRICING_BATCH))
+            if not batch:
+                return self
+            for v, rate in zip(batch, record_rates("EBS", batch, self.pricing)):
+                vid = v.get("VolumeId")
+                self.volumes[vid] = (v.get("Size_GB") or 0, rate)
+                for a in v.get("Attachments", []):
+                    if a.get("InstanceId"):
+                        self._link(a["InstanceId"], vid)
+
+    def _link(self, iid, vid):
+        self.volumes_by_instance[iid].add(vid)
+        self.instances_by_volume[vid].add(iid)
+
+    # ----- lookups -----
+    def volumes_of(self, instance_id):
+        return sorted(self.volumes_by_instance.get(instance_id, ()))
+
+    def instances_of(self, volume_id):
+        return sorted(self.instances_by_volume.get(volume_id, ()))
+
+    def is_long_stopped(self, instance_id, min_days):
+        state, days = self.instances.get(instance_id, (None, None))
+        return state == "stopped" and days is not None and days >= min_days
+
+    def long_stopped_instances(self, min_days):
+        return [iid for iid in self.instances if self.is_long_stopped(iid, min_days)]
+
+    # ----- joins -----
+    def volumes_on_stopped_instances(self, min_days):
+        """
+        Volumes that are attached, but only to instances stopped for at least min_days
+        (same stopped-days rule as analyze_ec2_instances). Unattached volumes are
+        excluded; analyze_ebs_volumes already reports those.
+        """
+        stranded = []
+        for vid, owners in self.instances_by_volume.items():
+            if vid in self.volumes and owners and all(self.is_long_stopped(iid, min_days) for iid in owners):
+                size, rate = self.volumes[vid]
+                stranded.append({
+                    "VolumeId": vid,
+                    "Size_GB": size,
+                    "MonthlyCostUSD": round(size * rate, 2),
+                    "InstanceIds": sorted(owners),
+                })
+        return stranded
+
+    def ebs_cost_by_instance(self, instance_ids):
+        """Monthly EBS cost hanging off each instance (volumes missing from the EBS data count as 0 GB)."""
+        out = {}
+        for iid in instance_ids:
+            vids = self.volumes_of(iid)
+            priced = [self.volumes.get(vid, (0, 0.0)) for vid in vids]
+            out[iid] = {
+                "VolumeIds": vids,
+                "Size_GB": sum(size for size, _ in priced),
+                "MonthlyCostUSD": round(sum(size * rate for size, rate in priced), 2),
+            }
+        return out
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+CloudMind Analytics - S3 Inventory ingestion
+--------------------------------------------
+Offline alternative to live object listing: computes ObjectCount,
+TotalSizeBytes and last-modified statistics per bucket from a local copy
+of S3 Inventory reports (manifest.json + CSV / Parquet / ORC data files).
+Data files are streamed batch by batch through pyarrow, reading only the
+size / timestamp / version columns, so memory stays bounded.
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+BATCH_SIZE = 64 * 1024        # rows per Parquet / ORC batch
+CSV_BLOCK_SIZE = 16 << 20     # bytes per CSV block
+
+# Inventory fields we need, by normalized name (lowercase, no "_" / spaces)
+SIZE_FIELD = "size"
+MODIFIED_FIELD = "lastmodifieddate"
+IS_LATEST_FIELD = "islatest"
+DELETE_MARKER_FIELD = "isdeletemarker"
+
+
+def _norm(name):
+    return name.strip().lower().replace("_", "").replace(" ", "")
+
+
+# ===== Manifest discovery =====
+def find_manifests(inventory_dir):
+    """Return the newest manifest per source bucket found under inventory_dir."""
+    latest = {}
+    for root, _, files in os.walk(inventory_dir):
+        if "manifest.json" not in files:
+            continue
+        path = os.path.join(root, "manifest.json")
+        try:
+            with open(path, "r") as f:
+                manifest = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            print(f"❌ Error loading {path}")
+            continue
+        bucket = manifest.get("sourceBucket")
+        created = int(manifest.get("creationTimestamp", 0))
+        if bucket and (bucket not in latest or created > latest[bucket][0]):
+            latest[bucket] = (created, path, manifest)
+    return {bucket: (path, manifest) for bucket, (_, path, manifest) in latest.items()}
+
+
+def _index_data_files(inventory_dir):
+    """Map data file basenames to local paths (inventory keys point at the destination bucket)."""
+    index = {}
+    for root, _, files in os.walk(inventory_dir):
+        for name in files:
+            index.setdefault(name, os.path.join(root, name))
+    return index
+
+
+def _resolve(inventory_dir, key, index):
+    candidate = os.path.join(inventory_dir, key)
+    if os.path.exists(candidate):
+        return candidate
+    return index.get(os.path.basename(key))
+
+
+# ===== Columnar readers =====
+def _csv_batches(path, schema_fields):
+    """Stream a headerless (optionally gzipped) inventory CSV, reading only the needed columns."""
+    wanted = {SIZE_FIELD: pa.int64(), MODIFIED_FIELD: pa.timestamp("ms", tz="UTC"),
+              IS_LATEST_FIELD: pa.bool_(), DELETE_MARKER_FIELD: pa.bool_()}
+    include = [f for f in schema_fields if _norm(f) in wanted]
+    reader = pa_csv.open_csv(
+        pa.input_stream(path, compression="detect"),
+        read_options=pa_csv.ReadOptions(column_names=schema_fields, block_size=CSV_BLOCK_SIZE),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=include,
+            column_types={f: wanted[_norm(f)] for f in include},
+            true_values=["true", "TRUE", "True"],
+            false_values=["false", "FALSE", "False"],
+        ),
+    )
+    for batch in reader:
+        yield batch
+
+
+def _parquet_batches(path):
+    pf = pq.ParquetFile(path)
+    wanted = {SIZE_FIELD, MODIFIED_FIELD, IS_LATEST_FIELD, DELETE_MARKER_FIELD}
+    columns = [name for name in pf.schema_arrow.names if _norm(name) in wanted]
+    yield from pf.iter_batches(batch_size=BATCH_SIZE, columns=columns)
+
+
+def _orc_batches(path):
+    from pyarrow import orc
+    of = orc.ORCFile(path)
+    wanted = {SIZE_FIELD, MODIFIED_FIELD, IS_LATEST_FIELD, DELETE_MARKER_FIELD}
+    columns = [name for name in of.schema.names if _norm(name) in wanted]
+    for i in range(of.nstripes):
+        yield from of.read_stripe(i, columns=columns).to_batches(BATCH_SIZE)
+
+
+def _iter_batches(path, manifest):
+    fmt = (manifest.get("fileFormat") or "CSV").upper()
+    if fmt == "CSV":
+        schema_fields = [f.strip() for f in manifest.get("fileSchema", "").split(",")]
+        return _csv_batches(path, schema_fields)
+    if fmt == "PARQUET":
+        return _parquet_batches(path)
+    if fmt == "ORC":
+        return _orc_batches(path)
+    raise ValueError(f"Unsupported inventory format: {fmt}")
+
+
+# ===== Aggregation =====
+def _to_iso(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    return str(value)
+
+
+def summarize_bucket(inventory_dir, manifest, index=None):
+    """Stream every data file of one manifest and return its per-bucket statistics."""
+    if index is None:
+        index = _index_data_files(inventory_dir)
+    count = 0
+    total_size = 0
+    oldest = newest = None
+    missing = 0
+    for entry in manifest.get("files", []):
+        path = _resolve(inventory_dir, entry.get("key", ""), index)
+        if not path:
+            missing += 1
+            continue
+        for batch in _iter_batches(path, manifest):
+            cols = {_norm(name): batch.column(i) for i, name in enumerate(batch.schema.names)}
+            # versioned inventories list every version; count current objects only, like list_objects_v2
+            mask = None
+            if IS_LATEST_FIELD in cols:
+                mask = pc.fill_null(cols[IS_LATEST_FIELD], True)
+            if DELETE_MARKER_FIELD in cols:
+                live = pc.invert(pc.fill_null(cols[DELETE_MARKER_FIELD], False))
+                mask = live if mask is None else pc.and_(mask, live)
+            if mask is not None:
+                cols = {k: pc.filter(v, mask) for k, v in cols.items()}
+                count += pc.sum(pc.cast(mask, pa.int64())).as_py() or 0
+            else:
+                count += batch.num_rows
+            if SIZE_FIELD in cols:
+                total_size += pc.sum(cols[SIZE_FIELD]).as_py() or 0
+            if MODIFIED_FIELD in cols and len(cols[MODIFIED_FIELD]):
+                mm = pc.min_max(cols[MODIFIED_FIELD])
+                lo, hi = mm["min"].as_py(), mm["max"].as_py()
+                if lo is not None and (oldest is None or lo < oldest):
+                    oldest = lo
+                if hi is not None and (newest is None or hi > newest):
+                    newest = hi
+    if missing:
+        print(f"⚠️ {missing} inventory data file(s) for {manifest.get('sourceBucket')} not found locally.")
+    created_ms = int(manifest.get("creationTimestamp", 0))
+    return {
+        "ObjectCount": count,
+        "TotalSizeBytes": total_size,
+        "OldestObjectModified": _to_iso(oldest),
+        "NewestObjectModified": _to_iso(newest),
+        "InventoryDate": datetime.fromtimestamp(created_ms / 1000, timezone.utc).isoformat() if created_ms else None,
+    }
+
+
+def summarize_inventory(inventory_dir):
+    """Return {bucket: stats} for every source bucket with a manifest under inventory_dir."""
+    index = _index_data_files(inventory_dir)
+    return {bucket: summarize_bucket(inventory_dir, manifest, index)
+            for bucket, (_, manifest) in find_manifests(inventory_dir).items()}
+
+
+def merge_inventory(buckets, stats):
+    """
+    Attach inventory statistics to s3_buckets records (as produced by
+    data_gather.list_s3_buckets), keeping the shape analyze_s3_buckets reads.
+    Buckets without an inventory are left as they are.
+    """
+    for b in buckets:
+        if b.get("Name") in stats:
+            b.update(stats[b["Name"]])
+    return buckets
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+CloudMind Analytics - S3 bucket sizing engine
+---------------------------------------------
+Counts objects and total bytes for many buckets at once. A single large
+bucket can be split into key-prefix shards (discovered with a delimiter
+listing) that are listed in parallel. Progress is checkpointed per bucket
+and per shard, so an interrupted scan resumes instead of starting over.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from botocore.exceptions import ClientError
+
+CHECKPOINT_SAVE_INTERVAL = 5  # seconds between checkpoint writes while listing
+
+
+# ===== Checkpoint =====
+class SizingCheckpoint:
+    """
+    Per-bucket / per-shard listing progress kept in a JSON file.
+    Layout: {"options": {...}, "buckets": {name: {"root": {...}, "shards": {prefix: {...}}}}}
+    Every listing state holds count, size, the next ContinuationToken and a done flag.
+    Options include the account being sized: bucket names repeat across accounts, so a
+    checkpoint is only resumed by the same account with the same sizing options.
+    """
+
+    def __init__(self, path=None, options=None):
+        self.path = path
+        self.options = options or {}
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self.data = {"options": self.options, "buckets": {}}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    saved = json.load(f)
+                if saved.get("options") == self.options:
+                    self.data = saved
+                else:
+                    print(f"⚠️ Checkpoint {path} was written for another account or with different options, starting over.")
+            except (json.JSONDecodeError, OSError):
+                print(f"❌ Unreadable checkpoint {path}, starting over.")
+
+    def bucket(self, name):
+        with self._lock:
+            root = dict(_new_state(), prefixes=[])
+            return self.data["buckets"].setdefault(name, {"root": root, "shards": {}, "done": False})
+
+    def shard(self, name, prefix):
+        with self._lock:
+            shards = self.data["buckets"][name]["shards"]
+            return shards.setdefault(prefix, _new_state())
+
+    def advance(self, state, count, size, token, done, prefixes=()):
+        """Apply one listed page to a state atomically, so a save never splits a page from its token."""
+        with self._lock:
+            state["count"] += count
+            state["size"] += size
+            state["token"] = token
+            state["done"] = done
+            if prefixes:
+                state["prefixes"].extend(prefixes)
+
+    def mark_done(self, name):
+        with self._lock:
+            self.data["buckets"][name]["done"] = True
+
+    def save(self, force=False):
+        if not self.path:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_save < CHECKPOINT_SAVE_INTERVAL:
+                return
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.data, f)
+            os.replace(tmp, self.path)
+            self._last_save = now
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _new_state():
+    return {"count": 0, "size": 0, "token": None, "done": False}
+
+
+# ===== Listing =====
+def _list_range(s3, bucket, state, checkpoint, prefix=None, delimiter=None, max_objects=None):
+    """
+    Page through list_objects_v2 from the state's saved token, adding to its
+    count/size. With a delimiter, common prefixes are collected in state["prefixes"].
+    """
+    kwargs = {"Bucket": bucket}
+    if prefix:
+        kwargs["Prefix"] = prefix
+    if delimiter:
+        kwargs["Delimiter"] = delimiter
+    while not state["done"]:
+        if state["token"]:
+            kwargs["ContinuationToken"] = state["token"]
+        page = s3.list_objects_v2(**kwargs)
+        contents = page.get("Contents", [])
+        token = page.get("NextContinuationToken")
+        done = not page.get("IsTruncated") or not token
+        if max_objects and state["count"] + len(contents) >= max_objects:
+            done = True
+        prefixes = [p["Prefix"] for p in page.get("CommonPrefixes", [])] if delimiter else ()
+        checkpoint.advance(state, len(contents), sum(obj.get("Size", 0) for obj in contents),
+                           token, done, prefixes)
+        checkpoint.save()
+    return state
+
+
+def _bucket_totals(entry):
+    count = entry["root"]["count"] + sum(s["count"] for s in entry["shards"].values())
+    size = entry["root"]["size"] + sum(s["size"] for s in entry["shards"].values())
+    return count, size
+
+
+# ===== Engine =====
+class BucketSizer:
+    """Schedules root listings and prefix shards for many buckets on one bounded thread pool."""
+
+    def __init__(self, s3, workers=1, shard_delimiter=None, max_objects_per_bucket=None,
+                 checkpoint_path=None, identity=None):
+        if max_objects_per_bucket:
+            # early stop is defined on the serial key order; keep it unsharded
+            shard_delimiter = None
+        self.s3 = s3
+        self.workers = max(1, workers or 1)
+        self.shard_delimiter = shard_delimiter
+        self.max_objects = max_objects_per_bucket
+        self.checkpoint = SizingCheckpoint(checkpoint_path, {
+            "identity": identity,
+            "shard_delimiter": shard_delimiter,
+            "max_objects_per_bucket": max_objects_per_bucket,
+        })
+        self.results = {}
+        self._pending = {}      # future -> bucket name
+        self._open_shards = {}  # bucket name -> shard futures still running
+
+    def run(self, bucket_names):
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for name in bucket_names:
+                    self._start(executor, name)
+                while self._pending:
+                    done, _ = wait(list(self._pending), return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        self._collect(executor, fut)
+                    self.checkpoint.save()
+        except BaseException:
+            self.checkpoint.save(force=True)
+            raise
+        if any("Error" in r for r in self.results.values()):
+            self.checkpoint.save(force=True)
+        else:
+            self.checkpoint.clear()
+        return self.results
+
+    def _start(self, executor, name):
+        entry = self.checkpoint.bucket(name)
+        if entry["done"]:
+            self._finish(name)
+        elif entry["root"]["done"]:
+            self._submit_shards(executor, name)
+        else:
+            fut = executor.submit(_list_range, self.s3, name, entry["root"], self.checkpoint,
+                                  None, self.shard_delimiter, self.max_objects)
+            self._pending[fut] = name
+
+    def _collect(self, executor, fut):
+        name = self._pending.pop(fut)
+        if name in self.results:  # another shard of this bucket already failed
+            return
+        try:
+            fut.result()
+        except ClientError as e:
+            self.results[name] = {"ObjectCount": None, "TotalSizeBytes": None, "Error": str(e)}
+            return
+        if name not in self._open_shards:
+            self._submit_shards(executor, name)
+            return
+        self._open_shards[name] -= 1
+        if self._open_shards[name] == 0:
+            self._finish(name)
+
+    def _submit_shards(self, executor, name):
+        entry = self.checkpoint.bucket(name)
+        running = 0
+        for prefix in entry["root"]["prefixes"]:
+            state = self.checkpoint.shard(name, prefix)
+            if not state["done"]:
+                fut = executor.submit(_list_range, self.s3, name, state, self.checkpoint, prefix)
+                self._pending[fut] = name
+                running += 1
+        if running:
+            self._open_shards[name] = running
+        else:
+            self._finish(name)
+
+    def _finish(self, name):
+        self._open_shards.pop(name, None)
+        count, size = _bucket_totals(self.checkpoint.bucket(name))
+        self.checkpoint.mark_done(name)
+        self.results[name] = {"ObjectCount": count, "TotalSizeBytes": size}
+
+
+def size_buckets(s3, bucket_names, workers=1, shard_delimiter=None, max_objects_per_bucket=None,
+                 checkpoint_path=None, identity=None):
+    """
+    Return {bucket: {"ObjectCount": n, "TotalSizeBytes": b}} for every bucket, with
+    None values plus "Error" on ClientError, listing up to `workers` ranges at once.
+
+    With shard_delimiter, each bucket is first listed with that delimiter; root-level
+    keys are counted directly and every common prefix becomes its own parallel shard.
+
+    `identity` (account ID or profile) is stored with the checkpoint; a checkpoint written
+    for another identity is ignored.
+    """
+    sizer = BucketSizer(s3, workers, shard_delimiter, max_objects_per_bucket, checkpoint_path, identity)
+    return sizer.run(bucket_names)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+CloudMind Analytics - Scan checkpoints
+--------------------------------------
+Where a resumable scan keeps its continuation tokens and partial results
+between invocations. Every store has the same three methods and stores
+plain JSON:
+
+    store.load(key)        -> dict, or None when there is no checkpoint
+    store.save(key, data)
+    store.delete(key)
+
+MemoryCheckpointStore and FileCheckpointStore need nothing but the standard
+library (offline runs, tests, a warm Lambda's /tmp); S3CheckpointStore takes
+the caller's S3 client, so this module can be imported by the Lambda as
+app.scan_checkpoint or scan_checkpoint.
+"""
+
+import json
+import os
+import threading
+
+CHECKPOINT_DIR = "output/checkpoints"
+
+
+class MemoryCheckpointStore:
+    """In-process store; data goes through JSON so it behaves like the persistent stores."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def load(self, key):
+        with self._lock:
+            text = self._data.get(key)
+        return json.loads(text) if text is not None else None
+
+    def save(self, key, data):
+        text = json.dumps(data)
+        with self._lock:
+            self._data[key] = text
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class FileCheckpointStore:
+    """One JSON file per key, replaced atomically so a crash never leaves half a checkpoint."""
+
+    def __init__(self, directory=CHECKPOINT_DIR):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, key.replace("/", "_") + ".json")
+
+    def load(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def save(self, key, data):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3CheckpointStore:
+    """Checkpoints as S3 objects under a prefix, so any container can resume the scan."""
+
+    def __init__(self, s3_client, bucket, prefix="cloudmind/checkpoints/"):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def load(self, key):
+        try:
+            body = self.s3.get_object(Bucket=self.bucket, Key=self.prefix + key + ".json")["Body"]
+        except Exception as e:
+            code = getattr(e, "response", {}).get("Error", {}).get("Code")
+            if code in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return json.loads(body.read())
+
+    def save(self, key, data):
+        self.s3.put_object(Bucket=self.bucket, Key=self.prefix + key + ".json",
+                           Body=json.dumps(data).encode("utf-8"), ContentType="application/json")
+
+    def delete(self, key):
+        self.s3.delete_object(Bucket=self.bucket, Key=self.prefix + key + ".json")
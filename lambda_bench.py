@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+CloudMind Analytics - Lambda benchmark
+--------------------------------------
+Measures lambda_function start-up and invocation latency locally. Every AWS
+call is answered with canned responses through a botocore "before-call" hook,
+so no credentials or network are needed and only our own code, boto3 and
+client creation are timed.
+
+--latency-ms adds an artificial delay to every stubbed call, and
+--compare-serial repeats the run with SCAN_WORKERS=1 / BUCKET_WORKERS=1 to
+show the speed-up of the concurrent scanners and check that both produce
+the same findings.
+
+Each round runs in a fresh interpreter:
+* import     - import lambda_function
+* cold       - first lambda_handler call (boto3 import, clients, topic, scans, publish)
+* warm       - further lambda_handler calls in the same interpreter
+* eager      - import boto3 + creating the four clients up front (what a
+               module-level client setup pays before the handler runs)
+
+    python lambda_bench.py --rounds 5 --warm 50 --resources 500
+    python lambda_bench.py --resources 2000 --latency-ms 20 --compare-serial
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVICES = ("ec2", "s3", "rds", "sns")
+
+
+# ===== Canned AWS responses =====
+def _responses(n):
+    old = datetime.now(timezone.utc) - timedelta(days=60)
+    instances = [{"InstanceId": f"i-{i:017x}", "State": {"Name": "stopped" if i % 2 else "running"},
+                  "LaunchTime": old, "InstanceType": "t3.micro"} for i in range(n)]
+    volumes = [{"VolumeId": f"vol-{i:017x}", "Size": 8, "Attachments": [] if i % 2 else [{"InstanceId": "i-0"}]}
+               for i in range(n)]
+    return {
+        "DescribeInstances": {"Reservations": [{"Instances": instances}]},
+        "DescribeVolumes": {"Volumes": volumes},
+        "ListBuckets": {"Buckets": [{"Name": f"bucket-{i}", "CreationDate": old} for i in range(max(1, n // 10))]},
+        "ListObjectsV2": {"KeyCount": 0},
+        "DescribeDBInstances": {"DBInstances": [
+            {"DBInstanceIdentifier": f"db-{i}", "DBInstanceStatus": "available", "InstanceCreateTime": old}
+            for i in range(max(1, n // 20))]},
+        "CreateTopic": {"TopicArn": "arn:aws:sns:us-east-1:123456789012:CloudMindAlerts"},
+        "Publish": {"MessageId": "bench"},
+    }
+
+
+def _install_stubs(n, calls, latency=0.0):
+    """Answer every client call from the default boto3 session with a canned response (after `latency` s)."""
+    import boto3
+    from botocore.awsrequest import AWSResponse
+
+    responses = _responses(n)
+
+    lock = threading.Lock()
+
+    def respond(model, **kwargs):
+        with lock:
+            calls[model.name] = calls.get(model.name, 0) + 1
+        if latency:
+            time.sleep(latency)
+        return AWSResponse("https://stub", 200, {}, None), responses.get(model.name, {})
+
+    boto3.setup_default_session(region_name="us-east-1")
+    boto3.DEFAULT_SESSION.events.register("before-call", respond)
+
+
+def _child_env(state_dir, serial=False):
+    env = dict(os.environ)
+    for key in ("ALERT_STATE_BUCKET", "CHECKPOINT_BUCKET", "SNS_TOPIC_ARN", "AWS_PROFILE"):
+        env.pop(key, None)
+    if serial:
+        env.update({"SCAN_WORKERS": "1", "BUCKET_WORKERS": "1"})
+    env.update({
+        "ALERT_STATE_PATH": os.path.join(state_dir, "alert_state.db"),
+        "CHECKPOINT_DIR": os.path.join(state_dir, "checkpoints"),
+        "AWS_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "AWS_EC2_METADATA_DISABLED": "true",
+    })
+    return env
+
+
+# ===== Child runs (one fresh interpreter each) =====
+def _findings_digest(lambda_function):
+    findings = [lambda_function.find_idle_ec2(), lambda_function.find_unattached_volumes(),
+                lambda_function.find_old_empty_buckets(), lambda_function.find_idle_rds()]
+    return hashlib.sha1(json.dumps(findings, sort_keys=True).encode()).hexdigest()
+
+
+def _run_handler(resources, warm, latency):
+    t0 = time.perf_counter()
+    import lambda_function
+    t_import = time.perf_counter() - t0
+
+    calls = {}
+    t1 = time.perf_counter()
+    _install_stubs(resources, calls, latency)
+    t_stubs = time.perf_counter() - t1
+
+    t2 = time.perf_counter()
+    first = lambda_function.lambda_handler({}, None)
+    t_cold = time.perf_counter() - t2
+    cold_calls = dict(calls)
+
+    warm_times = []
+    for _ in range(warm):
+        t = time.perf_counter()
+        lambda_function.lambda_handler({}, None)
+        warm_times.append(time.perf_counter() - t)
+    warm_calls = {k: (v - cold_calls.get(k, 0)) / warm for k, v in calls.items() if warm and v > cold_calls.get(k, 0)}
+    return {"import": t_import, "stubs": t_stubs, "cold": t_cold, "warm": warm_times,
+            "status": first.get("status"), "cold_calls": cold_calls, "warm_calls": warm_calls,
+            "findings": _findings_digest(lambda_function)}
+
+
+def _run_eager():
+    t0 = time.perf_counter()
+    import boto3
+    for service in SERVICES:
+        boto3.client(service, region_name="us-east-1")
+    return {"eager": time.perf_counter() - t0}
+
+
+def _spawn(mode, resources, warm, latency_ms=0.0, serial=False):
+    with tempfile.TemporaryDirectory() as state_dir:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", mode, "--resources", str(resources),
+             "--warm", str(warm), "--latency-ms", str(latency_ms)],
+            cwd=HERE, env=_child_env(state_dir, serial), capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+# ===== Report =====
+def _ms(seconds):
+    return f"{seconds * 1000:8.1f} ms"
+
+
+def run_benchmark(rounds=5, warm=20, resources=200, latency_ms=0.0, serial=False):
+    runs = [_spawn("handler", resources, warm, latency_ms, serial) for _ in range(rounds)]
+    eager = [_spawn("eager", resources, 0)["eager"] for _ in range(rounds)]
+    warm_all = sorted(t for r in runs for t in r["warm"])
+    report = {
+        "rounds": rounds,
+        "resources": resources,
+        "latency_ms": latency_ms,
+        "serial": serial,
+        "import_s": statistics.median(r["import"] for r in runs),
+        "cold_handler_s": statistics.median(r["cold"] for r in runs),
+        "cold_total_s": statistics.median(r["import"] + r["stubs"] + r["cold"] for r in runs),
+        "eager_clients_s": statistics.median(eager),
+        "cold_api_calls": runs[0]["cold_calls"],
+        "warm_api_calls": runs[0]["warm_calls"],
+        "status": runs[0]["status"],
+        "findings": runs[0]["findings"],
+    }
+    if warm_all:
+        report["warm_handler_median_s"] = statistics.median(warm_all)
+        report["warm_handler_p95_s"] = warm_all[min(len(warm_all) - 1, int(len(warm_all) * 0.95))]
+    return report
+
+
+def print_report(report):
+    mode = "serial" if report["serial"] else "concurrent"
+    print(f"\n⏱️ lambda_function benchmark, {mode} ({report['rounds']} rounds, {report['resources']} resources "
+          f"per scan, {report['latency_ms']:g} ms per call)")
+    print("------------------------------------")
+    print(f"Import lambda_function      {_ms(report['import_s'])}")
+    print(f"Cold handler (1st call)     {_ms(report['cold_handler_s'])}")
+    print(f"Cold total (import..return) {_ms(report['cold_total_s'])}")
+    if "warm_handler_median_s" in report:
+        print(f"Warm handler median         {_ms(report['warm_handler_median_s'])}")
+        print(f"Warm handler p95            {_ms(report['warm_handler_p95_s'])}")
+    print(f"Eager boto3 + 4 clients     {_ms(report['eager_clients_s'])}")
+    print("------------------------------------")
+    print("Cold API calls:", ", ".join(f"{k} x{v}" for k, v in sorted(report["cold_api_calls"].items())))
+    if report["warm_api_calls"]:
+        print("Warm API calls per invocation:",
+              ", ".join(f"{k} x{v:g}" for k, v in sorted(report["warm_api_calls"].items())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CloudMind - Benchmark lambda_function cold and warm invocations")
+    parser.add_argument("--rounds", type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument("--warm", type=int, default=20, help="Warm invocations per round")
+    parser.add_argument("--resources", type=int, default=200, help="Instances / volumes returned by the stubs")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Artificial latency added to every stubbed call")
+    parser.add_argument("--compare-serial", action="store_true", help="Also run with one scan / probe worker and compare")
+    parser.add_argument("--json", default=None, help="Also write the report to this JSON file")
+    parser.add_argument("--child", choices=["handler", "eager"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, HERE)
+        if args.child == "handler":
+            result = _run_handler(args.resources, args.warm, args.latency_ms / 1000)
+        else:
+            result = _run_eager()
+        print(json.dumps(result))
+        sys.exit(0)
+
+    report = run_benchmark(args.rounds, args.warm, args.resources, args.latency_ms)
+    print_report(report)
+    if args.compare_serial:
+        serial = run_benchmark(args.rounds, args.warm, args.resources, args.latency_ms, serial=True)
+        print_report(serial)
+        print(f"\n🚀 Cold handler speed-up: {serial['cold_handler_s'] / report['cold_handler_s']:.1f}x")
+        if "warm_handler_median_s" in report:
+            print(f"🚀 Warm handler speed-up: {serial['warm_handler_median_s'] / report['warm_handler_median_s']:.1f}x")
+        if serial["findings"] == report["findings"]:
+            print("✅ Concurrent and serial scans produced the same findings.")
+        else:
+            print("❌ Concurrent and serial scans produced different findings!")
+        report = {"concurrent": report, "serial": serial}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report saved to {args.json}")
@@ -1,27 +1,190 @@
-import boto3
 import os
-from botocore.exceptions import ClientError
 import json
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
+try:
+    from app.alert_state import AlertState, download_state, upload_state
+    from app.scan_checkpoint import FileCheckpointStore, S3CheckpointStore
+    from app.fanout import LambdaTransport, LocalTransport, new_shard_state, run_shards
+    from app import aws_throttle
+except ImportError:  # deployed flat, next to alert_state.py / scan_checkpoint.py / fanout.py / aws_throttle.py
+    from alert_state import AlertState, download_state, upload_state
+    from scan_checkpoint import FileCheckpointStore, S3CheckpointStore
+    from fanout import LambdaTransport, LocalTransport, new_shard_state, run_shards
+    import aws_throttle
+
 REGION = os.getenv("AWS_REGION", "us-east-1")
 SNS_TOPIC_NAME = os.getenv("SNS_TOPIC_NAME", "CloudMindAlerts")
 
-# clients
-ec2 = boto3.client("ec2", region_name=REGION)
-s3 = boto3.client("s3", region_name=REGION)
-rds = boto3.client("rds", region_name=REGION)
-sns = boto3.client("sns", region_name=REGION)
+# previously reported idle set, kept in S3 between invocations (ALERT_STATE_BUCKET, else
+# CHECKPOINT_BUCKET) or at ALERT_STATE_PATH on persistent storage (e.g. an EFS mount). With
+# neither it lives in /tmp, which is lost on every cold start: the next alert then re-sends the
+# whole idle set, as before the state existed.
+ALERT_STATE_PATH = os.getenv("ALERT_STATE_PATH")
+ALERT_STATE_TMP = "/tmp/cloudmind_alert_state.db"   # local copy of the S3 state, or the fallback
+ALERT_STATE_BUCKET = os.getenv("ALERT_STATE_BUCKET") or os.getenv("CHECKPOINT_BUCKET")
+ALERT_STATE_KEY = os.getenv("ALERT_STATE_KEY", "cloudmind/alert_state.db")
+ALERT_SUBJECT = "CloudMind Idle Resource Alert (Lambda)"
+MAX_MESSAGE_BYTES = 240 * 1024  # SNS allows 256 KiB per publish; longer alerts go out in several parts
+LINE_BYTES = 1024               # ID lists are wrapped so parts can be filled line by line
+
+# scanners run side by side; bucket emptiness probes share a bounded pool (1 = serial).
+# Every client goes through aws_throttle: shared per-(account, service, region) adaptive
+# rate limits and standard-mode retries with jittered backoff.
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "4"))
+BUCKET_WORKERS = int(os.getenv("BUCKET_WORKERS", "16"))
+EC2_PAGE_SIZE = 1000
+EBS_PAGE_SIZE = 500
+RDS_PAGE_SIZE = 100
+PROBES_PER_WORKER = 4   # bucket probes per worker between deadline checks
+
+# scans stop before the timeout, keeping back SCAN_RESERVE_SHARE of the time the invocation started
+# with (at most SCAN_RESERVE_MS), and save their continuation tokens and partial results; the next
+# invocation resumes them and the report is only sent once every scan finished
+SCAN_RESERVE_MS = int(os.getenv("SCAN_RESERVE_MS", "20000"))
+SCAN_RESERVE_SHARE = float(os.getenv("SCAN_RESERVE_SHARE", "0.2"))
+CHECKPOINT_BUCKET = os.getenv("CHECKPOINT_BUCKET") or ALERT_STATE_BUCKET
+CHECKPOINT_PREFIX = os.getenv("CHECKPOINT_PREFIX", "cloudmind/checkpoints/")
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "/tmp/cloudmind_checkpoints")
+CHECKPOINT_KEY = f"scan-{REGION}"
+# an unfinished scan invokes this function again asynchronously ({"resume": <checkpoint key>}), so a
+# long scan runs as a chain of invocations instead of waiting for the next schedule. A continuation
+# always resumes its checkpoint; CHECKPOINT_MAX_AGE_S only limits what a scheduled run picks up
+# (e.g. after a failed continuation) and must be longer than the schedule interval to ever apply.
+RESUME_ASYNC = os.getenv("RESUME_ASYNC", "1") == "1"
+CHECKPOINT_MAX_AGE_S = int(os.getenv("CHECKPOINT_MAX_AGE_S", str(6 * 3600)))  # older ones restart the scan
+
+# orchestrator mode (SCAN_MODE=orchestrate or {"mode": "orchestrate"}): the (account, region, service)
+# shards are dispatched to worker invocations ({"mode": "shard"}) and merged into one report
+SCAN_MODE = os.getenv("SCAN_MODE", "single")
+SCAN_ACCOUNTS = [a for a in os.getenv("SCAN_ACCOUNTS", "").split(",") if a]   # empty = this account
+SCAN_REGIONS = [r for r in os.getenv("SCAN_REGIONS", "").split(",") if r]     # "all" = every enabled region
+SCAN_ROLE_NAME = os.getenv("SCAN_ROLE_NAME", "CloudMindScanRole")              # assumed in other accounts
+FANOUT_TRANSPORT = os.getenv("FANOUT_TRANSPORT", "lambda")                     # lambda, thread or process
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "32"))
+WORKER_FUNCTION = os.getenv("WORKER_FUNCTION")                                  # default: this function
+
+# clients are created on first use and reused by warm invocations; boto3 is only
+# imported then, so module import stays cheap. STS calls run outside _clients_lock,
+# so one slow assume_role only holds up the threads that need that account.
+_clients = {}   # (service, region, account) -> (session it was made from, client)
+_clients_lock = threading.RLock()
+_sessions = {}  # account -> (assumed-role session, expiry)
+_session_locks = {}
+_topic_arns = {}
+
+def _fresh_session(account):
+    cached = _sessions.get(account)
+    return cached[0] if cached and cached[1] - time.time() > 300 else None
+
+def _session_for(account):
+    """boto3 session in another account through SCAN_ROLE_NAME, renewed shortly before it expires."""
+    import boto3
+    with _clients_lock:
+        session = _fresh_session(account)
+        if session:
+            return session
+        lock = _session_locks.setdefault(account, threading.Lock())
+    with lock:  # one assume_role per account; other threads of that account wait for it
+        with _clients_lock:
+            session = _fresh_session(account)
+        if session:
+            return session
+        creds = get_client("sts").assume_role(RoleArn=f"arn:aws:iam::{account}:role/{SCAN_ROLE_NAME}",
+                                              RoleSessionName="cloudmind-scan")["Credentials"]
+        session = boto3.Session(aws_access_key_id=creds["AccessKeyId"], aws_secret_access_key=creds["SecretAccessKey"],
+                                aws_session_token=creds["SessionToken"])
+        with _clients_lock:
+            _sessions[account] = (session, creds["Expiration"].timestamp())
+        return session
+
+def get_client(service, region=None, account=None):
+    """Client for a service in a region (default AWS_REGION) and account (default: this one)."""
+    key = (service, region or REGION, account)
+    session = _session_for(account) if account else None
+    with _clients_lock:
+        # a client made from an older assumed-role session is replaced
+        if key not in _clients or _clients[key][0] is not session:
+            import boto3
+            from botocore.config import Config
+            # enough pooled connections for every probe thread sharing the client
+            config = Config(max_pool_connections=max(10, BUCKET_WORKERS + SCAN_WORKERS))
+            client = aws_throttle.make_client(session or boto3, service, key[1], scope=account, config=config)
+            _clients[key] = (session, client)
+        return _clients[key][1]
 
 def get_or_create_topic(name):
-    resp = sns.create_topic(Name=name)
-    return resp["TopicArn"]
+    # SNS_TOPIC_ARN skips the API call entirely; otherwise create_topic (idempotent) runs once per container
+    if os.getenv("SNS_TOPIC_ARN"):
+        return os.getenv("SNS_TOPIC_ARN")
+    if name not in _topic_arns:
+        resp = get_client("sns").create_topic(Name=name)
+        _topic_arns[name] = resp["TopicArn"]
+    return _topic_arns[name]
 
-def find_idle_ec2(threshold_days=7):
-    out = []
-    paginator = ec2.get_paginator("describe_instances")
-    now = datetime.now(timezone.utc)
-    for page in paginator.paginate():
+class Deadline:
+    """
+    Tells scans to stop `reserve_ms` before the Lambda timeout and / or an absolute end_time
+    (epoch seconds, e.g. the orchestrator's own deadline); with neither it never expires.
+    The default reserve is SCAN_RESERVE_SHARE of the time left when it is created, capped at
+    SCAN_RESERVE_MS, so short timeouts still leave time to scan.
+    """
+
+    def __init__(self, context=None, reserve_ms=None, end_time=None):
+        self.context = context
+        self.end = end_time
+        if reserve_ms is None:
+            left = self.remaining_ms()
+            reserve_ms = SCAN_RESERVE_MS if left is None else min(SCAN_RESERVE_MS, left * SCAN_RESERVE_SHARE)
+        self.reserve_ms = reserve_ms
+
+    def remaining_ms(self):
+        left = [self.context.get_remaining_time_in_millis()] if self.context is not None else []
+        if self.end is not None:
+            left.append((self.end - time.time()) * 1000)
+        return min(left) if left else None
+
+    def end_time(self):
+        left = self.remaining_ms()
+        return None if left is None else time.time() + left / 1000
+
+    def expired(self):
+        left = self.remaining_ms()
+        return left is not None and left <= self.reserve_ms
+
+# ---------- Resumable scanners ----------
+# Each scanner works on a progress dict {"token", "pages", "done", "items"} that is saved in the
+# checkpoint: it resumes from the stored continuation token, adds its findings to "items" and
+# stops at a page boundary once the deadline is near. Every call fetches at least one page, so
+# each invocation makes progress even when it starts with the deadline already in reach.
+
+def _new_progress():
+    return {"token": None, "pages": 0, "done": False, "items": []}
+
+def _pages(call, progress, deadline, token_in, token_out, **params):
+    """Pages of a listing call, starting at the saved continuation token, until done or out of time."""
+    fetched = False
+    while not progress["done"]:
+        if fetched and deadline is not None and deadline.expired():
+            return
+        if progress["token"]:
+            params[token_in] = progress["token"]
+        page = call(**params)
+        yield page
+        # only advanced once the caller has taken the page's items
+        progress["token"] = page.get(token_out)
+        progress["pages"] += 1
+        fetched = True
+        progress["done"] = not progress["token"]
+
+def scan_idle_ec2(progress, now, deadline=None, region=None, account=None, threshold_days=7):
+    ec2 = get_client("ec2", region, account)
+    for page in _pages(ec2.describe_instances, progress, deadline, "NextToken", "NextToken",
+                       MaxResults=EC2_PAGE_SIZE):
         for res in page.get("Reservations", []):
             for i in res.get("Instances", []):
                 state = i.get("State", {}).get("Name")
@@ -29,76 +192,352 @@ def find_idle_ec2(threshold_days=7):
                 if state == "stopped" and launch:
                     days = (now - launch).days
                     if days >= threshold_days:
-                        out.append({"InstanceId": i.get("InstanceId"), "StoppedDays": days})
-    return out
+                        progress["items"].append({"InstanceId": i.get("InstanceId"), "StoppedDays": days})
 
-def find_unattached_volumes():
-    out = []
-    paginator = ec2.get_paginator("describe_volumes")
-    for page in paginator.paginate():
+def scan_unattached_volumes(progress, now, deadline=None, region=None, account=None):
+    ec2 = get_client("ec2", region, account)
+    for page in _pages(ec2.describe_volumes, progress, deadline, "NextToken", "NextToken",
+                       MaxResults=EBS_PAGE_SIZE):
         for v in page.get("Volumes", []):
             if not v.get("Attachments"):
-                out.append({"VolumeId": v.get("VolumeId"), "Size_GB": v.get("Size")})
-    return out
-
-def find_old_empty_buckets(empty_days_threshold=30):
-    out = []
-    resp = s3.list_buckets()
-    now = datetime.now(timezone.utc)
-    for b in resp.get("Buckets", []):
-        name = b.get("Name")
-        created = b.get("CreationDate")
-        # try to count a few objects to detect emptiness (fast)
+                progress["items"].append({"VolumeId": v.get("VolumeId"), "Size_GB": v.get("Size")})
+
+def scan_old_empty_buckets(progress, now, deadline=None, region=None, account=None,
+                           empty_days_threshold=30, workers=None):
+    from botocore.exceptions import ClientError
+    s3 = get_client("s3", region, account)
+    fetched = False
+    if progress.get("buckets") is None:
+        resp = s3.list_buckets()
+        # only buckets old enough to report need the emptiness probe; "next" is the resume point
+        progress["buckets"] = []
+        for b in resp.get("Buckets", []):
+            created = b.get("CreationDate")
+            if created and (now - created).days >= empty_days_threshold:
+                progress["buckets"].append([b.get("Name"), (now - created).days])
+        progress["next"] = 0
+        progress["pages"] += 1
+        fetched = True
+
+    def object_count(name):
+        # one key is enough to tell empty from not empty
         try:
-            obj = s3.list_objects_v2(Bucket=name, MaxKeys=1)
-            obj_count = obj.get("KeyCount", 0)
+            return s3.list_objects_v2(Bucket=name, MaxKeys=1).get("KeyCount", 0)
         except ClientError:
-            obj_count = None
-        if obj_count == 0 and created:
-            age = (now - created).days
-            if age >= empty_days_threshold:
-                out.append({"Name": name, "AgeDays": age})
-    return out
+            return None
+
+    buckets = progress["buckets"]
+    workers = max(1, min(workers or BUCKET_WORKERS, len(buckets) or 1))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while progress["next"] < len(buckets):
+            if fetched and deadline is not None and deadline.expired():
+                return
+            batch = buckets[progress["next"]:progress["next"] + workers * PROBES_PER_WORKER]
+            counts = list(executor.map(object_count, [name for name, _ in batch]))
+            progress["items"] += [{"Name": name, "AgeDays": age} for (name, age), count in zip(batch, counts) if count == 0]
+            progress["next"] += len(batch)
+            progress["pages"] += 1
+            fetched = True
+    progress["done"] = True
+
+def scan_idle_rds(progress, now, deadline=None, region=None, account=None, threshold_days=14):
+    rds = get_client("rds", region, account)
+    for page in _pages(rds.describe_db_instances, progress, deadline, "Marker", "Marker",
+                       MaxRecords=RDS_PAGE_SIZE):
+        for db in page.get("DBInstances", []):
+            status = db.get("DBInstanceStatus")
+            create = db.get("InstanceCreateTime")
+            if status in ("available", "stopped") and create:
+                age = (now - create).days
+                if age >= threshold_days:
+                    progress["items"].append({"DBInstanceIdentifier": db.get("DBInstanceIdentifier"), "IdleDays": age})
+
+# service -> scanner, in report order; S3 is global, so it gets one shard per account
+SCANNERS = {"ec2": scan_idle_ec2, "ebs": scan_unattached_volumes, "s3": scan_old_empty_buckets, "rds": scan_idle_rds}
+GLOBAL_SERVICES = {"s3"}
+# service -> (alert state kind, id field)
+KINDS = {"ec2": ("EC2", "InstanceId"), "ebs": ("EBS", "VolumeId"), "s3": ("S3", "Name"),
+         "rds": ("RDS", "DBInstanceIdentifier")}
+
+def _scan_all(scan, **kwargs):
+    progress = _new_progress()
+    scan(progress, datetime.now(timezone.utc), **kwargs)
+    return progress["items"]
+
+def find_idle_ec2(threshold_days=7):
+    return _scan_all(scan_idle_ec2, threshold_days=threshold_days)
+
+def find_unattached_volumes():
+    return _scan_all(scan_unattached_volumes)
+
+def find_old_empty_buckets(empty_days_threshold=30, workers=None):
+    return _scan_all(scan_old_empty_buckets, empty_days_threshold=empty_days_threshold, workers=workers)
 
 def find_idle_rds(threshold_days=14):
-    out = []
-    resp = rds.describe_db_instances()
-    now = datetime.now(timezone.utc)
-    for db in resp.get("DBInstances", []):
-        status = db.get("DBInstanceStatus")
-        create = db.get("InstanceCreateTime")
-        if status in ("available", "stopped") and create:
-            age = (now - create).days
-            if age >= threshold_days:
-                out.append({"DBInstanceIdentifier": db.get("DBInstanceIdentifier"), "IdleDays": age})
-    return out
-
-def compose_message(ec2s, ebss, s3s, rds_list):
-    msg = "🔔 CloudMind Lambda Alert — Idle Resources Report\n\n"
-    if ec2s:
-        msg += f"EC2 stopped > threshold: {[i['InstanceId'] for i in ec2s]}\n"
-    if ebss:
-        msg += f"Unattached EBS volumes: {[v['VolumeId'] for v in ebss]}\n"
-    if s3s:
-        msg += f"Old empty S3 buckets: {[b['Name'] for b in s3s]}\n"
-    if rds_list:
-        msg += f"Idle RDS instances: {[r['DBInstanceIdentifier'] for r in rds_list]}\n"
-    if not (ec2s or ebss or s3s or rds_list):
-        msg += "All resources OK — no idle detections.\n"
-    msg += f"\nReport generated at {datetime.now(timezone.utc).isoformat()}\n"
-    return msg
-
-def lambda_handler(event, context):
-    topic_arn = get_or_create_topic(SNS_TOPIC_NAME)
-    ec2s = find_idle_ec2()
-    ebss = find_unattached_volumes()
-    s3s = find_old_empty_buckets()
-    rds_list = find_idle_rds()
-
-    message = compose_message(ec2s, ebss, s3s, rds_list)
+    return _scan_all(scan_idle_rds, threshold_days=threshold_days)
+
+# ---------- Checkpoints ----------
+_checkpoint_store = None
+
+def get_checkpoint_store():
+    """S3 when CHECKPOINT_BUCKET (or ALERT_STATE_BUCKET) is set, else files under CHECKPOINT_DIR."""
+    global _checkpoint_store
+    if _checkpoint_store is None:
+        if CHECKPOINT_BUCKET:
+            _checkpoint_store = S3CheckpointStore(get_client("s3"), CHECKPOINT_BUCKET, CHECKPOINT_PREFIX)
+        else:
+            _checkpoint_store = FileCheckpointStore(CHECKPOINT_DIR)
+    return _checkpoint_store
+
+# ---------- Shards ----------
+def shard_key(shard):
+    return f"{shard['account'] or 'self'}/{shard['region'] or 'global'}/{shard['service']}"
+
+def new_scan(accounts=(None,), regions=(REGION,), services=tuple(SCANNERS), fanout=False):
+    """A scan over every (account, region, service) shard; single mode is one account and region."""
+    shards = {}
+    for account in accounts:
+        for service in services:
+            for region in ([None] if service in GLOBAL_SERVICES else regions):
+                shard = {"account": account, "region": region, "service": service}
+                shards[shard_key(shard)] = new_shard_state(shard, _new_progress())
+    return {"started_at": datetime.now(timezone.utc).isoformat(), "invocations": 0, "fanout": fanout,
+            "shards": shards}
+
+def load_scan(store, key, build, restart=False, max_age=CHECKPOINT_MAX_AGE_S):
+    """The checkpointed scan to resume, or build() a new one (also when it is older than max_age seconds)."""
+    scan = None if restart else store.load(key)
+    if scan and "shards" in scan:
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(scan["started_at"])
+        if max_age is None or age.total_seconds() <= max_age:
+            return scan
+    return build()
+
+def resume_async(event, context, checkpoint_key):
+    """Invoke this function again (InvocationType=Event) to continue the checkpointed scan; False if that failed."""
+    from botocore.exceptions import BotoCoreError, ClientError
+    payload = {**{k: v for k, v in event.items() if k != "restart"}, "resume": checkpoint_key}
+    try:
+        get_client("lambda").invoke(FunctionName=context.invoked_function_arn, InvocationType="Event",
+                                    Payload=json.dumps(payload).encode("utf-8"))
+        return True
+    except (BotoCoreError, ClientError) as e:
+        print(f"⚠️ Could not continue the scan asynchronously ({e}); the next scheduled run resumes it.")
+        return False
+
+def handle_shard_event(event, context=None):
+    """Worker side: scan one shard from its continuation until done or out of time; returns what it found."""
+    shard = event["shard"]
+    progress = dict(event.get("progress") or _new_progress())
+    progress["items"] = []
+    deadline = Deadline(context, end_time=event.get("deadline"))
+    SCANNERS[shard["service"]](progress, datetime.fromisoformat(event["started_at"]), deadline,
+                               region=shard["region"], account=shard["account"])
+    return {"shard": shard, "progress": progress}
+
+def run_scans(scan, transport, deadline=None):
+    """Dispatch every unfinished shard through the transport; returns True once all of them are finished."""
+    end_time = deadline.end_time() if deadline else None
+
+    def make_event(key):
+        state = scan["shards"][key]
+        progress = {k: v for k, v in state["progress"].items() if k != "items"}
+        return {"mode": "shard", "shard": state["shard"], "progress": progress,
+                "started_at": scan["started_at"], "deadline": end_time}
+
+    complete = run_shards(scan["shards"], transport, make_event, stop=deadline.expired if deadline else None)
+    scan["invocations"] += 1
+    return complete
+
+def make_transport(fanout, context=None):
+    """Single mode scans its four shards in threads here; orchestrator mode uses FANOUT_TRANSPORT."""
+    if not fanout or FANOUT_TRANSPORT == "thread" or (FANOUT_TRANSPORT == "lambda" and context is None):
+        return LocalTransport(handle_shard_event, SCAN_WORKERS if not fanout else FANOUT_WORKERS)
+    if FANOUT_TRANSPORT == "process":
+        return LocalTransport(handle_shard_event, FANOUT_WORKERS, processes=True)
+    from botocore.config import Config
+    import boto3
+    # workers may run until their own timeout; never let botocore re-invoke a shard on its own
+    client = aws_throttle.make_client(boto3, "lambda", REGION, config=Config(
+        read_timeout=900, retries={"mode": "standard", "total_max_attempts": 1}, max_pool_connections=FANOUT_WORKERS))
+    return LambdaTransport(client, WORKER_FUNCTION or context.function_name, FANOUT_WORKERS)
+
+def resolve_regions(regions):
+    """["all"] becomes every region enabled for this account."""
+    if regions != ["all"]:
+        return regions
+    resp = get_client("ec2").describe_regions(
+        Filters=[{"Name": "opt-in-status", "Values": ["opt-in-not-required", "opted-in"]}])
+    return sorted(r["RegionName"] for r in resp.get("Regions", []))
+
+def merge_findings(scan):
+    """
+    Fan-in: {kind: [ids]} for the alert state plus the keys of failed shards. In orchestrator mode
+    kinds are per shard ("EC2@<account>/<region>"), so a failed shard resolves nothing.
+    """
+    current, failed = {}, []
+    for key, state in scan["shards"].items():
+        if state.get("error"):
+            failed.append(key)
+            continue
+        shard = state["shard"]
+        kind, field = KINDS[shard["service"]]
+        if scan["fanout"]:
+            kind = f"{kind}@{shard['account'] or 'self'}/{shard['region'] or 'global'}"
+        current.setdefault(kind, []).extend(i[field] for i in state["progress"]["items"])
+    return current, failed
+
+def _size(text):
+    return len(text.encode("utf-8"))
+
+def _id_lines(prefix, ids, limit):
+    """"prefix (n): id, id, ..." wrapped into lines of at most `limit` bytes."""
+    lines, line = [], f"{prefix} ({len(ids)}): "
+    for n, rid in enumerate(ids):
+        piece = f", {rid}" if n else str(rid)
+        if n and _size(line + piece) > limit:
+            lines.append(line + ",")
+            line, piece = "  ", str(rid)
+        line += piece
+    lines.append(line)
+    return lines
+
+def _ids_of(by_kind, base):
+    """IDs of one resource kind; per-shard kinds ("EC2@acct/region") are merged and tagged with where."""
+    ids = []
+    for kind, kind_ids in by_kind.items():
+        name, _, where = kind.partition("@")
+        if name == base:
+            ids += [f"{i} ({where})" for i in kind_ids] if where else kind_ids
+    return ids
+
+def compose_delta_chunks(delta, failed=(), max_bytes=MAX_MESSAGE_BYTES):
+    """
+    Alert text for a delta, split into messages of at most max_bytes: every new and resolved ID
+    is named, since the state remembers all of them once the alert went out. Lines are never
+    split; every part carries the title with its part number.
+    """
+    title = "🔔 CloudMind Lambda Alert — Idle Resource Changes"
+    budget = max_bytes - _size(title) - 32  # " (part 999/999)" and the blank line
+    limit = min(budget, LINE_BYTES)
+    labels = [("EC2", "EC2 stopped > threshold"), ("EBS", "Unattached EBS volumes"),
+              ("S3", "Old empty S3 buckets"), ("RDS", "Idle RDS instances")]
+    lines = []
+    for section, by_kind in (("New", delta.new), ("Resolved", delta.resolved)):
+        for kind, label in labels:
+            ids = _ids_of(by_kind, kind)
+            if ids:
+                lines += _id_lines(f"{section} — {label}", ids, limit)
+    if failed:
+        lines += [""] + _id_lines("Not scanned (failed)", list(failed), limit)
+    lines += ["", f"Summary: {delta.summary()}",
+              f"Report generated at {datetime.now(timezone.utc).isoformat()}"]
+
+    parts, current, used = [], [], 0
+    for line in lines:
+        size = _size(line) + 1
+        if current and used + size > budget:
+            parts.append(current)
+            current, used = [], 0
+        current.append(line)
+        used += size
+    parts.append(current)
+    total = len(parts)
+    return [f"{title if total == 1 else f'{title} (part {i}/{total})'}\n\n" + "\n".join(body) + "\n"
+            for i, body in enumerate(parts, 1)]
+
+def _scan_progress(scan):
+    shards = scan["shards"].values()
+    return {"shards": len(scan["shards"]), "done": sum(1 for st in shards if st["progress"]["done"]),
+            "failed": sum(1 for st in shards if st.get("error")),
+            "found": sum(len(st["progress"]["items"]) for st in shards)}
+
+def lambda_handler(event, context, store=None, transport=None):
+    from botocore.exceptions import BotoCoreError, ClientError
+    event = event or {}
+    aws_throttle.reset_stats()  # the counters returned below cover this invocation
+    if event.get("mode") == "shard":
+        return {**handle_shard_event(event, context), "api": aws_throttle.totals()}
+
+    if not (ALERT_STATE_BUCKET or ALERT_STATE_PATH):
+        print(f"⚠️ No persistent alert state (ALERT_STATE_BUCKET or ALERT_STATE_PATH); using {ALERT_STATE_TMP}, "
+              "so the full idle set is re-sent after every cold start.")
+    store = store or get_checkpoint_store()
+    fanout = event.get("mode", SCAN_MODE) == "orchestrate"
+    if fanout:
+        accounts = event.get("accounts") or SCAN_ACCOUNTS or [None]
+        regions = resolve_regions(event.get("regions") or SCAN_REGIONS or [REGION])
+        services = event.get("services") or list(SCANNERS)
+        target = json.dumps([accounts, regions, services])
+        checkpoint_key = "fanout-" + hashlib.sha1(target.encode()).hexdigest()[:12]
+    else:
+        accounts, regions, services = [None], [REGION], list(SCANNERS)
+        checkpoint_key = CHECKPOINT_KEY
+    # a continuation of this scan resumes it however old it is
+    resuming = event.get("resume") == checkpoint_key
+    scan = load_scan(store, checkpoint_key, lambda: new_scan(accounts, regions, services, fanout),
+                     restart=event.get("restart") and not resuming,
+                     max_age=None if resuming else CHECKPOINT_MAX_AGE_S)
+
+    own_transport = transport is None
+    transport = transport or make_transport(fanout, context)
+    try:
+        # the topic lookup runs next to the scanners
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            topic = executor.submit(get_or_create_topic, SNS_TOPIC_NAME)
+            complete = run_scans(scan, transport, Deadline(context))
+            try:
+                topic_arn, topic_error = topic.result(), None
+            except (BotoCoreError, ClientError) as e:
+                topic_arn, topic_error = None, e
+    finally:
+        if own_transport:
+            transport.close()
+    if not complete:
+        store.save(checkpoint_key, scan)
+        result = {"status": "in_progress", "invocations": scan["invocations"], "progress": _scan_progress(scan)}
+        if context is not None and RESUME_ASYNC:
+            result["resumed"] = resume_async(event, context, checkpoint_key)
+        result["api"] = aws_throttle.totals()
+        return result
+    if topic_error:
+        # keep the finished scan so the next invocation only retries the topic and the alert
+        store.save(checkpoint_key, scan)
+        return {"status": "error", "error": str(topic_error), "api": aws_throttle.totals()}
+    current, failed = merge_findings(scan)
 
+    state_path = ALERT_STATE_PATH or ALERT_STATE_TMP
+    if ALERT_STATE_BUCKET:
+        download_state(get_client("s3"), ALERT_STATE_BUCKET, ALERT_STATE_KEY, state_path)
+    state = AlertState(state_path)
     try:
-        resp = sns.publish(TopicArn=topic_arn, Subject="CloudMind Idle Resource Alert (Lambda)", Message=message)
-        return {"status": "success", "MessageId": resp.get("MessageId")}
-    except ClientError as e:
-        return {"status": "error", "error": str(e)}
+        delta = state.diff(current)
+        if not delta.changed and not event.get("always_send"):
+            state.commit()
+            result = {"status": "no_changes", "summary": delta.summary()}
+        else:
+            chunks = compose_delta_chunks(delta, failed)
+            message_ids = []
+            try:
+                for i, message in enumerate(chunks, 1):
+                    subject = ALERT_SUBJECT if len(chunks) == 1 else f"{ALERT_SUBJECT} ({i}/{len(chunks)})"
+                    resp = get_client("sns").publish(TopicArn=topic_arn, Subject=subject, Message=message)
+                    message_ids.append(resp.get("MessageId"))
+            except ClientError as e:
+                # keep the finished scan so the next invocation only retries the alert (all of its
+                # parts: the state is committed only once every part went out)
+                store.save(checkpoint_key, scan)
+                return {"status": "error", "error": str(e), "api": aws_throttle.totals()}
+            state.commit()
+            result = {"status": "success", "MessageId": message_ids[0], "MessageIds": message_ids,
+                      "summary": delta.summary()}
+    finally:
+        state.close()
+    if ALERT_STATE_BUCKET:
+        upload_state(get_client("s3"), ALERT_STATE_BUCKET, ALERT_STATE_KEY, state_path)
+    store.delete(checkpoint_key)
+    result["invocations"] = scan["invocations"]
+    result["api"] = aws_throttle.totals()
+    if failed:
+        result["failed_shards"] = failed
+    return result
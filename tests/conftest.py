@@ -0,0 +1,111 @@
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# app/ modules import each other by bare name (they are run as `python app/<module>.py`);
+# lambda_function.py lives at the repository root
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(0, ROOT)
+
+NOW = datetime.now(timezone.utc)
+OLD = NOW - timedelta(days=90)
+
+
+class FakeAWS:
+    """
+    Stands in for every client lambda_function uses: EC2 / EBS / RDS listings served in small
+    pages with continuation tokens, S3 buckets (odd-numbered ones hold objects), SNS and Lambda.
+    Counts calls and the most calls in flight at once.
+    """
+
+    def __init__(self, instances=250, volumes=170, buckets=120, databases=45, page=20, latency=0.002):
+        self.instances = [{"InstanceId": f"i-{i}", "State": {"Name": "stopped" if i % 3 else "running"},
+                           "LaunchTime": OLD} for i in range(instances)]
+        self.volumes = [{"VolumeId": f"vol-{i}", "Size": 8, "Attachments": [] if i % 2 else [{"InstanceId": "i-0"}]}
+                        for i in range(volumes)]
+        self.buckets = [{"Name": f"b{i}", "CreationDate": OLD if i % 4 else NOW} for i in range(buckets)]
+        self.databases = [{"DBInstanceIdentifier": f"db-{i}", "DBInstanceStatus": "available",
+                           "InstanceCreateTime": OLD} for i in range(databases)]
+        self.page = page
+        self.latency = latency
+        self.calls = {}
+        self.published = []
+        self.invoked = []
+        self.in_flight = 0
+        self.max_in_flight = {}
+        self._lock = threading.Lock()
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            self.in_flight += 1
+            self.max_in_flight[name] = max(self.max_in_flight.get(name, 0), self.in_flight)
+        time.sleep(self.latency)
+        with self._lock:
+            self.in_flight -= 1
+
+    def _paged(self, items, token, key, token_name="NextToken"):
+        start = int(token or 0)
+        page = {key: items[start:start + self.page]}
+        if start + self.page < len(items):
+            page[token_name] = str(start + self.page)
+        return page
+
+    def describe_instances(self, MaxResults, NextToken=None):
+        self._call("describe_instances")
+        page = self._paged(self.instances, NextToken, "Instances")
+        return {"Reservations": [{"Instances": page.pop("Instances")}], **page}
+
+    def describe_volumes(self, MaxResults, NextToken=None):
+        self._call("describe_volumes")
+        return self._paged(self.volumes, NextToken, "Volumes")
+
+    def describe_db_instances(self, MaxRecords, Marker=None):
+        self._call("describe_db_instances")
+        return self._paged(self.databases, Marker, "DBInstances", "Marker")
+
+    def list_buckets(self):
+        self._call("list_buckets")
+        return {"Buckets": list(self.buckets)}
+
+    def list_objects_v2(self, Bucket, MaxKeys):
+        self._call("list_objects_v2")
+        return {"KeyCount": int(Bucket[1:]) % 2}
+
+    def create_topic(self, Name):
+        return {"TopicArn": f"arn:aws:sns:us-east-1:123456789012:{Name}"}
+
+    def publish(self, **kwargs):
+        self.published.append(kwargs)
+        return {"MessageId": f"m-{len(self.published)}"}
+
+    def invoke(self, **kwargs):
+        self.invoked.append(kwargs)
+        return {"StatusCode": 202}
+
+    # what a full scan should find
+    def expected(self):
+        return {
+            "EC2": [i["InstanceId"] for i in self.instances if i["State"]["Name"] == "stopped"],
+            "EBS": [v["VolumeId"] for v in self.volumes if not v["Attachments"]],
+            "S3": [b["Name"] for b in self.buckets if b["CreationDate"] == OLD and int(b["Name"][1:]) % 2 == 0],
+            "RDS": [db["DBInstanceIdentifier"] for db in self.databases],
+        }
+
+
+@pytest.fixture
+def fake_aws(monkeypatch, tmp_path):
+    """lambda_function with every client replaced by one FakeAWS and its alert state under tmp_path."""
+    import lambda_function as lf
+    fake = FakeAWS()
+    monkeypatch.setattr(lf, "get_client", lambda service, region=None, account=None: fake)
+    monkeypatch.setattr(lf, "ALERT_STATE_PATH", str(tmp_path / "alert_state.db"))
+    monkeypatch.setattr(lf, "_topic_arns", {})
+    monkeypatch.delenv("SNS_TOPIC_ARN", raising=False)
+    return fake
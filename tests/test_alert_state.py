@@ -0,0 +1,152 @@
+import notifications
+from alert_state import AlertState
+from resource_analysis import write_records
+
+
+def test_first_run_reports_everything_as_new(tmp_path):
+    with AlertState(str(tmp_path / "state.db")) as state:
+        delta = state.diff({"EC2": ["i-1", "i-2"], "EBS": []})
+        assert delta.new == {"EC2": ["i-1", "i-2"], "EBS": []}
+        assert delta.changed
+        assert delta.summary() == "2 new, 0 resolved, 0 still idle"
+
+
+def test_commit_remembers_the_set_and_later_runs_only_see_changes(tmp_path):
+    path = str(tmp_path / "state.db")
+    with AlertState(path) as state:
+        state.diff({"EC2": ["i-1", "i-2"], "EBS": ["vol-1"]})
+        state.commit()
+    with AlertState(path) as state:
+        delta = state.diff({"EC2": ["i-2", "i-3"], "EBS": ["vol-1"]})
+        assert delta.new == {"EC2": ["i-3"], "EBS": []}
+        assert delta.resolved == {"EC2": ["i-1"], "EBS": []}
+        assert delta.still == {"EC2": 1, "EBS": 1}
+        state.commit()
+        assert state.reported_count("EC2") == 2
+        assert not state.diff({"EC2": ["i-2", "i-3"], "EBS": ["vol-1"]}).changed
+
+
+def test_diff_without_commit_stores_nothing(tmp_path):
+    path = str(tmp_path / "state.db")
+    with AlertState(path) as state:
+        state.diff({"EC2": ["i-1"]})
+    with AlertState(path) as state:
+        assert state.reported_count() == 0
+        assert state.diff({"EC2": ["i-1"]}).new == {"EC2": ["i-1"]}
+
+
+def test_kinds_missing_from_a_run_do_not_resolve(tmp_path):
+    with AlertState(str(tmp_path / "state.db")) as state:
+        state.diff({"EC2": ["i-1"], "RDS": ["db-1"]})
+        state.commit()
+        delta = state.diff({"EC2": ["i-1"]})
+        assert not delta.changed
+        state.commit()
+        assert state.reported_count("RDS") == 1
+
+
+def _write_idle(analysis_dir, name, ids, field, ext=".json"):
+    write_records([{field: rid} for rid in ids], str(analysis_dir / f"{name}{ext}"))
+
+
+def test_load_idle_streams_jsonl_and_skips_missing_files(tmp_path):
+    _write_idle(tmp_path, "idle_ec2", ["i-1", "i-2"], "InstanceId", ".jsonl")
+    _write_idle(tmp_path, "idle_ebs", ["vol-1"], "VolumeId")
+    idle = notifications.load_idle(str(tmp_path))
+    assert idle == {"idle_ec2": str(tmp_path / "idle_ec2.jsonl"), "idle_ebs": str(tmp_path / "idle_ebs.json")}
+    by_kind = notifications.idle_ids_by_kind(idle)
+    assert not any(isinstance(ids, list) for ids in by_kind.values())
+    assert {kind: list(ids) for kind, ids in by_kind.items()} == {"EC2": ["i-1", "i-2"], "EBS": ["vol-1"]}
+
+
+def test_unreadable_analysis_sends_nothing_and_keeps_the_state(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CLOUDMIND_TOPIC_ARN", "arn:topic")
+    analysis = tmp_path / notifications.ANALYSIS_PATH
+    analysis.mkdir(parents=True)
+    with AlertState(str(tmp_path / "state.db")) as state:
+        state.diff({"EC2": ["i-1"], "RDS": ["db-1"]})
+        state.commit()
+    _write_idle(analysis, "idle_ec2", ["i-1"], "InstanceId", ".jsonl")
+    (analysis / "idle_rds.jsonl").write_text('{"DBInstanceIdentifier": "db-1"}\n{not json\n')
+
+    class NoPublish:
+        def publish(self, **kwargs):
+            raise AssertionError("nothing should be sent")
+
+    notifications.main(client=NoPublish(), state_path=str(tmp_path / "state.db"))
+    with AlertState(str(tmp_path / "state.db")) as state:
+        assert state.reported_count("RDS") == 1 and state.reported_count("EC2") == 1
+
+
+def test_switching_analysis_to_jsonl_does_not_resolve_reported_ids(tmp_path):
+    analysis = tmp_path / "analysis"
+    analysis.mkdir()
+    ids = [f"i-{i}" for i in range(50)]
+    _write_idle(analysis, "idle_ec2", ids, "InstanceId")
+    with AlertState(str(tmp_path / "state.db")) as state:
+        assert len(state.diff(notifications.idle_ids_by_kind(notifications.load_idle(str(analysis)))).new["EC2"]) == 50
+        state.commit()
+        # write_records removes the .json copy when the same results are written as JSON Lines
+        _write_idle(analysis, "idle_ec2", ids, "InstanceId", ".jsonl")
+        assert not (analysis / "idle_ec2.json").exists()
+        delta = state.diff(notifications.idle_ids_by_kind(notifications.load_idle(str(analysis))))
+        assert not delta.changed and delta.still == {"EC2": 50}
+        # no analysis at all for a kind must not resolve it either
+        (analysis / "idle_ec2.jsonl").unlink()
+        assert state.diff(notifications.idle_ids_by_kind(notifications.load_idle(str(analysis)))).resolved == {}
+
+
+def test_main_sends_nothing_without_analysis(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CLOUDMIND_TOPIC_ARN", "arn:topic")
+
+    class NoPublish:
+        def publish(self, **kwargs):
+            raise AssertionError("nothing should be sent")
+
+    notifications.main(client=NoPublish(), state_path=str(tmp_path / "state.db"))
+    with AlertState(str(tmp_path / "state.db")) as state:
+        assert state.reported_count() == 0
+
+
+def test_lambda_alert_names_every_new_id_across_parts(tmp_path):
+    import lambda_function as lf
+    from alert_state import Delta
+
+    new = {"EC2": [f"i-{i:05d}" for i in range(3000)], "EBS": ["vol-1"]}
+    chunks = lf.compose_delta_chunks(Delta(new, {"EC2": [], "EBS": []}, {}), max_bytes=8 * 1024)
+    assert len(chunks) > 1
+    assert all(len(c.encode("utf-8")) <= 8 * 1024 for c in chunks)
+    assert chunks[0].startswith(f"🔔 CloudMind Lambda Alert — Idle Resource Changes (part 1/{len(chunks)})")
+    text = "".join(chunks)
+    assert all(rid in text for rid in new["EC2"]) and "vol-1" in text
+    assert "Summary: 3001 new, 0 resolved, 0 still idle" in chunks[-1]
+
+
+def test_lambda_publishes_every_part_before_committing(fake_aws, monkeypatch):
+    import re
+    import lambda_function as lf
+    from scan_checkpoint import MemoryCheckpointStore
+
+    fake = type(fake_aws)(instances=60_000, page=5000, latency=0)
+    monkeypatch.setattr(lf, "get_client", lambda service, region=None, account=None: fake)
+    result = lf.lambda_handler({}, None, store=MemoryCheckpointStore())
+    assert result["status"] == "success" and len(result["MessageIds"]) == len(fake.published) > 1
+    assert [p["Subject"] for p in fake.published] == [
+        f"{lf.ALERT_SUBJECT} ({i}/{len(fake.published)})" for i in range(1, len(fake.published) + 1)]
+    named = set(re.findall(r"\bi-\d+\b", "".join(p["Message"] for p in fake.published)))
+    assert named == set(fake.expected()["EC2"])
+
+
+def test_lambda_without_persistent_state_falls_back_to_tmp(fake_aws, monkeypatch, tmp_path, capsys):
+    import lambda_function as lf
+    from scan_checkpoint import MemoryCheckpointStore
+
+    monkeypatch.setattr(lf, "ALERT_STATE_PATH", None)
+    monkeypatch.setattr(lf, "ALERT_STATE_BUCKET", None)
+    monkeypatch.setattr(lf, "ALERT_STATE_TMP", str(tmp_path / "tmp_state.db"))
+    assert lf.lambda_handler({}, None, store=MemoryCheckpointStore())["status"] == "success"
+    assert "No persistent alert state" in capsys.readouterr().out
+    # a warm container still remembers what it sent
+    assert lf.lambda_handler({}, None, store=MemoryCheckpointStore())["status"] == "no_changes"
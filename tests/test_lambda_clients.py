@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import lambda_function as lf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def fresh_clients(monkeypatch):
+    monkeypatch.setattr(lf, "_clients", {})
+    monkeypatch.setattr(lf, "_topic_arns", {})
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.delenv("SNS_TOPIC_ARN", raising=False)
+
+
+def test_import_does_not_load_boto3():
+    code = "import sys, lambda_function; print('boto3' in sys.modules, 'botocore' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ["False", "False"]
+
+
+def test_clients_are_created_once_per_service_and_region(fresh_clients):
+    assert lf._clients == {}
+    ec2 = lf.get_client("ec2")
+    assert lf.get_client("ec2") is ec2
+    assert lf.get_client("ec2", lf.REGION) is ec2
+    other = lf.get_client("ec2", "eu-west-1")
+    assert other is not ec2 and other.meta.region_name == "eu-west-1"
+    assert len(lf._clients) == 2
+
+
+class StubSNS:
+    def __init__(self):
+        self.created = 0
+
+    def create_topic(self, Name):
+        self.created += 1
+        return {"TopicArn": f"arn:aws:sns:us-east-1:123456789012:{Name}"}
+
+
+def test_topic_arn_is_looked_up_once_per_container(fresh_clients, monkeypatch):
+    sns = StubSNS()
+    monkeypatch.setattr(lf, "get_client", lambda service, region=None, account=None: sns)
+    arn = lf.get_or_create_topic("Alerts")
+    assert lf.get_or_create_topic("Alerts") == arn
+    assert sns.created == 1
+
+
+def test_configured_topic_arn_skips_the_api(fresh_clients, monkeypatch):
+    sns = StubSNS()
+    monkeypatch.setattr(lf, "get_client", lambda service, region=None, account=None: sns)
+    monkeypatch.setenv("SNS_TOPIC_ARN", "arn:configured")
+    assert lf.get_or_create_topic("Alerts") == "arn:configured"
+    assert sns.created == 0
@@ -0,0 +1,144 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from scan_checkpoint import MemoryCheckpointStore
+
+import lambda_function as lf
+
+
+class CallBudget:
+    """
+    Lambda context whose time runs out once `calls` more AWS calls were made. It is also
+    lambda_function's clock, so shard workers (which get an absolute deadline) stop too.
+    """
+
+    invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:cloudmind"
+
+    def __init__(self, fake, calls):
+        self.fake = fake
+        self.limit = sum(fake.calls.values()) + calls
+
+    def spent(self):
+        return sum(self.fake.calls.values()) >= self.limit
+
+    def get_remaining_time_in_millis(self):
+        return 0 if self.spent() else 60_000
+
+    def time(self):
+        return time.time() + (3600 if self.spent() else 0)
+
+
+@pytest.fixture
+def budget(fake_aws, monkeypatch):
+    def make(calls):
+        context = CallBudget(fake_aws, calls)
+        monkeypatch.setattr(lf, "time", context)
+        return context
+    return make
+
+
+def _total_calls(fake):
+    return sum(fake.calls.values())
+
+
+def test_scan_resumes_from_the_checkpoint_until_done(fake_aws, budget):
+    store = MemoryCheckpointStore()
+    event, invocations = {}, 0
+    while True:
+        invocations += 1
+        result = lf.lambda_handler(event, budget(10), store=store)
+        if result["status"] != "in_progress":
+            break
+        assert store.load(lf.CHECKPOINT_KEY) is not None
+        # every unfinished invocation queues its own continuation
+        assert result["resumed"] and len(fake_aws.invoked) == invocations
+        call = fake_aws.invoked[-1]
+        assert call["InvocationType"] == "Event"
+        event = json.loads(call["Payload"])
+        assert event == {"resume": lf.CHECKPOINT_KEY}
+        assert invocations < 100
+    assert invocations > 2 and result["invocations"] == invocations
+    assert result["status"] == "success"
+    total = sum(len(ids) for ids in fake_aws.expected().values())
+    assert result["summary"] == f"{total} new, 0 resolved, 0 still idle"
+    assert len(fake_aws.published) == 1
+    assert store.load(lf.CHECKPOINT_KEY) is None
+
+
+def test_resumed_scan_fetches_every_page_once(fake_aws, budget):
+    lf.lambda_handler({}, None, store=MemoryCheckpointStore())
+    single_run = dict(fake_aws.calls)
+    fake_aws.calls.clear()
+    store = MemoryCheckpointStore()
+    while lf.lambda_handler({}, budget(7), store=store)["status"] == "in_progress":
+        pass
+    assert fake_aws.calls == single_run
+
+
+def test_resumed_findings_match_a_single_run(fake_aws, budget):
+    store = MemoryCheckpointStore()
+    scan = lf.new_scan()
+    transport = lf.LocalTransport(lf.handle_shard_event, 4)
+    try:
+        while not lf.run_scans(scan, transport, lf.Deadline(budget(5))):
+            store.save("scan", scan)
+            scan = store.load("scan")
+    finally:
+        transport.close()
+    found, failed = lf.merge_findings(scan)
+    assert not failed
+    assert found == fake_aws.expected()
+
+
+def test_expired_deadline_still_fetches_one_page_per_shard(fake_aws, budget):
+    store = MemoryCheckpointStore()
+    result = lf.lambda_handler({}, budget(0), store=store)
+    assert result["status"] == "in_progress"
+    assert fake_aws.calls == {"describe_instances": 1, "describe_volumes": 1, "describe_db_instances": 1,
+                              "list_buckets": 1}
+    saved = store.load(lf.CHECKPOINT_KEY)
+    assert saved["invocations"] == 1
+    assert all(state["progress"]["pages"] == 1 for state in saved["shards"].values())
+
+
+class ShortTimeout:
+    """Lambda context of a function with a short timeout: always 10 s left."""
+
+    def get_remaining_time_in_millis(self):
+        return 10_000
+
+
+def test_short_timeouts_keep_a_proportional_reserve(fake_aws):
+    deadline = lf.Deadline(ShortTimeout())
+    assert deadline.reserve_ms == 10_000 * lf.SCAN_RESERVE_SHARE
+    assert not deadline.expired()
+    assert lf.Deadline(None).reserve_ms == lf.SCAN_RESERVE_MS
+    result = lf.lambda_handler({}, ShortTimeout(), store=MemoryCheckpointStore())
+    assert result["status"] == "success" and result["invocations"] == 1
+
+
+def test_stale_or_restarted_checkpoints_start_a_new_scan(fake_aws, budget):
+    store = MemoryCheckpointStore()
+    lf.lambda_handler({}, budget(5), store=store)
+    saved = store.load(lf.CHECKPOINT_KEY)
+    build = lambda: lf.new_scan()
+    assert lf.load_scan(store, lf.CHECKPOINT_KEY, build) == saved
+    assert lf.load_scan(store, lf.CHECKPOINT_KEY, build, restart=True)["invocations"] == 0
+    saved["started_at"] = (datetime.now(timezone.utc) - timedelta(seconds=lf.CHECKPOINT_MAX_AGE_S + 60)).isoformat()
+    store.save(lf.CHECKPOINT_KEY, saved)
+    assert lf.load_scan(store, lf.CHECKPOINT_KEY, build)["invocations"] == 0
+
+
+def test_continuations_resume_checkpoints_of_any_age(fake_aws, budget):
+    store = MemoryCheckpointStore()
+    lf.lambda_handler({}, budget(5), store=store)
+    saved = store.load(lf.CHECKPOINT_KEY)
+    saved["started_at"] = (datetime.now(timezone.utc) - timedelta(seconds=lf.CHECKPOINT_MAX_AGE_S + 60)).isoformat()
+    store.save(lf.CHECKPOINT_KEY, saved)
+    continuation = json.loads(fake_aws.invoked[-1]["Payload"])
+    result = lf.lambda_handler({**continuation, "restart": True}, budget(5), store=store)
+    assert result["invocations"] == 2
+    # a scheduled run does not pick up the stale checkpoint
+    assert lf.lambda_handler({}, budget(5), store=store)["invocations"] == 1
@@ -0,0 +1,59 @@
+from scan_checkpoint import MemoryCheckpointStore
+
+import lambda_function as lf
+
+
+def _ids(items, field):
+    return [i[field] for i in items]
+
+
+def test_scanners_follow_every_page(fake_aws):
+    expected = fake_aws.expected()
+    assert _ids(lf.find_idle_ec2(), "InstanceId") == expected["EC2"]
+    assert _ids(lf.find_unattached_volumes(), "VolumeId") == expected["EBS"]
+    assert _ids(lf.find_idle_rds(), "DBInstanceIdentifier") == expected["RDS"]
+    assert fake_aws.calls["describe_instances"] == 13  # 250 instances, 20 per page
+
+
+def test_bucket_probes_run_in_a_bounded_pool(fake_aws):
+    serial = lf.find_old_empty_buckets(workers=1)
+    assert fake_aws.max_in_flight["list_objects_v2"] == 1
+    fake_aws.max_in_flight.clear()
+    concurrent = lf.find_old_empty_buckets(workers=8)
+    assert concurrent == serial
+    assert _ids(concurrent, "Name") == fake_aws.expected()["S3"]
+    assert 1 < fake_aws.max_in_flight["list_objects_v2"] <= 8
+
+
+def test_handler_scans_concurrently_with_the_same_findings_as_serial(fake_aws, monkeypatch, tmp_path):
+    results = {}
+    for workers in (1, 4):
+        monkeypatch.setattr(lf, "SCAN_WORKERS", workers)
+        monkeypatch.setattr(lf, "ALERT_STATE_PATH", str(tmp_path / f"state-{workers}.db"))
+        fake_aws.published.clear()
+        fake_aws.max_in_flight.clear()
+        result = lf.lambda_handler({}, None, store=MemoryCheckpointStore())
+        assert result["status"] == "success"
+        results[workers] = (result["summary"], fake_aws.published[0]["Message"].split("Summary:")[0])
+        if workers > 1:
+            assert max(fake_aws.max_in_flight.values()) > 1
+    assert results[1] == results[4]
+    total = sum(len(ids) for ids in fake_aws.expected().values())
+    assert results[4][0] == f"{total} new, 0 resolved, 0 still idle"
+
+
+def test_topic_failure_keeps_the_finished_scan(fake_aws):
+    from botocore.exceptions import ClientError
+
+    def no_topic(Name):
+        raise ClientError({"Error": {"Code": "AuthorizationError", "Message": "denied"}}, "CreateTopic")
+
+    store = MemoryCheckpointStore()
+    fake_aws.create_topic = no_topic
+    result = lf.lambda_handler({}, None, store=store)
+    assert result["status"] == "error" and "denied" in result["error"]
+    assert all(state["progress"]["done"] for state in store.load(lf.CHECKPOINT_KEY)["shards"].values())
+    scanned = dict(fake_aws.calls)
+    del fake_aws.create_topic
+    assert lf.lambda_handler({}, None, store=store)["status"] == "success"
+    assert fake_aws.calls == scanned and len(fake_aws.published) == 1
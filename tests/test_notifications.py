@@ -0,0 +1,109 @@
+import threading
+
+from botocore.exceptions import ClientError
+
+import notifications
+from notifications import compose_chunks, send_chunks
+
+
+class StubSNS:
+    def __init__(self, fail_on=()):
+        self.published = []
+        self.fail_on = set(fail_on)
+        self._lock = threading.Lock()
+
+    def publish(self, TopicArn, Message, Subject):
+        if Subject in self.fail_on:
+            raise ClientError({"Error": {"Code": "InvalidParameter", "Message": "no"}}, "Publish")
+        with self._lock:
+            self.published.append({"TopicArn": TopicArn, "Message": Message, "Subject": Subject})
+            return {"MessageId": f"m-{len(self.published)}"}
+
+
+def _ids(n, prefix="i-"):
+    return [f"{prefix}{i:017x}" for i in range(n)]
+
+
+def test_small_alert_is_one_chunk():
+    chunks = compose_chunks([("EC2 Instances", ["i-1", "i-2"]), ("EBS Volumes", [])])
+    assert len(chunks) == 1
+    assert "• EC2 Instances (2): i-1, i-2" in chunks[0]
+    assert "EBS Volumes" not in chunks[0]
+
+
+def test_empty_alert_says_so():
+    chunks = compose_chunks([("EC2 Instances", [])], empty_text="nothing idle")
+    assert chunks == [f"{notifications.MESSAGE_HEADER}:\n\nnothing idle\n"]
+
+
+def test_large_alert_is_split_within_the_size_limit():
+    ec2, ebs = _ids(3000), _ids(2000, "vol-")
+    chunks = compose_chunks([("EC2 Instances", ec2), ("EBS Volumes", ebs)], max_bytes=16 * 1024)
+    assert len(chunks) > 1
+    for i, chunk in enumerate(chunks, 1):
+        assert len(chunk.encode("utf-8")) <= 16 * 1024
+        assert chunk.startswith(f"{notifications.MESSAGE_HEADER} (part {i}/{len(chunks)}):")
+    found = [rid.strip(" ,") for chunk in chunks for line in chunk.splitlines()
+             for rid in line.split(": ", 1)[-1].split(", ") if rid.strip(" ,").startswith(("i-", "vol-"))]
+    assert found == ec2 + ebs
+
+
+def test_send_chunks_keeps_chunk_order_and_numbers_subjects():
+    sns = StubSNS()
+    chunks = [f"part {i}" for i in range(1, 6)]
+    results = send_chunks("arn:topic", chunks, client=sns, subject="Alert", workers=3)
+    assert [err for _, err in results] == [None] * 5
+    by_message = {p["Message"]: p["Subject"] for p in sns.published}
+    assert by_message == {f"part {i}": f"Alert ({i}/5)" for i in range(1, 6)}
+    assert len(set(mid for mid, _ in results)) == 5
+
+
+def test_send_chunks_returns_failures_instead_of_raising():
+    sns = StubSNS(fail_on={"Alert (2/3)"})
+    results = send_chunks("arn:topic", ["a", "b", "c"], client=sns, subject="Alert")
+    assert results[0][0] and results[2][0]
+    assert results[1][0] is None and isinstance(results[1][1], ClientError)
+
+
+def test_single_chunk_keeps_the_plain_subject():
+    sns = StubSNS()
+    send_chunks("arn:topic", ["only"], client=sns, subject="Alert")
+    assert sns.published[0]["Subject"] == "Alert"
+
+
+class StubTopics:
+    def __init__(self, account, region="us-east-1"):
+        self.account = account
+        self.created = 0
+        self.meta = type("Meta", (), {"region_name": region})()
+
+    def create_topic(self, Name):
+        self.created += 1
+        return {"TopicArn": f"arn:aws:sns:{self.meta.region_name}:{self.account}:{Name}"}
+
+
+def test_topic_cache_is_per_account(tmp_path, monkeypatch):
+    monkeypatch.delenv("CLOUDMIND_TOPIC_ARN", raising=False)
+    monkeypatch.setattr(notifications, "_topic_arns", {})
+    cache = str(tmp_path / "topics.json")
+    first, second = StubTopics("111111111111"), StubTopics("222222222222")
+    arn = notifications.get_or_create_topic("Alerts", first, cache, account="111111111111")
+    assert notifications.get_or_create_topic("Alerts", first, cache, account="111111111111") == arn
+    assert first.created == 1
+    other = notifications.get_or_create_topic("Alerts", second, cache, account="222222222222")
+    assert other.split(":")[4] == "222222222222" and second.created == 1
+    # a new process reads both from disk
+    monkeypatch.setattr(notifications, "_topic_arns", {})
+    assert notifications.get_or_create_topic("Alerts", first, cache, account="111111111111") == arn
+    assert first.created == 1
+
+
+def test_topic_is_not_cached_when_the_account_is_unknown(tmp_path, monkeypatch):
+    monkeypatch.delenv("CLOUDMIND_TOPIC_ARN", raising=False)
+    monkeypatch.setattr(notifications, "_topic_arns", {})
+    monkeypatch.setattr(notifications, "caller_account", lambda region=None: None)
+    cache = tmp_path / "topics.json"
+    sns = StubTopics("111111111111")
+    notifications.get_or_create_topic("Alerts", sns, str(cache))
+    notifications.get_or_create_topic("Alerts", sns, str(cache))
+    assert sns.created == 2 and not cache.exists()
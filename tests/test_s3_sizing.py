@@ -0,0 +1,35 @@
+from botocore.exceptions import ClientError
+
+from s3_sizing import size_buckets
+
+
+class StubS3:
+    """list_objects_v2 over {bucket: object count}; buckets listed in `broken` fail."""
+
+    def __init__(self, objects, broken=()):
+        self.objects = objects
+        self.broken = set(broken)
+
+    def list_objects_v2(self, Bucket, **kwargs):
+        if Bucket in self.broken:
+            raise ClientError({"Error": {"Code": "AccessDenied", "Message": "no"}}, "ListObjectsV2")
+        n = self.objects[Bucket]
+        return {"Contents": [{"Size": 10}] * n, "IsTruncated": False}
+
+
+def test_checkpoint_resumes_for_the_same_account(tmp_path):
+    path = str(tmp_path / "sizing.json")
+    first = size_buckets(StubS3({"logs": 5}, broken={"data"}), ["logs", "data"], checkpoint_path=path,
+                         identity="111111111111")
+    assert first["logs"] == {"ObjectCount": 5, "TotalSizeBytes": 50} and "Error" in first["data"]
+    # "logs" is finished in the checkpoint and not listed again
+    again = size_buckets(StubS3({"data": 2}), ["logs", "data"], checkpoint_path=path, identity="111111111111")
+    assert again == {"logs": {"ObjectCount": 5, "TotalSizeBytes": 50}, "data": {"ObjectCount": 2, "TotalSizeBytes": 20}}
+
+
+def test_checkpoint_of_another_account_is_not_resumed(tmp_path):
+    path = str(tmp_path / "sizing.json")
+    size_buckets(StubS3({"logs": 5}, broken={"data"}), ["logs", "data"], checkpoint_path=path, identity="111111111111")
+    other = size_buckets(StubS3({"logs": 100, "data": 1}), ["logs", "data"], checkpoint_path=path,
+                         identity="222222222222")
+    assert other["logs"] == {"ObjectCount": 100, "TotalSizeBytes": 1000}